@@ -0,0 +1,134 @@
+"""
+Image encoder benchmark
+เปรียบเทียบขนาดไฟล์และความเร็ว encode ของแต่ละ backend/รูปแบบใน image_codec กับรูปที่ปรับขนาดแล้ว
+
+Usage:
+    # รูปบรรทัดข้อความสังเคราะห์ (ไม่ต้องมีข้อมูลจริง)
+    python benchmarks/codec_formats.py
+    
+    # ใช้รูปจริง
+    python benchmarks/codec_formats.py --input-dir input/images --output output/benchmarks/codec_formats.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from utils import *
+from image_codec import available_backends, create_image_codec
+from reduced_decode import compute_psnr, create_synthetic_samples
+
+# (รูปแบบ, optimize, lossless) ที่ทดสอบ
+CODEC_OPTIONS = [
+    ('jpeg', True, False),
+    ('jpeg', False, False),
+    ('png', False, True),
+    ('png', True, True),
+    ('webp', False, False),
+    ('webp', False, True),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image encoder backends and output formats')
+    parser.add_argument('--input-dir', default=None,
+                       help='Use the images in this directory instead of synthetic text lines')
+    parser.add_argument('--count', type=int, default=200,
+                       help='Number of synthetic images')
+    parser.add_argument('--target-height', type=int, default=32,
+                       help='Target image height in pixels')
+    parser.add_argument('--max-width', type=int, default=512,
+                       help='Maximum image width')
+    parser.add_argument('--min-width', type=int, default=16,
+                       help='Minimum image width')
+    parser.add_argument('--quality', type=int, default=95,
+                       help='JPEG/WebP quality (1-100)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Timed passes over all images (the fastest pass is reported)')
+    parser.add_argument('--output', default=None,
+                       help='Write the results to this JSON file')
+    
+    args = parser.parse_args()
+    setup_logging(log_file=None)
+    
+    print("⏱️  Image Encoder Benchmark")
+    print("="*50)
+    
+    if args.input_dir:
+        samples = [(Path(entry['path']).name, Path(entry['path']).read_bytes())
+                   for entry in scan_image_files(args.input_dir)]
+    else:
+        samples = create_synthetic_samples(args.count, [32, 48, 64, 96])
+    
+    # encode รูปที่ปรับขนาดแล้ว (BGR แบบเดียวกับที่ scripts ส่งให้ codec)
+    resize_args = (args.target_height, args.max_width, args.min_width)
+    images = []
+    for _, data in samples:
+        image, source_size = decode_image_for_resize(data, *resize_args, channel_order='BGR')
+        resized_image = resize_image_keep_ratio(image, *resize_args, source_size)
+        if resized_image is not None:
+            images.append(resized_image)
+    
+    if not images:
+        print("❌ No images to benchmark")
+        sys.exit(1)
+    
+    raw_bytes = sum(image.nbytes for image in images)
+    print(f"📊 {len(images)} images at {args.target_height}px height ({raw_bytes / (1024 * 1024):.1f} MB raw)")
+    
+    results = {'images': len(images), 'raw_bytes': raw_bytes, 'quality': args.quality, 'codecs': []}
+    
+    print(f"\n{'format':<22} {'backend':<10} {'avg KB':>8} {'ratio':>7} {'images/s':>10} {'MB/s':>8} {'PSNR':>7}")
+    for image_format, optimize, lossless in CODEC_OPTIONS:
+        for backend in available_backends(image_format, optimize, lossless):
+            codec = create_image_codec(backend, image_format, args.quality, optimize, lossless)
+            seconds, encoded = time_encode(codec, images, args.repeat)
+            total_bytes = sum(len(data) for data in encoded)
+            psnr = min(compute_psnr(image, decode_image_bytes(data, 'BGR')) for image, data in zip(images, encoded))
+            
+            result = {
+                'codec': codec.describe(),
+                'format': image_format,
+                'backend': backend,
+                'optimize': optimize,
+                'lossless': codec.lossless,
+                'seconds': seconds,
+                'images_per_second': len(images) / seconds if seconds > 0 else 0,
+                'raw_mb_per_second': raw_bytes / (1024 * 1024) / seconds if seconds > 0 else 0,
+                'total_bytes': total_bytes,
+                'compression_ratio': raw_bytes / total_bytes if total_bytes else 0,
+                'min_psnr_db': psnr
+            }
+            results['codecs'].append(result)
+            
+            label = codec.describe().rsplit(' (', 1)[0]
+            print(f"{label:<22} {backend:<10} {total_bytes / len(images) / 1024:>8.2f} "
+                  f"{result['compression_ratio']:>6.1f}x {result['images_per_second']:>10.0f} "
+                  f"{result['raw_mb_per_second']:>8.1f} {psnr:>7.1f}")
+    
+    print("\n  ratio = raw RGB bytes / encoded bytes, MB/s = raw MB encoded per second, PSNR = worst image (99 = lossless)")
+    
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+def time_encode(codec, images, repeat):
+    """encode ทุกรูปในหน่วยความจำ คืน (เวลาของรอบที่เร็วที่สุด, bytes ของรอบสุดท้าย)"""
+    best = None
+    encoded = []
+    
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        encoded = [codec.encode(image, 'BGR') for image in images]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    return best, encoded
+
+if __name__ == "__main__":
+    main()
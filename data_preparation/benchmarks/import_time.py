@@ -0,0 +1,122 @@
+"""
+Startup (import-time) benchmark for data preparation scripts
+วัดเวลาเริ่มทำงานของ scripts (import utils, --help, --dry-run) แบบรันใน process ใหม่ทุกครั้ง
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 20 --output output/benchmarks/import_time.json
+    
+    # เปรียบเทียบกับ checkout อื่น (เช่น git worktree ของ commit ก่อนหน้า)
+    python benchmarks/import_time.py --scripts-dir /tmp/baseline/data_preparation/scripts
+    
+    # รวม upload_to_s3.py --dry-run (ต้องมี S3 หรือ S3 จำลอง)
+    python benchmarks/import_time.py --bucket test-bucket --endpoint-url http://localhost:9000
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure start-up time of the data preparation scripts')
+    parser.add_argument('--scripts-dir', default=str(DEFAULT_SCRIPTS_DIR),
+                       help='Directory containing utils.py and the scripts to measure')
+    parser.add_argument('--repeat', type=int, default=10,
+                       help='Runs per command (median is reported)')
+    parser.add_argument('--bucket', default=None,
+                       help='Also measure upload_to_s3.py --dry-run against this bucket')
+    parser.add_argument('--endpoint-url', default=None,
+                       help='Custom S3 endpoint for --dry-run (e.g. MinIO or moto server)')
+    parser.add_argument('--top', type=int, default=8,
+                       help='Number of slowest modules to show from python -X importtime')
+    parser.add_argument('--output', default=None,
+                       help='Write the results to this JSON file')
+    
+    args = parser.parse_args()
+    
+    scripts_dir = Path(args.scripts_dir).resolve()
+    
+    print("⏱️  Data Preparation Startup Benchmark")
+    print("="*50)
+    print(f"📁 Scripts: {scripts_dir}")
+    print(f"🔁 Runs per command: {args.repeat}")
+    
+    commands = {
+        'python (baseline)': [sys.executable, '-c', 'pass'],
+        'import utils': [sys.executable, '-c', f"import sys; sys.path.insert(0, {str(scripts_dir)!r}); import utils"],
+        'upload_to_s3.py --help': [sys.executable, str(scripts_dir / 'upload_to_s3.py'), '--help'],
+        'validate_data.py --help': [sys.executable, str(scripts_dir / 'validate_data.py'), '--help'],
+        'convert_data.py --help': [sys.executable, str(scripts_dir / 'convert_data.py'), '--help'],
+    }
+    
+    if args.bucket:
+        dry_run = [sys.executable, str(scripts_dir / 'upload_to_s3.py'), '--bucket', args.bucket, '--dry-run', '--yes']
+        if args.endpoint_url:
+            dry_run += ['--endpoint-url', args.endpoint_url]
+        commands['upload_to_s3.py --dry-run'] = dry_run
+    
+    results = {'scripts_dir': str(scripts_dir), 'repeat': args.repeat, 'commands': {}}
+    
+    print(f"\n{'command':<28} {'median':>9} {'min':>9} {'max':>9}")
+    for name, command in commands.items():
+        timings = time_command(command, args.repeat)
+        results['commands'][name] = {
+            'median_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'max_ms': max(timings) * 1000
+        }
+        print(f"{name:<28} {statistics.median(timings) * 1000:>7.1f}ms "
+              f"{min(timings) * 1000:>7.1f}ms {max(timings) * 1000:>7.1f}ms")
+    
+    slowest = slowest_imports(commands['import utils'], args.top)
+    results['slowest_imports_ms'] = slowest
+    
+    print(f"\n🐢 Slowest modules imported by utils (cumulative, python -X importtime):")
+    for module, milliseconds in slowest.items():
+        print(f"  {module:<40} {milliseconds:>8.1f}ms")
+    
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+def time_command(command, repeat):
+    """รันคำสั่ง repeat ครั้ง (process ใหม่ทุกครั้ง) และคืนเวลาแต่ละครั้ง (วินาที)"""
+    timings = []
+    
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - start)
+        
+        if completed.returncode != 0:
+            raise RuntimeError(f"Command failed ({completed.returncode}): {' '.join(command)}\n"
+                               f"{completed.stderr.decode(errors='replace')}")
+    
+    return timings
+
+def slowest_imports(command, top):
+    """คืน module ที่ใช้เวลา import สะสมมากที่สุด (ms) จาก python -X importtime"""
+    completed = subprocess.run([command[0], '-X', 'importtime'] + command[1:],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    
+    cumulative = {}
+    for line in completed.stderr.decode(errors='replace').splitlines():
+        # รูปแบบ: "import time: <self us> | <cumulative us> | <module>"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        
+        _, cumulative_us, module = line[len('import time:'):].split('|')
+        cumulative[module.strip()] = int(cumulative_us) / 1000
+    
+    return dict(sorted(cumulative.items(), key=lambda item: -item[1])[:top])
+
+if __name__ == "__main__":
+    main()
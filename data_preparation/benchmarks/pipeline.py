@@ -0,0 +1,311 @@
+"""
+Data preparation pipeline benchmark
+วัดเวลาแต่ละขั้นตอนของ pipeline (parse, validate, resize, encode, split, char_dict, write)
+แบบ serial และแบบขนาน บน dataset สังเคราะห์ที่สร้างซ้ำได้ และบันทึกผลเป็น JSON เพื่อเทียบระหว่าง commit
+
+Usage:
+    # dataset สังเคราะห์ 2000 รูป, serial + parallel (workers = จำนวน CPU)
+    python benchmarks/pipeline.py
+    
+    # กำหนดขนาดและการกระจายอัตราส่วนกว้าง/สูง (อัตราส่วน:น้ำหนัก)
+    python benchmarks/pipeline.py --count 20000 --aspect-ratios 4:1,8:2,16:1 --heights 32,64 --workers 8
+    
+    # เทียบกับผลของ commit ก่อนหน้า (exit code 1 ถ้าขั้นใดช้าลงเกิน --tolerance)
+    python benchmarks/pipeline.py --output output/benchmarks/pipeline_new.json --compare output/benchmarks/pipeline_base.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.append(str(SCRIPTS_DIR))
+
+from utils import *
+from image_codec import create_image_codec
+from create_demo_data import create_synthetic_dataset
+
+STAGES = ['parse', 'validate', 'resize', 'encode', 'split', 'char_dict', 'write']
+
+# ขั้นตอนที่มีโหมดขนาน (ขั้นอื่นรันแบบ serial เท่านั้นเหมือนใน scripts)
+PARALLEL_STAGES = {'validate', 'resize', 'encode', 'char_dict'}
+
+# ขั้นที่เปลี่ยนแปลงน้อยกว่านี้ (วินาที) ไม่นับเป็น regression (เวลาระดับ ms แกว่งได้หลายสิบ %)
+NOISE_FLOOR_SECONDS = 0.005
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every data preparation stage on a synthetic dataset')
+    parser.add_argument('--count', type=int, default=2000,
+                       help='Number of synthetic images')
+    parser.add_argument('--heights', default='32,48,64',
+                       help='Comma-separated source heights of the synthetic images')
+    parser.add_argument('--aspect-ratios', default='2:1,4:3,8:4,12:2,16:1',
+                       help='Width/height ratio distribution as ratio:weight pairs')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed of the synthetic dataset')
+    parser.add_argument('--data-dir', default=None,
+                       help='Synthetic dataset directory (default: output/benchmarks/synthetic_<count>); reused while the spec matches')
+    parser.add_argument('--regenerate', action='store_true',
+                       help='Recreate the synthetic dataset even if it matches')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                       help='Comma-separated stages to run')
+    parser.add_argument('--workers', type=int, default=max(2, os.cpu_count() or 1),
+                       help='Worker processes for the parallel mode (1 = serial only)')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                       help='Items per work unit sent to a worker')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Timed runs per stage and mode (the fastest run is reported)')
+    parser.add_argument('--output', default=None,
+                       help='Results JSON (default: output/benchmarks/pipeline_<commit>.json)')
+    parser.add_argument('--compare', default=None,
+                       help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                       help='Allowed slowdown per stage before --compare reports a regression (0.10 = 10%%)')
+    
+    args = parser.parse_args()
+    setup_logging(log_file=None, level=logging.WARNING)
+    
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"❌ Unknown stages: {', '.join(unknown)} (expected {', '.join(STAGES)})")
+        sys.exit(1)
+    
+    spec = {
+        'count': args.count,
+        'heights': [int(height) for height in args.heights.split(',')],
+        'aspect_ratios': parse_aspect_ratios(args.aspect_ratios),
+        'seed': args.seed
+    }
+    data_dir = Path(args.data_dir or f'output/benchmarks/synthetic_{args.count}')
+    
+    print("⏱️  Data Preparation Pipeline Benchmark")
+    print("="*50)
+    
+    dataset = prepare_dataset(data_dir, spec, args.regenerate)
+    
+    modes = [('serial', 1)] + ([('parallel', args.workers)] if args.workers > 1 else [])
+    commit, dirty = git_revision(SCRIPTS_DIR)
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'dataset': dataset,
+        'repeat': args.repeat,
+        'stages': {}
+    }
+    
+    print(f"🔖 Commit: {commit}{' (dirty)' if dirty else ''}")
+    print(f"⚙️  Modes: " + ", ".join(f"{name} ({workers} worker{'s' if workers > 1 else ''})" for name, workers in modes))
+    print(f"\n{'stage':<10} {'mode':<9} {'items':>7} {'seconds':>9} {'items/s':>10} {'MB/s':>8}")
+    
+    for mode, workers in modes:
+        context = {'data_dir': data_dir, 'image_dir': data_dir / 'images', 'labels_file': data_dir / 'labels.txt'}
+        
+        for stage in STAGES:
+            # ขั้นที่ไม่ได้เลือกยังต้องรันครั้งเดียวเพื่อเตรียมข้อมูลให้ขั้นถัดไป (ไม่จับเวลา)
+            if stage not in stages or (mode == 'parallel' and stage not in PARALLEL_STAGES):
+                if stage in stages or needs_output(stage, stages):
+                    run_stage(stage, context, 1, args.chunk_size)
+                continue
+            
+            result = time_stage(stage, context, workers, args.chunk_size, args.repeat)
+            results['stages'].setdefault(stage, {})[mode] = {'workers': workers, **result}
+            
+            mb_per_second = f"{result['mb_per_second']:>8.1f}" if 'mb_per_second' in result else f"{'-':>8}"
+            print(f"{stage:<10} {mode:<9} {result['items']:>7} {result['seconds']:>9.3f} "
+                  f"{result['items_per_second']:>10.0f} {mb_per_second}")
+        
+        shutil.rmtree(data_dir / 'bench_output', ignore_errors=True)
+    
+    output_file = Path(args.output or f"output/benchmarks/pipeline_{commit}.json")
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Results saved to {output_file}")
+    
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"❌ {regressions} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+def parse_aspect_ratios(text):
+    """แปลง '4:1,8:2' เป็น {4.0: 1.0, 8.0: 2.0} (ไม่ระบุน้ำหนัก = 1)"""
+    ratios = {}
+    for item in text.split(','):
+        ratio, _, weight = item.partition(':')
+        ratios[float(ratio)] = float(weight or 1)
+    return ratios
+
+def prepare_dataset(data_dir, spec, regenerate=False):
+    """สร้าง dataset สังเคราะห์ หรือใช้ของเดิมถ้า spec ตรงกัน คืน spec ในรูปแบบที่บันทึกเป็น JSON"""
+    spec_file = data_dir / 'dataset.json'
+    stored = {**spec, 'aspect_ratios': {str(k): v for k, v in spec['aspect_ratios'].items()}}
+    
+    if not regenerate and spec_file.exists():
+        with open(spec_file, 'r', encoding='utf-8') as f:
+            if json.load(f) == stored:
+                print(f"📁 Reusing synthetic dataset: {data_dir} ({spec['count']} images)")
+                return stored
+    
+    print(f"🎨 Creating synthetic dataset: {data_dir} ({spec['count']} images)...")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    start = time.perf_counter()
+    create_synthetic_dataset(data_dir, spec['count'], spec['heights'], spec['aspect_ratios'], spec['seed'])
+    print(f"✅ Created in {time.perf_counter() - start:.1f}s")
+    
+    with open(spec_file, 'w', encoding='utf-8') as f:
+        json.dump(stored, f, indent=2)
+    
+    return stored
+
+def git_revision(path):
+    """คืน (short commit hash, มีไฟล์ที่ยังไม่ commit หรือไม่) หรือ ('unknown', False) ถ้าไม่ใช่ git repo"""
+    try:
+        commit = subprocess.run(['git', '-C', str(path), 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', '-C', str(path), 'status', '--porcelain', '--untracked-files=no', '--', '.'],
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+def needs_output(stage, stages):
+    """ผลของ stage นี้เป็น input ของขั้นที่เลือกไว้หรือไม่"""
+    later = STAGES[STAGES.index(stage) + 1:]
+    dependents = {'parse': later, 'resize': ['encode', 'write'], 'encode': ['write']}
+    return any(dependent in stages for dependent in dependents.get(stage, []))
+
+def time_stage(stage, context, workers, chunk_size, repeat):
+    """รัน stage repeat ครั้งและคืนสถิติของรอบที่เร็วที่สุด"""
+    best = None
+    for _ in range(max(1, repeat)):
+        # เขียนลง directory ว่างทุกรอบ (ไม่นับเวลาลบ)
+        shutil.rmtree(context['data_dir'] / 'bench_output', ignore_errors=True)
+        
+        start = time.perf_counter()
+        items, num_bytes = run_stage(stage, context, workers, chunk_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    result = {
+        'items': items,
+        'seconds': best,
+        'items_per_second': items / best if best > 0 else 0
+    }
+    if num_bytes is not None:
+        result['bytes'] = num_bytes
+        result['mb_per_second'] = num_bytes / (1024 * 1024) / best if best > 0 else 0
+    return result
+
+def run_stage(stage, context, workers, chunk_size):
+    """รันหนึ่งขั้นตอน เก็บผลลัพธ์ไว้ใน context ให้ขั้นถัดไป คืนค่า (จำนวน items, bytes หรือ None)"""
+    if stage == 'parse':
+        context['labels'] = [record for record in iter_label_file(context['labels_file'], context['image_dir'])
+                             if not record['error']]
+        return len(context['labels']), os.path.getsize(context['labels_file'])
+    
+    labels = context['labels']
+    
+    if stage == 'validate':
+        check = partial(validate_record, image_dir=context['image_dir'])
+        context['valid_count'] = sum(run_in_pool(check, labels, workers, chunk_size))
+        return len(labels), None
+    
+    if stage == 'resize':
+        paths = [context['image_dir'] / label['image_path'] for label in labels]
+        context['resized'] = [image for image in run_in_pool(resize_file, paths, workers, chunk_size) if image is not None]
+        return len(paths), sum(os.path.getsize(path) for path in paths)
+    
+    if stage == 'encode':
+        codec = context.setdefault('codec', create_image_codec())
+        encode = partial(codec.encode, channel_order='BGR')
+        context['encoded'] = list(run_in_pool(encode, context['resized'], workers, chunk_size))
+        return len(context['encoded']), sum(image.nbytes for image in context['resized'])
+    
+    if stage == 'split':
+        train_labels, val_labels = split_data(labels)
+        context['splits'] = {'train': train_labels, 'val': val_labels}
+        return len(labels), None
+    
+    if stage == 'char_dict':
+        char_counts = count_characters((label['text'] for label in labels), workers)
+        context['char_dict'] = create_character_dict(labels, char_counts=char_counts)
+        return len(labels), None
+    
+    if stage == 'write':
+        return write_outputs(context)
+    
+    raise ValueError(f"Unknown stage: {stage}")
+
+def validate_record(label, image_dir):
+    """(ทำงานใน worker process) ตรวจสอบคู่รูปภาพ/ข้อความจาก header"""
+    is_valid, _ = validate_image_text_pair(label['image_path'], label['text'], image_dir)
+    return is_valid
+
+def resize_file(path, target_height=32, max_width=512, min_width=16):
+    """(ทำงานใน worker process) โหลดและปรับขนาดรูปภาพหนึ่งไฟล์ (BGR เหมือน resize_images.py)"""
+    image, source_size = load_image_for_resize(path, target_height, max_width, min_width, channel_order='BGR')
+    return resize_image_keep_ratio(image, target_height, max_width, min_width, source_size)
+
+def write_outputs(context):
+    """เขียนรูปที่ encode แล้วและไฟล์ annotation แบบ convert_data.py"""
+    output_dir = context['data_dir'] / 'bench_output'
+    image_dir = output_dir / 'images'
+    image_dir.mkdir(parents=True, exist_ok=True)
+    
+    labels = context['labels']
+    num_bytes = 0
+    lines = []
+    for label, data in zip(labels, context['encoded']):
+        output_filename = f"{Path(label['image_path']).stem}_resized.jpg"
+        with open(image_dir / output_filename, 'wb') as f:
+            f.write(data)
+        num_bytes += len(data)
+        lines.append(f"images/{output_filename}\t{label['text']}")
+    
+    with open(output_dir / 'annotation.txt', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    
+    return len(lines), num_bytes
+
+def compare_results(results, baseline_file, tolerance):
+    """แสดงการเปลี่ยนแปลงของเวลาแต่ละขั้นเทียบกับ baseline คืนจำนวนขั้นที่ช้าลงเกิน tolerance"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    
+    print(f"\n📊 Compared with {baseline_file} (commit {baseline.get('commit', 'unknown')}):")
+    if baseline.get('dataset') != results['dataset']:
+        print("⚠️  Dataset spec differs from the baseline - timings are not directly comparable")
+    
+    regressions = 0
+    print(f"{'stage':<10} {'mode':<9} {'baseline':>9} {'current':>9} {'change':>8}")
+    for stage, modes in results['stages'].items():
+        for mode, current in modes.items():
+            previous = baseline.get('stages', {}).get(stage, {}).get(mode)
+            if not previous or previous.get('workers') != current['workers'] or not previous['seconds']:
+                continue
+            
+            change = current['seconds'] / previous['seconds'] - 1
+            flag = ''
+            if change > tolerance and current['seconds'] - previous['seconds'] > NOISE_FLOOR_SECONDS:
+                regressions += 1
+                flag = ' 🐢'
+            print(f"{stage:<10} {mode:<9} {previous['seconds']:>8.3f}s {current['seconds']:>8.3f}s {change:>+7.1%}{flag}")
+    
+    return regressions
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Reduced-resolution JPEG decode benchmark
+เปรียบเทียบความเร็วและคุณภาพระหว่าง decode เต็มรูปกับ decode แบบย่อ (--decode auto) ก่อนปรับขนาดเป็นความสูงของ Recognition
+
+Usage:
+    # รูปบรรทัดข้อความสังเคราะห์ความละเอียดสูง (ไม่ต้องมีข้อมูลจริง)
+    python benchmarks/reduced_decode.py
+    
+    # ใช้รูปจริง และกำหนดเกณฑ์คุณภาพขั้นต่ำ (PSNR เทียบกับผลจาก decode เต็มรูป)
+    python benchmarks/reduced_decode.py --input-dir input/images --min-psnr 30 --output output/benchmarks/reduced_decode.json
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from utils import *
+
+SAMPLE_TEXTS = [
+    "สวัสดีครับ ภาษาไทย",
+    "PaddleOCR Recognition",
+    "Invoice No. 2024-00042",
+    "Hello World 1234567890",
+    "Machine Learning",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reduced-resolution JPEG decoding before resizing')
+    parser.add_argument('--input-dir', default=None,
+                       help='Use the JPEG files in this directory instead of synthetic text lines')
+    parser.add_argument('--count', type=int, default=100,
+                       help='Number of synthetic images')
+    parser.add_argument('--heights', default='64,128,256,512,1024',
+                       help='Comma-separated source heights of the synthetic images')
+    parser.add_argument('--target-height', type=int, default=32,
+                       help='Target image height in pixels')
+    parser.add_argument('--max-width', type=int, default=512,
+                       help='Maximum image width')
+    parser.add_argument('--min-width', type=int, default=16,
+                       help='Minimum image width')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Timed passes over all images (the fastest pass is reported)')
+    parser.add_argument('--min-psnr', type=float, default=30.0,
+                       help='Quality tolerance: every image must stay at or above this PSNR (dB) against the full decode')
+    parser.add_argument('--output', default=None,
+                       help='Write the results to this JSON file')
+    
+    args = parser.parse_args()
+    setup_logging(log_file=None)
+    
+    print("⏱️  Reduced JPEG Decode Benchmark")
+    print("="*50)
+    
+    if args.input_dir:
+        samples = [(path.name, path.read_bytes()) for path in sorted(Path(args.input_dir).iterdir())
+                   if path.suffix.lower() in ('.jpg', '.jpeg')]
+    else:
+        heights = [int(height) for height in args.heights.split(',')]
+        samples = create_synthetic_samples(args.count, heights)
+    
+    if not samples:
+        print("❌ No JPEG images to benchmark")
+        sys.exit(1)
+    
+    print(f"📊 {len(samples)} JPEG images, {sum(len(data) for _, data in samples) / (1024 * 1024):.1f} MB")
+    print(f"🎯 Target height: {args.target_height}px, width {args.min_width}-{args.max_width}px")
+    
+    resize_args = (args.target_height, args.max_width, args.min_width)
+    full_seconds, full_outputs = time_decode_mode(samples, 'full', resize_args, args.repeat)
+    auto_seconds, auto_outputs = time_decode_mode(samples, 'auto', resize_args, args.repeat)
+    
+    # คุณภาพ: เทียบผลลัพธ์สุดท้ายของ decode แบบย่อกับ decode เต็มรูปทีละรูป
+    psnr_values = []
+    scales = Counter()
+    size_mismatches = 0
+    for (name, data), full_image, auto_image in zip(samples, full_outputs, auto_outputs):
+        if full_image is None or auto_image is None:
+            continue
+        if full_image.shape != auto_image.shape:
+            size_mismatches += 1
+            continue
+        
+        psnr_values.append(compute_psnr(full_image, auto_image))
+        width, height = Image.open(io.BytesIO(data)).size
+        scales[reduced_decode_scale(width, height, *resize_args)] += 1
+    
+    speedup = full_seconds / auto_seconds if auto_seconds > 0 else 0
+    results = {
+        'images': len(samples),
+        'full_decode_seconds': full_seconds,
+        'reduced_decode_seconds': auto_seconds,
+        'full_images_per_second': len(samples) / full_seconds if full_seconds > 0 else 0,
+        'reduced_images_per_second': len(samples) / auto_seconds if auto_seconds > 0 else 0,
+        'speedup': speedup,
+        'decode_scales': {f"1/{scale}": count for scale, count in sorted(scales.items())},
+        'size_mismatches': size_mismatches,
+        'psnr_db': {
+            'min': min(psnr_values, default=0.0),
+            'median': statistics.median(psnr_values) if psnr_values else 0.0,
+            'tolerance': args.min_psnr
+        }
+    }
+    
+    print(f"\n{'mode':<10} {'seconds':>9} {'images/s':>10}")
+    print(f"{'full':<10} {full_seconds:>9.3f} {results['full_images_per_second']:>10.1f}")
+    print(f"{'auto':<10} {auto_seconds:>9.3f} {results['reduced_images_per_second']:>10.1f}")
+    print(f"\n🚀 Speedup: {speedup:.2f}x")
+    print(f"🔍 Decode scales: " + ", ".join(f"{key}×{count}" for key, count in results['decode_scales'].items()))
+    print(f"📐 PSNR vs full decode: min {results['psnr_db']['min']:.1f} dB, "
+          f"median {results['psnr_db']['median']:.1f} dB (tolerance {args.min_psnr:.1f} dB)")
+    
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    if size_mismatches or results['psnr_db']['min'] < args.min_psnr:
+        print(f"❌ Quality check failed ({size_mismatches} size mismatches)")
+        sys.exit(1)
+    
+    print("✅ Quality within tolerance")
+
+def create_synthetic_samples(count, heights, quality=92, seed=42):
+    """สร้างรูปบรรทัดข้อความ JPEG ความละเอียดสูง (พื้นหลังมี noise ให้คล้ายรูปสแกน) คืน list (ชื่อ, bytes)"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    
+    for index in range(count):
+        height = heights[index % len(heights)]
+        text = SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)]
+        
+        # ฟอนต์ที่มากับ Pillow (ต้องมี FreeType) ปรับขนาดได้
+        font = ImageFont.load_default(size=int(height * 0.6))
+        width = int(font.getlength(text)) + height
+        
+        image = Image.new('RGB', (width, height), (235, 232, 224))
+        ImageDraw.Draw(image).text((height // 2, height // 6), text, font=font, fill=(25, 25, 35))
+        
+        noisy = np.asarray(image, dtype=np.int16) + rng.normal(0, 6, (height, width, 1)).astype(np.int16)
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=quality)
+        samples.append((f"synthetic_{index:04d}_h{height}.jpg", buffer.getvalue()))
+    
+    return samples
+
+def time_decode_mode(samples, decode, resize_args, repeat):
+    """decode + resize ทุกรูปในหน่วยความจำ (ไม่รวม disk I/O) คืน (เวลาของรอบที่เร็วที่สุด, ผลลัพธ์)"""
+    best = None
+    outputs = []
+    
+    for _ in range(max(1, repeat)):
+        outputs = []
+        start = time.perf_counter()
+        for _, data in samples:
+            image, source_size = decode_image_for_resize(data, *resize_args, decode=decode)
+            outputs.append(resize_image_keep_ratio(image, *resize_args, source_size))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    return best, outputs
+
+def compute_psnr(reference, image):
+    """PSNR (dB) ของ image เทียบกับ reference (เหมือนกันทุก pixel = 99)"""
+    mse = np.mean((reference.astype(np.float64) - image.astype(np.float64)) ** 2)
+    return 99.0 if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+
+if __name__ == "__main__":
+    main()
@@ -11,16 +11,58 @@ Options:
     --output-dir: Output directory (default: output/recognition_dataset)
     --target-height: Target image height in pixels (default: 32)
     --train-ratio: Training data ratio (default: 0.8)
+    --split-mode: shuffle (exact ratio), hash (stable per image, new data never moves old samples)
+                  or stratified (balance length buckets and rare characters across train/val)
+    --rare-char-count: Characters found in at most this many labels are balanced by --split-mode stratified (default: 20)
+    --seed: Random seed for the train/val split (default: 42)
+    --workers: Number of worker processes (default: 1 = serial)
+    --chunk-size: Labels per work unit sent to a worker (default: 64)
+    --quality: JPEG/WebP quality of the output images (default: 95)
+    --codec: Encoder backend: auto, turbojpeg, cv2 or pil (default: auto = fastest installed)
+    --image-format: Output image format: jpeg, png or webp (default: jpeg)
+    --no-optimize: Skip the optimizing Huffman pass of JPEG (faster, larger files)
+    --lossless: Lossless WebP output (PNG is always lossless)
+    --decode: auto (reduced-resolution decode for large JPEGs) or full (default: auto)
+    --no-cache: Reprocess every image and do not update the conversion cache
+    --text-only: Treat every label line as text only and map lines to images in order
+    --image-name-pattern: Image name for text-only lines, e.g. img_{index:03d}.jpg (index from 1)
+    --file-index: Reuse/save the input image listing (JSON) for text-only mapping
+    --output-format: files (one JPEG per sample) or shards (packed LMDB/tar shards)
+    --shard-format: Shard type for --output-format shards: lmdb or tar (default: lmdb)
+    --shard-size: Samples per shard (default: 50000)
+    --dedup: off, group (keep duplicates in the same split) or drop (keep the first of each group)
+    --dedup-distance: Maximum dHash distance for near duplicates (default: 4, 0 = exact only)
+    --normalize: Unicode normalization applied to label text: none, NFC or NFKC (default: none)
+    --min-char-freq: Drop characters seen fewer times from character_dict.txt (default: 1 = keep all)
+    --profile: off, cprofile or tracemalloc (stage metrics are always saved to output/validation_reports/run_metrics.json)
 """
 
 import argparse
+import hashlib
 import sys
+import os
+import json
+import shutil
+from collections import deque
+from functools import partial
 from pathlib import Path
 
 # เพิ่ม path สำหรับ import utils
 sys.path.append(str(Path(__file__).parent))
 
 from utils import *
+from shard_writer import SHARD_FORMATS, create_shard_writer
+from image_codec import CODEC_BACKENDS, IMAGE_FORMATS, create_image_codec
+from dedup_images import HASH_CACHE_FILE, hash_images, find_duplicate_groups, save_duplicate_report
+from run_metrics import PROFILE_MODES, RunMetrics
+
+# รูปภาพที่ผ่านการตรวจสอบและปรับขนาดแล้ว (หนึ่งไฟล์ต่อรูปต้นฉบับ) เก็บไว้ที่นี่เป็น conversion cache
+# images/train และ images/val เป็น hard link (หรือสำเนา) ของไฟล์เหล่านี้
+STAGING_DIR = 'output/recognition_dataset/images/.staging'
+
+# cache ผลการแปลงรูปภาพ (หนึ่ง JSON ต่อบรรทัด) สำหรับการรันซ้ำแบบ incremental
+# อยู่นอก recognition_dataset เพราะมี path และ mtime ของเครื่องนี้ (upload_to_s3.py อัปโหลดทั้ง dataset directory)
+CACHE_FILE = 'output/cache/conversion_cache.jsonl'
 
 def main():
     parser = argparse.ArgumentParser(description='Convert data to Recognition format')
@@ -34,12 +76,66 @@ def main():
                        help='Target image height in pixels')
     parser.add_argument('--train-ratio', type=float, default=0.8,
                        help='Training data ratio')
+    parser.add_argument('--split-mode', choices=['shuffle', 'hash', 'stratified'], default='shuffle',
+                       help='shuffle = exact ratio; hash = split from a hash of each image path, stable when data is appended; '
+                            'stratified = balance text length buckets and rare characters across train/val')
+    parser.add_argument('--rare-char-count', type=int, default=20,
+                       help='Characters found in at most this many labels are spread over both splits (--split-mode stratified)')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed for the train/val split')
     parser.add_argument('--max-width', type=int, default=512,
                        help='Maximum image width')
     parser.add_argument('--min-width', type=int, default=16,
                        help='Minimum image width')
+    parser.add_argument('--workers', type=int, default=1,
+                       help=f'Number of worker processes (1 = serial, max {os.cpu_count()})')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                       help='Number of labels per work unit sent to a worker')
+    parser.add_argument('--quality', type=int, default=95,
+                       help='JPEG/WebP quality (1-100)')
+    parser.add_argument('--codec', choices=CODEC_BACKENDS, default='auto',
+                       help='Image encoder backend (auto = fastest installed backend that supports the format)')
+    parser.add_argument('--image-format', choices=list(IMAGE_FORMATS), default='jpeg',
+                       help='Output image format')
+    parser.add_argument('--no-optimize', action='store_true',
+                       help='Skip the optimizing Huffman pass of JPEG (faster encode, larger files)')
+    parser.add_argument('--lossless', action='store_true',
+                       help='Lossless WebP output (PNG is always lossless)')
+    parser.add_argument('--decode', choices=DECODE_MODES, default='auto',
+                       help='auto = reduced-resolution JPEG decode when the image is much larger than the target; full = always decode at full size')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Reprocess every image and do not update the conversion cache')
+    parser.add_argument('--text-only', action='store_true',
+                       help='Label file contains text only; map line N to the N-th image (sorted by name)')
+    parser.add_argument('--image-name-pattern', default=None,
+                       help='Image file name for text-only lines, e.g. img_{index:03d}.jpg (index starts at 1)')
+    parser.add_argument('--file-index', default=None,
+                       help='Save/reuse the input image listing as a JSON index (shared with resize_images.py --file-index)')
+    parser.add_argument('--output-format', choices=['files', 'shards'], default='files',
+                       help='Write one JPEG per sample (files) or pack samples into shards')
+    parser.add_argument('--shard-format', choices=SHARD_FORMATS, default='lmdb',
+                       help='Shard type for --output-format shards (lmdb = PaddleOCR LMDBDataSet)')
+    parser.add_argument('--shard-size', type=int, default=50000,
+                       help='Number of samples per shard')
+    parser.add_argument('--dedup', choices=['off', 'group', 'drop'], default='off',
+                       help='Duplicate handling: keep duplicates in one split (group) or keep only the first (drop)')
+    parser.add_argument('--dedup-distance', type=int, default=4,
+                       help='Maximum dHash Hamming distance for near duplicates (0 = exact duplicates only)')
+    parser.add_argument('--normalize', choices=['none', 'NFC', 'NFKC'], default='none',
+                       help='Unicode normalization of label text (NFC gives Thai combining marks a single order)')
+    parser.add_argument('--min-char-freq', type=int, default=1,
+                       help='Characters seen fewer times are left out of character_dict.txt')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default='off',
+                       help='Profile the main process with cProfile or tracemalloc (results in run_metrics.json)')
     
     args = parser.parse_args()
+    if args.image_name_pattern:
+        try:
+            check_image_name_pattern(args.image_name_pattern)
+        except ValueError as e:
+            parser.error(f"--image-name-pattern: {e}")
+    setup_logging()
+    normalization = None if args.normalize == 'none' else args.normalize
     
     print("🚀 PaddleOCR Recognition Data Converter")
     print("="*50)
@@ -53,34 +149,108 @@ def main():
         print(f"❌ Input labels file not found: {args.input_labels}")
         return
     
+    if args.output_format == 'shards' and args.shard_format == 'lmdb':
+        try:
+            import lmdb
+        except ImportError:
+            print("❌ lmdb not installed. Run: pip install lmdb (or use --shard-format tar)")
+            return
+    
+    try:
+        codec = create_image_codec(args.codec, args.image_format, args.quality,
+                                   not args.no_optimize, args.lossless)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    
     # สร้าง directories
     setup_directories()
     
-    # Step 1: Parse labels
-    print("\n📝 Step 1: Parsing label file...")
-    labels = parse_label_file(args.input_labels, args.input_images)
+    metrics = RunMetrics('convert_data', args.profile)
     
-    if not labels:
-        print("❌ No valid labels found!")
-        return
+    # Step 1: ตรวจสอบขนาดไฟล์ label (อ่านแบบ streaming ในขั้นตอนถัดไป)
+    print("\n📝 Step 1: Reading label file...")
+    total_lines = count_lines(args.input_labels)
+    print(f"✅ Found {total_lines} lines")
+    print(f"🖼️  Output images: {codec.describe()}")
+    if args.workers > 1:
+        print(f"⚙️  Using {args.workers} worker processes")
     
-    print(f"✅ Found {len(labels)} labels")
-    
-    # Step 2: Validate data
-    print("\n🔍 Step 2: Validating image-text pairs...")
+    # Step 2: Parse, validate and process images (decode แต่ละรูปเพียงครั้งเดียว)
+    print("\n🔍 Step 2: Validating and processing images...")
     valid_labels = []
     error_log = []
+    parsed_count = 0
+    
+    Path(STAGING_DIR).mkdir(parents=True, exist_ok=True)
+    
+    cache = {} if args.no_cache else load_conversion_cache(CACHE_FILE)
+    cache_entries = {}
+    reused_count = 0
+    
+    metrics.start_stage('convert')
+    progress_bar = create_progress_bar(total_lines, "Validating & resizing")
+    
+    convert = partial(
+        convert_cached_image,
+        input_dir=args.input_images,
+        output_dir=STAGING_DIR,
+        target_height=args.target_height,
+        max_width=args.max_width,
+        min_width=args.min_width,
+        quality=args.quality,
+        decode=args.decode,
+        codec=codec
+    )
     
-    progress_bar = create_progress_bar(len(labels), "Validating")
-    
-    for label in labels:
-        is_valid, message = validate_image_text_pair(
-            label['image_path'], 
-            label['text'], 
-            args.input_images
-        )
+    # labels ที่ส่งให้ pool แล้วแต่ยังไม่ได้ผลลัพธ์ (ผลลัพธ์กลับมาตามลำดับเสมอ)
+    in_flight = deque()
+    # รูปต้นฉบับเดียวกันถูกแปลงครั้งเดียว labels ที่อ้างถึงรูปซ้ำใช้ผลของ label แรก
+    results = {}
+    
+    def iter_tasks():
+        nonlocal parsed_count
+        submitted = set()
+        for record in iter_label_file(args.input_labels, args.input_images,
+                                      args.text_only, args.image_name_pattern, args.file_index):
+            if record['error']:
+                logging.warning(record['error'])
+                progress_bar.update(1)
+                continue
+            
+            parsed_count += 1
+            record['text'] = normalize_text(record['text'], normalization)
+            record['source'] = source_key(record, args.input_images)
+            record['duplicate'] = record['source'] in submitted
+            in_flight.append(record)
+            
+            if record['duplicate']:
+                continue
+            # label แรกที่ข้อความผิดไม่ได้บันทึกรูป label ถัดไปของรูปเดียวกันจึงต้องส่งไปแปลงเอง
+            if check_text(record['text'])[0]:
+                submitted.add(record['source'])
+            # ส่งเฉพาะ cache entry ของรูปนั้นไปกับงาน (ไม่ส่ง cache ทั้งหมดให้ worker)
+            yield record, cache.get(record['source'])
+    
+    def record_result(label, result):
+        nonlocal reused_count
+        is_valid, message, staged_path, cache_entry = result
+        
+        # ผลของรูปมาจาก label แรก ตรวจสอบข้อความของ label ที่อ้างถึงรูปซ้ำเอง
+        if label['duplicate'] and is_valid:
+            is_valid, message = check_text(label['text'])
+        
+        if not label['duplicate']:
+            results[label['source']] = result
+            if cache_entry is not None:
+                cache_entries[cache_entry['source']] = cache_entry
+                # ชื่อใน staging เหมือนเดิมทุกรอบ จึงเทียบทั้ง entry (รวมพารามิเตอร์) แทนการเทียบ path
+                if staged_path and cache_entry == cache.get(cache_entry['source']):
+                    reused_count += 1
         
         if is_valid:
+            label['staged_path'] = staged_path
+            label['cache_entry'] = cache_entry
             valid_labels.append(label)
         else:
             error_log.append(f"Line {label['line_number']}: {message}")
@@ -88,10 +258,29 @@ def main():
         
         progress_bar.update(1)
     
+    def record_duplicates():
+        # label ที่อ้างถึงรูปซ้ำอยู่หลัง label แรกของรูปนั้นเสมอ (ผลพร้อมแล้วเมื่อถึงคิว)
+        while in_flight and in_flight[0]['duplicate']:
+            label = in_flight.popleft()
+            record_result(label, results[label['source']])
+    
+    for result in run_in_pool(convert, iter_tasks(), args.workers, args.chunk_size):
+        record_duplicates()
+        record_result(in_flight.popleft(), result)
+    record_duplicates()
+    
     progress_bar.close()
+    metrics.end_stage(parsed_count, sum(entry['size'] for entry in cache_entries.values()))
+    
+    if not parsed_count:
+        print("❌ No valid labels found!")
+        return
     
+    print(f"✅ Parsed labels: {parsed_count}")
     print(f"✅ Valid pairs: {len(valid_labels)}")
     print(f"❌ Invalid pairs: {len(error_log)}")
+    if reused_count:
+        print(f"♻️  Reused from cache: {reused_count}")
     
     if not valid_labels:
         print("❌ No valid data found!")
@@ -105,86 +294,172 @@ def main():
             for error in error_log:
                 f.write(f"{error}\n")
     
+    # Step 2b: หารูปซ้ำ (hash ของรูปต้นฉบับ คำนวณแบบขนานและ cache ไว้)
+    group_key = None
+    if args.dedup != 'off':
+        print("\n🧬 Step 2b: Finding duplicate images...")
+        metrics.start_stage('dedup')
+        
+        entries = hash_images(
+            [source_key(label, args.input_images) for label in valid_labels],
+            args.workers, args.chunk_size, None if args.no_cache else HASH_CACHE_FILE
+        )
+        groups = find_duplicate_groups(entries, args.dedup_distance, [label['text'] for label in valid_labels])
+        save_duplicate_report(groups, valid_labels, 'output/validation_reports/duplicates.json')
+        print(f"✅ Duplicate groups: {len(groups)} "
+              f"({sum(len(group['members']) - 1 for group in groups)} redundant images)")
+        
+        if args.dedup == 'drop':
+            # เก็บรูปแรกของแต่ละกลุ่ม (รูปที่ถูกตัดยังอยู่ใน staging เป็น conversion cache)
+            dropped = {i for group in groups for i in group['members'][1:]}
+            valid_labels = [label for i, label in enumerate(valid_labels) if i not in dropped]
+            print(f"🗑️  Dropped {len(dropped)} duplicates")
+        else:
+            # รูปในกลุ่มเดียวกันต้องอยู่ split เดียวกัน (ป้องกันข้อมูลรั่วระหว่าง train/val)
+            # ใช้ path ของรูปแรกในกลุ่มเป็น key เพื่อให้ --split-mode hash ให้ผลเดิมเมื่อเพิ่มข้อมูล
+            for group in groups:
+                group_id = valid_labels[group['members'][0]]['image_path']
+                for i in group['members']:
+                    valid_labels[i]['dedup_group'] = group_id
+            group_key = lambda label: label.get('dedup_group')
+        
+        metrics.end_stage(len(entries))
+    
     # Step 3: Split data
     print("\n📊 Step 3: Splitting data...")
-    train_labels, val_labels = split_data(valid_labels, args.train_ratio)
-    
-    # Step 4: Process images
-    print("\n🖼️  Step 4: Processing and resizing images...")
+    metrics.start_stage('split')
+    train_labels, val_labels = split_data(valid_labels, args.train_ratio, args.seed,
+                                          group_key=group_key, mode=args.split_mode,
+                                          rare_char_count=args.rare_char_count)
+    print(f"✅ Train: {len(train_labels)}, Val: {len(val_labels)} ({args.split_mode} split, seed {args.seed})")
+    metrics.end_stage(len(valid_labels))
+    
+    # Step 4: ย้ายรูปภาพที่ประมวลผลแล้วเข้า train/val (หรือรวมเป็น shards)
+    if args.output_format == 'shards':
+        print(f"\n🖼️  Step 4: Packing processed images into {args.shard_format} shards...")
+    else:
+        print("\n🖼️  Step 4: Organizing processed images...")
     
     processed_count = 0
     failed_count = 0
-    
-    # Process training images
-    train_annotation_lines = []
-    progress_bar = create_progress_bar(len(train_labels), "Processing train images")
-    
-    for label in train_labels:
-        success = process_single_image(
-            label, args.input_images, 
-            'output/recognition_dataset/images/train',
-            args.target_height, args.max_width, args.min_width
-        )
+    annotation_lines = {}
+    shard_info = {}
+    
+    metrics.start_stage('organize')
+    
+    for split_name, split_labels in [('train', train_labels), ('val', val_labels)]:
+        if args.output_format == 'shards':
+            packed, failed, shards = pack_split_into_shards(
+                split_labels,
+                f'output/recognition_dataset/shards/{split_name}',
+                args.shard_format,
+                args.shard_size,
+                codec.extension
+            )
+            processed_count += packed
+            failed_count += failed
+            shard_info[split_name] = shards
+            annotation_lines[split_name] = []
+            continue
         
-        if success:
-            # สร้างบรรทัด annotation
-            new_image_path = f"images/train/{Path(label['image_path']).stem}_resized.jpg"
-            train_annotation_lines.append(f"{new_image_path}\t{label['text']}")
-            processed_count += 1
-        else:
-            failed_count += 1
+        split_lines = []
+        split_dir = Path(f'output/recognition_dataset/images/{split_name}')
         
-        progress_bar.update(1)
+        # ลบรูปของรอบก่อน (label อาจย้าย split หรือถูกลบออกจากไฟล์ label แล้ว)
+        for old_file in split_dir.glob('*_resized.*'):
+            old_file.unlink()
+        
+        # ชื่อไฟล์ของแต่ละรูปต้นฉบับใน split นี้ (รูปต่าง directory ที่ชื่อซ้ำกันใช้ชื่อจาก staging แทน)
+        output_sources = {}
+        
+        for label in split_labels:
+            output_filename = f"{Path(label['image_path']).stem}_resized{codec.extension}"
+            if output_sources.setdefault(output_filename, label['source']) != label['source']:
+                output_filename = staged_image_name(label['source'], codec.extension)
+            
+            output_path = split_dir / output_filename
+            
+            if label['staged_path'] and link_staged_image(label['staged_path'], output_path):
+                # สร้างบรรทัด annotation
+                split_lines.append(f"images/{split_name}/{output_filename}\t{label['text']}")
+                processed_count += 1
+            else:
+                label['cache_entry']['output'] = None
+                failed_count += 1
+        
+        annotation_lines[split_name] = split_lines
     
-    progress_bar.close()
+    # ลบรูปใน staging ที่ไม่มี label ใช้แล้ว (รูปต้นฉบับถูกลบ หรือพารามิเตอร์เปลี่ยน)
+    remove_unused_staged_images(STAGING_DIR, {entry.get('output') for entry in cache_entries.values()})
     
-    # Process validation images
-    val_annotation_lines = []
-    progress_bar = create_progress_bar(len(val_labels), "Processing val images")
+    # บันทึก cache สำหรับการรันครั้งถัดไป
+    if not args.no_cache:
+        save_conversion_cache(CACHE_FILE, cache_entries.values())
     
-    for label in val_labels:
-        success = process_single_image(
-            label, args.input_images,
-            'output/recognition_dataset/images/val',
-            args.target_height, args.max_width, args.min_width
-        )
-        
-        if success:
-            # สร้างบรรทัด annotation
-            new_image_path = f"images/val/{Path(label['image_path']).stem}_resized.jpg"
-            val_annotation_lines.append(f"{new_image_path}\t{label['text']}")
-            processed_count += 1
-        else:
-            failed_count += 1
-        
-        progress_bar.update(1)
+    metrics.end_stage(len(train_labels) + len(val_labels))
     
-    progress_bar.close()
+    train_annotation_lines = annotation_lines['train']
+    val_annotation_lines = annotation_lines['val']
     
     # Step 5: Save annotations
     print("\n📋 Step 5: Saving annotations...")
+    metrics.start_stage('write')
+    
+    if args.output_format == 'shards':
+        # labels อยู่ใน shards แล้ว บันทึกเฉพาะรายการ shard
+        shard_index = {
+            'shard_format': args.shard_format,
+            'shard_size': args.shard_size,
+            'splits': shard_info
+        }
+        with open('output/recognition_dataset/metadata/shards.json', 'w', encoding='utf-8') as f:
+            json.dump(shard_index, f, ensure_ascii=False, indent=2)
+        
+        for split_name, shards in shard_info.items():
+            print(f"✅ Saved {split_name} shards: {len(shards)} shards, "
+                  f"{sum(shard['samples'] for shard in shards)} entries")
+    else:
+        # บันทึก train annotation
+        with open('output/recognition_dataset/annotations/train_annotation.txt', 'w', encoding='utf-8') as f:
+            for line in train_annotation_lines:
+                f.write(f"{line}\n")
+        
+        # บันทึก val annotation
+        with open('output/recognition_dataset/annotations/val_annotation.txt', 'w', encoding='utf-8') as f:
+            for line in val_annotation_lines:
+                f.write(f"{line}\n")
+        
+        print(f"✅ Saved train annotation: {len(train_annotation_lines)} entries")
+        print(f"✅ Saved val annotation: {len(val_annotation_lines)} entries")
     
-    # บันทึก train annotation
-    with open('output/recognition_dataset/annotations/train_annotation.txt', 'w', encoding='utf-8') as f:
-        for line in train_annotation_lines:
-            f.write(f"{line}\n")
-    
-    # บันทึก val annotation
-    with open('output/recognition_dataset/annotations/val_annotation.txt', 'w', encoding='utf-8') as f:
-        for line in val_annotation_lines:
-            f.write(f"{line}\n")
-    
-    print(f"✅ Saved train annotation: {len(train_annotation_lines)} entries")
-    print(f"✅ Saved val annotation: {len(val_annotation_lines)} entries")
+    metrics.end_stage(processed_count)
     
     # Step 6: Create metadata
     print("\n📊 Step 6: Creating metadata...")
+    metrics.start_stage('metadata')
+    
+    # นับใน process หลัก: bincount เร็วกว่าการส่งข้อความไปให้ worker
+    char_counts = count_characters(label['text'] for label in valid_labels)
+    char_dict = create_character_dict(valid_labels, args.min_char_freq, char_counts)
+    save_character_frequencies(char_counts, 'output/recognition_dataset', args.min_char_freq)
+    
+    # labels ที่มีตัวอักษรที่ถูกตัดออก (PaddleOCR จะข้ามตัวอักษรที่ไม่อยู่ใน dictionary)
+    pruned_chars = {char for char, count in char_counts.items() if count < args.min_char_freq}
+    affected_count = sum(1 for label in valid_labels if not pruned_chars.isdisjoint(label['text']))
+    if pruned_chars:
+        print(f"✂️  Pruned {len(pruned_chars)} rare characters (used by {affected_count} labels)")
     
-    char_dict = create_character_dict(valid_labels)
     metadata = save_dataset_metadata(
         train_labels, val_labels, char_dict,
-        'output/recognition_dataset'
+        'output/recognition_dataset',
+        character_stats={
+            'normalization': normalization,
+            'min_freq': args.min_char_freq,
+            'pruned_characters': len(pruned_chars),
+            'labels_with_pruned_characters': affected_count
+        }
     )
+    metrics.end_stage(len(valid_labels))
     
     # Step 7: Summary
     print("\n📈 Step 7: Generating summary...")
@@ -192,52 +467,231 @@ def main():
     
     # แสดงตัวอย่างผลลัพธ์
     print("\n🎯 Sample results:")
-    print("Training annotation (first 5 lines):")
-    for line in train_annotation_lines[:5]:
-        print(f"  {line}")
-    
-    if len(train_annotation_lines) > 5:
-        print(f"  ... and {len(train_annotation_lines) - 5} more")
+    if args.output_format == 'shards':
+        print("Training shards:")
+        for shard in shard_info['train'][:5]:
+            print(f"  {shard['path']} ({shard['samples']} samples)")
+    else:
+        print("Training annotation (first 5 lines):")
+        for line in train_annotation_lines[:5]:
+            print(f"  {line}")
+        
+        if len(train_annotation_lines) > 5:
+            print(f"  ... and {len(train_annotation_lines) - 5} more")
     
     print(f"\n✅ Data conversion completed!")
     print(f"📁 Output directory: output/recognition_dataset/")
     print(f"📊 Statistics: {metadata['text_statistics']}")
     print(f"🔤 Characters: {metadata['character_info']['total_characters']}")
     
+    metrics.set(parsed=parsed_count, valid=len(valid_labels), invalid=len(error_log), reused_from_cache=reused_count,
+                processed=processed_count, failed=failed_count, train=len(train_labels), val=len(val_labels),
+                workers=args.workers, encoder=codec.describe())
+    metrics.print_summary()
+    metrics.save()
+    
     print(f"\n🚀 Next steps:")
     print(f"1. Review results in: output/validation_reports/")
     print(f"2. Upload to S3: python scripts/upload_to_s3.py")
     print(f"3. Start training: ../paddle_ocr_recognition_training.ipynb")
 
-def process_single_image(label, input_dir, output_dir, target_height, max_width, min_width):
-    """ประมวลผลรูปภาพหนึ่งไฟล์"""
+def source_key(label, input_dir):
+    """คืน path ของรูปต้นฉบับที่ใช้เป็น key ของ conversion cache"""
+    return str(Path(input_dir) / label['image_path'])
+
+def load_conversion_cache(cache_file):
+    """โหลด conversion cache (JSON lines) เป็น dict ตาม source path"""
+    cache = {}
+    
+    if not Path(cache_file).exists():
+        return cache
+    
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cache[entry['source']] = entry
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable conversion cache {cache_file}: {e}")
+        return {}
+    
+    logging.info(f"Loaded {len(cache)} conversion cache entries")
+    return cache
+
+def save_conversion_cache(cache_file, entries):
+    """บันทึก conversion cache แบบ atomic (เขียนไฟล์ชั่วคราวแล้วแทนที่)"""
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    temp_file = f"{cache_file}.tmp"
+    
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    
+    os.replace(temp_file, cache_file)
+    logging.info(f"Saved {len(entries)} conversion cache entries to {cache_file}")
+
+def remove_unused_staged_images(staging_dir, used_paths):
+    """ลบไฟล์ใน staging ที่ไม่อยู่ใน used_paths คืนจำนวนไฟล์ที่ลบ"""
+    removed = 0
+    
+    for path in Path(staging_dir).iterdir():
+        if str(path) not in used_paths:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Cannot remove unused staged image {path}: {e}")
+    
+    if removed:
+        logging.info(f"Removed {removed} unused staged images from {staging_dir}")
+    return removed
+
+def convert_cached_image(task, **kwargs):
+    """แปลงรูปภาพโดยใช้ผลจาก cache ถ้ารูปต้นฉบับและพารามิเตอร์ไม่เปลี่ยน"""
+    label, cache_entry = task
+    return convert_single_image(label, cache_entry=cache_entry, **kwargs)
+
+def convert_single_image(label, input_dir, output_dir, target_height, max_width, min_width,
+                         quality=95, cache_entry=None, decode='auto', codec=None):
+    """ตรวจสอบ ปรับขนาด และบันทึกรูปภาพหนึ่งไฟล์โดย decode เพียงครั้งเดียว
+    
+    คืนค่า (is_valid, message, output_path, new_cache_entry) โดย output_path เป็น None
+    ถ้าบันทึกไม่สำเร็จ ถ้า cache_entry ตรงกับไฟล์และพารามิเตอร์ปัจจุบันจะไม่ decode ซ้ำ
+    """
+    full_image_path = Path(input_dir) / label['image_path']
+    codec = codec or create_image_codec(quality=quality)
+    
+    # ตรวจสอบว่าไฟล์รูปภาพมีอยู่
     try:
-        # โหลดรูปภาพ
-        input_path = Path(input_dir) / label['image_path']
-        image = load_image_safely(input_path)
+        stat = full_image_path.stat()
+    except OSError:
+        return False, f"Image file not found: {full_image_path}", None, None
+    
+    entry = {
+        'source': str(full_image_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'params': {
+            'target_height': target_height,
+            'max_width': max_width,
+            'min_width': min_width,
+            'quality': quality,
+            'decode': decode,
+            'codec': codec.name,
+            'image_format': codec.image_format,
+            'optimize': codec.optimize,
+            'lossless': codec.lossless
+        }
+    }
+    
+    # ใช้ผลจาก cache ถ้ารูปต้นฉบับและพารามิเตอร์ไม่เปลี่ยน
+    if cache_entry and all(cache_entry.get(key) == entry[key] for key in ('size', 'mtime_ns', 'params')):
+        if not cache_entry.get('loadable'):
+            return False, f"Cannot load image: {full_image_path}", None, cache_entry
         
-        if image is None:
-            return False
+        is_valid, message = check_image_size_and_text(
+            cache_entry['width'], cache_entry['height'], label['text']
+        )
+        if not is_valid:
+            return False, message, None, cache_entry
         
+        # ใช้เฉพาะไฟล์ใน staging (ไฟล์ใน images/train|val ถูกลบและสร้างใหม่ทุกรอบ)
+        output_path = cache_entry.get('output')
+        if output_path and Path(output_path).parent == Path(output_dir) and Path(output_path).exists():
+            return True, message, output_path, cache_entry
+    
+    # โหลดรูปภาพ (JPEG ขนาดใหญ่ decode แบบย่อ, ลำดับสี BGR ของ OpenCV ส่งให้ codec โดยไม่แปลง) และตรวจสอบจากขนาดของรูปเต็ม
+    image, source_size = load_image_for_resize(full_image_path, target_height, max_width, min_width, decode, 'BGR')
+    entry['loadable'] = image is not None
+    if image is None:
+        return False, f"Cannot load image: {full_image_path}", None, entry
+    
+    entry['width'], entry['height'] = source_size
+    is_valid, message = check_image_size_and_text(entry['width'], entry['height'], label['text'])
+    
+    if not is_valid:
+        return False, message, None, entry
+    
+    try:
         # ปรับขนาด
         resized_image = resize_image_keep_ratio(
-            image, target_height, max_width, min_width
+            image, target_height, max_width, min_width, source_size
         )
         
         if resized_image is None:
-            return False
+            return True, message, None, entry
         
-        # สร้างชื่อไฟล์ใหม่
-        output_filename = f"{Path(label['image_path']).stem}_resized.jpg"
-        output_path = Path(output_dir) / output_filename
+        # บันทึกรูปภาพ (ชื่อไม่ซ้ำต่อรูปต้นฉบับ)
+        output_path = Path(output_dir) / staged_image_name(entry['source'], codec.extension)
         
-        # บันทึกรูปภาพ
-        success = save_image_safely(resized_image, output_path)
+        if not codec.save(resized_image, output_path, 'BGR'):
+            return True, message, None, entry
         
-        return success
+        entry['output'] = str(output_path)
+        return True, message, str(output_path), entry
         
     except Exception as e:
         logging.error(f"Error processing {label['image_path']}: {e}")
+        return True, message, None, entry
+
+def pack_split_into_shards(split_labels, shard_dir, shard_format, shard_size, image_extension='.jpg'):
+    """รวมรูปภาพที่ประมวลผลแล้วของ split หนึ่งเป็น shards
+    
+    ไฟล์รูปที่ประมวลผลแล้วยังคงอยู่ที่เดิมเพื่อใช้เป็น conversion cache ในการรันครั้งถัดไป
+    คืนค่า (packed, failed, shards)
+    """
+    # ลบ shards เดิมของ split นี้ก่อนเขียนใหม่
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    packed = 0
+    failed = 0
+    
+    with create_shard_writer(shard_format, shard_dir, shard_size, image_extension) as writer:
+        for label in split_labels:
+            staged_path = label['staged_path']
+            
+            try:
+                with open(staged_path, 'rb') as f:
+                    image_bytes = f.read()
+            except (TypeError, OSError) as e:
+                if staged_path:
+                    logging.error(f"Cannot read processed image {staged_path}: {e}")
+                label['cache_entry']['output'] = None
+                failed += 1
+                continue
+            
+            writer.add(image_bytes, label['text'])
+            label['cache_entry']['output'] = staged_path
+            packed += 1
+    
+    return packed, failed, writer.shards
+
+def staged_image_name(source, extension):
+    """ชื่อไฟล์ใน staging ของรูปต้นฉบับ (stem + hash ของ path เต็ม รูปต่าง directory ที่ชื่อเหมือนกันจึงไม่ชนกัน)"""
+    digest = hashlib.blake2b(source.encode('utf-8'), digest_size=6).hexdigest()
+    return f"{Path(source).stem}_{digest}_resized{extension}"
+
+def link_staged_image(staged_path, output_path):
+    """วางรูปภาพจาก staging ไว้ที่ตำแหน่งสุดท้ายด้วย hard link (คัดลอกถ้าสร้าง link ไม่ได้)
+    
+    ไฟล์ใน staging ยังอยู่ที่เดิม จึงใช้ได้กับหลาย label หรือทั้ง train และ val
+    """
+    try:
+        if os.path.lexists(output_path):
+            # รูปเดียวกันถูกอ้างถึงหลายครั้งใน split เดียวกัน
+            if os.path.samefile(staged_path, output_path):
+                return True
+            os.remove(output_path)
+        
+        try:
+            os.link(staged_path, output_path)
+        except OSError:
+            shutil.copyfile(staged_path, output_path)
+        return True
+        
+    except OSError as e:
+        logging.error(f"Cannot place {staged_path} at {output_path}: {e}")
         return False
 
 if __name__ == "__main__":
@@ -4,14 +4,36 @@ Demo script สำหรับสร้างข้อมูลตัวอย
 
 Usage:
     python create_demo_data.py
+    
+    # สร้าง Recognition dataset สังเคราะห์แบบขนาน (ทุก core) จาก corpus และชุดฟอนต์
+    python create_demo_data.py --count 1000000 --corpus corpus.txt --fonts fonts/ --output-dir output/synthetic_dataset
+    
+    # packed shards และเพิ่มตัวอักษรที่พบน้อยใน dataset เดิม
+    python create_demo_data.py --count 200000 --fonts fonts/ --output-format shards --shard-format tar \
+        --char-freq output/recognition_dataset/metadata/character_freq.txt --rare-ratio 0.3
+    
+    # dataset สังเคราะห์ขนาดใหญ่สำหรับ benchmark (เรียกจาก code)
+    create_synthetic_dataset('output/benchmarks/synthetic', count=5000, aspect_ratios={4: 1, 8: 2, 16: 1})
 """
 
+import argparse
+import json
+import os
+import shutil
 import sys
+import time
+import unicodedata
+from collections import Counter
+from functools import partial
 from pathlib import Path
 
 # เพิ่ม path สำหรับ import utils
 sys.path.append(str(Path(__file__).parent))
 
+from utils import *
+from image_codec import CODEC_BACKENDS, IMAGE_FORMATS, create_image_codec
+from shard_writer import SHARD_FORMATS, create_shard_writer
+
 try:
     from PIL import Image, ImageDraw, ImageFont
     import numpy as np
@@ -20,6 +42,148 @@ except ImportError:
     print("pip install Pillow numpy")
     sys.exit(1)
 
+# ส่วนประกอบของพยางค์ไทยสำหรับข้อความสุ่ม (สระ/วรรณยุกต์อยู่ในตำแหน่งที่ถูกต้องเสมอ)
+THAI_CONSONANTS = "กขคฆงจฉชซญฎฏฐฑฒณดตถทธนบปผฝพฟภมยรลวศษสหฬอฮ"
+THAI_FINAL_CONSONANTS = "กงดนบมยวรลส"
+THAI_LEADING_VOWELS = "เแโใไ"
+THAI_UPPER_LOWER_VOWELS = "ิีึืุู"
+THAI_TONE_MARKS = "่้๊๋"
+
+# ตัวอักษรของข้อความสุ่มที่ไม่ใช่ภาษาไทย (ฟอนต์เริ่มต้นของ Pillow วาดได้)
+LATIN_CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+DIGITS = "0123456789"
+
+# การกระจายอัตราส่วนกว้าง/สูงของรูปบรรทัดข้อความ {อัตราส่วน: น้ำหนัก}
+DEFAULT_ASPECT_RATIOS = {2: 1, 4: 3, 8: 4, 12: 2, 16: 1}
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+# ฟอนต์ที่โหลดแล้วและ mask/ความกว้างของแต่ละตัวอักษร (cache ต่อ process)
+_font_cache = {}
+
+def main():
+    parser = argparse.ArgumentParser(description='Create demo data or generate a synthetic Recognition dataset')
+    parser.add_argument('--count', type=int, default=None,
+                       help='Generate this many synthetic text lines (without --count: create the small demo set)')
+    parser.add_argument('--corpus', default=None,
+                       help='Text file with one text line per row (default: random Thai/Latin/digit strings)')
+    parser.add_argument('--fonts', nargs='+', default=[],
+                       help='Font files or directories (.ttf/.otf/.ttc) to draw from; use fonts with Thai glyphs for Thai text')
+    parser.add_argument('--heights', default='32',
+                       help='Comma-separated image heights (default 32 = Recognition target height)')
+    parser.add_argument('--max-width', type=int, default=512,
+                       help='Maximum image width; longer texts are cut to fit')
+    parser.add_argument('--output-dir', default='output/synthetic_dataset',
+                       help='Output dataset directory (same layout as output/recognition_dataset)')
+    parser.add_argument('--output-format', choices=['files', 'shards'], default='files',
+                       help='Write one image per sample (files) or pack samples into shards')
+    parser.add_argument('--shard-format', choices=SHARD_FORMATS, default='lmdb',
+                       help='Shard type for --output-format shards (lmdb = PaddleOCR LMDBDataSet)')
+    parser.add_argument('--shard-size', type=int, default=50000,
+                       help='Number of samples per shard')
+    parser.add_argument('--train-ratio', type=float, default=0.8,
+                       help='Training data ratio (split by a hash of the image name)')
+    parser.add_argument('--char-freq', default=None,
+                       help='character_freq.txt of an existing dataset; its rare characters are added to --rare-ratio of the lines')
+    parser.add_argument('--rare-chars', default='',
+                       help='Extra characters to boost (in addition to --char-freq)')
+    parser.add_argument('--rare-max-count', type=int, default=20,
+                       help='Characters seen at most this many times in --char-freq count as rare')
+    parser.add_argument('--rare-ratio', type=float, default=0.2,
+                       help='Fraction of lines that get 1-3 rare characters inserted')
+    parser.add_argument('--codec', choices=CODEC_BACKENDS, default='auto',
+                       help='Image encoder backend (auto = fastest installed backend that supports the format)')
+    parser.add_argument('--image-format', choices=list(IMAGE_FORMATS), default='jpeg',
+                       help='Output image format')
+    parser.add_argument('--quality', type=int, default=95,
+                       help='JPEG/WebP quality (1-100)')
+    parser.add_argument('--no-optimize', action='store_true',
+                       help='Skip the optimizing Huffman pass of JPEG (faster encode, larger files)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help=f'Rendering processes (default: all {os.cpu_count()} cores)')
+    parser.add_argument('--chunk-size', type=int, default=256,
+                       help='Text lines per work unit sent to a worker')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed (same seed = same dataset regardless of --workers)')
+    
+    args = parser.parse_args()
+    setup_logging()
+    
+    print("🚀 Demo Data Creator for PaddleOCR Recognition")
+    print("="*50)
+    
+    if args.count is None:
+        try:
+            create_demo_data()
+            create_sample_labels_file()
+            
+            print(f"\n🎯 Demo data ready!")
+            print(f"You can now test the data preparation system.")
+            
+        except Exception as e:
+            print(f"❌ Error creating demo data: {e}")
+            print(f"Please check that required packages are installed:")
+            print(f"pip install Pillow numpy")
+        return
+    
+    if args.output_format == 'shards' and args.shard_format == 'lmdb':
+        try:
+            import lmdb
+        except ImportError:
+            print("❌ lmdb not installed. Run: pip install lmdb (or use --shard-format tar)")
+            return
+    
+    try:
+        codec = create_image_codec(args.codec, args.image_format, args.quality, not args.no_optimize)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    
+    fonts = find_font_files(args.fonts)
+    if args.fonts and not fonts:
+        print(f"❌ No font files found in: {' '.join(args.fonts)}")
+        return
+    
+    rare_chars = load_rare_characters(args.char_freq, args.rare_max_count, args.rare_chars)
+    corpus = load_corpus(args.corpus) if args.corpus else None
+    if args.corpus and not corpus:
+        print(f"❌ Corpus is empty: {args.corpus}")
+        return
+    
+    # ข้อความไทยต้องวาดด้วยฟอนต์ที่มี glyph ภาษาไทย (ฟอนต์เริ่มต้นของ Pillow ไม่มี)
+    thai_fonts = [font for font in fonts if font_supports_thai(font)]
+    needs_thai = (corpus and any(map(contains_thai, corpus))) or (rare_chars and contains_thai(''.join(rare_chars[0])))
+    if needs_thai and not thai_fonts:
+        print("❌ Corpus or rare characters contain Thai, but no --fonts have Thai glyphs "
+              "(use e.g. Sarabun or Noto Sans Thai)")
+        return
+    if thai_fonts and len(thai_fonts) < len(fonts) and (needs_thai or not corpus):
+        print(f"⚠️  Skipping {len(fonts) - len(thai_fonts)} fonts without Thai glyphs")
+        fonts = thai_fonts
+    if not corpus and not thai_fonts:
+        print("⚠️  No --fonts with Thai glyphs: generating Latin letters and digits only")
+    
+    print(f"🎨 Generating {args.count} text lines -> {args.output_dir} ({args.output_format})")
+    print(f"🔤 Fonts: {len(fonts) or 'Pillow default'}, "
+          f"corpus: {f'{len(corpus)} lines' if corpus else 'random Thai/Latin/digit words' if thai_fonts else 'random Latin/digit words'}, "
+          f"rare characters: {len(rare_chars[0]) if rare_chars else 0}")
+    print(f"🖼️  Output images: {codec.describe()}")
+    print(f"⚙️  Using {args.workers} worker processes")
+    
+    start = time.perf_counter()
+    summary = generate_synthetic_dataset(args, codec, fonts, corpus, rare_chars, thai=bool(thai_fonts))
+    elapsed = time.perf_counter() - start
+    
+    print(f"\n✅ Generated {summary['train']} train + {summary['val']} val lines "
+          f"in {elapsed:.1f}s ({(summary['train'] + summary['val']) / elapsed:.0f} lines/s)")
+    print(f"📦 Encoded images: {summary['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"🔤 Characters: {summary['characters']}")
+    print(f"📁 Output directory: {args.output_dir}")
+    
+    if args.output_format == 'files':
+        print(f"\n🚀 Next steps:")
+        print(f"  python scripts/validate_data.py --dataset-dir {args.output_dir}")
+
 def create_demo_data():
     """สร้างข้อมูลตัวอย่างสำหรับทดสอบ"""
     print("🎨 Creating demo data for testing...")
@@ -134,17 +298,407 @@ def create_sample_labels_file():
         
         print(f"✓ Created sample: {file_path}")
 
-if __name__ == "__main__":
-    print("🚀 Demo Data Creator for PaddleOCR Recognition")
-    print("="*50)
+def create_synthetic_dataset(output_dir, count=1000, heights=(32, 48, 64), aspect_ratios=None, seed=42, quality=95):
+    """สร้าง dataset สังเคราะห์ output_dir/images + output_dir/labels.txt (รูปแบบ tab-separated)
+    
+    ความสูงสุ่มจาก heights, ความกว้าง = ความสูง x อัตราส่วนที่สุ่มตามน้ำหนักใน aspect_ratios (±20%)
+    ความยาวข้อความแปรตามอัตราส่วน ผลลัพธ์เหมือนเดิมทุกครั้งสำหรับ seed เดียวกัน
+    คืนค่า list ของ {'image_path', 'text'}
+    """
+    aspect_ratios = aspect_ratios or DEFAULT_ASPECT_RATIOS
+    rng = np.random.default_rng(seed)
+    ratios = np.array(list(aspect_ratios), dtype=float)
+    weights = np.array(list(aspect_ratios.values()), dtype=float)
+    weights /= weights.sum()
+    
+    image_dir = Path(output_dir) / 'images'
+    image_dir.mkdir(parents=True, exist_ok=True)
+    
+    fonts = {}
+    samples = []
+    
+    for i in range(count):
+        height = int(rng.choice(heights))
+        ratio = rng.choice(ratios, p=weights) * rng.uniform(0.8, 1.2)
+        width = max(height, int(height * ratio))
+        
+        # ประมาณ 1.5 ตัวอักษรต่อความกว้างเท่ากับความสูงหนึ่งช่วง
+        length = max(1, int(ratio * 1.5 * rng.uniform(0.7, 1.1)))
+        text = ''.join(rng.choice(list(LATIN_CHARSET + DIGITS + ' '), length)).strip() or 'A'
+        
+        if height not in fonts:
+            fonts[height] = ImageFont.load_default(size=int(height * 0.6))
+        
+        background = tuple(int(v) for v in rng.integers(200, 256, 3))
+        img = Image.new('RGB', (width, height), color=background)
+        ImageDraw.Draw(img).text((height // 4, height // 6), text, font=fonts[height], fill=(20, 20, 30))
+        
+        img_filename = f"synthetic_{i:07d}.jpg"
+        img.save(image_dir / img_filename, 'JPEG', quality=quality)
+        samples.append({'image_path': img_filename, 'text': text})
+    
+    with open(Path(output_dir) / 'labels.txt', 'w', encoding='utf-8') as f:
+        for sample in samples:
+            f.write(f"{sample['image_path']}\t{sample['text']}\n")
+    
+    return samples
+
+def generate_synthetic_dataset(args, codec, fonts, corpus=None, rare_chars=None, thai=True):
+    """สร้างรูปบรรทัดข้อความแบบขนานและเขียนลง layout ของ Recognition dataset (หรือ shards) พร้อม annotation และ metadata
+    
+    thai = False: ข้อความสุ่ม (เมื่อไม่มี corpus) มีเฉพาะตัวอักษรละตินและตัวเลข
+    ข้อความทุกบรรทัดถูกเลือกใน process หลักด้วย seed เดียว ส่วน worker สุ่มฟอนต์/พื้นหลังด้วย seed ของแต่ละบรรทัด
+    ผลลัพธ์จึงเหมือนเดิมทุกครั้งไม่ว่าจะใช้กี่ worker
+    """
+    output_dir = Path(args.output_dir)
+    heights = [int(height) for height in args.heights.split(',')]
+    write_files = args.output_format == 'files'
+    
+    for directory in (['images/train', 'images/val', 'annotations'] if write_files else []) + ['metadata']:
+        (output_dir / directory).mkdir(parents=True, exist_ok=True)
+    
+    render = partial(
+        render_sample,
+        output_dir=str(output_dir) if write_files else None,
+        fonts=fonts,
+        heights=heights,
+        max_width=args.max_width,
+        codec=codec,
+        train_ratio=args.train_ratio,
+        seed=args.seed
+    )
+    tasks = iter_synthetic_texts(args.count, corpus, rare_chars, args.rare_ratio, args.seed, thai)
+    
+    writers = {}
+    annotation_files = {}
+    if write_files:
+        for split_name in ('train', 'val'):
+            annotation_files[split_name] = open(output_dir / 'annotations' / f'{split_name}_annotation.txt', 'w', encoding='utf-8')
+    else:
+        # ลบ shards เดิมก่อนเขียนใหม่
+        for split_name in ('train', 'val'):
+            shutil.rmtree(output_dir / 'shards' / split_name, ignore_errors=True)
+            writers[split_name] = create_shard_writer(args.shard_format, output_dir / 'shards' / split_name,
+                                                      args.shard_size, codec.extension)
+    
+    summary = {'train': 0, 'val': 0, 'bytes': 0}
+    char_counts = Counter()
+    text_buffer = []
+    text_lengths = []
+    progress_bar = create_progress_bar(args.count, "Rendering text lines")
     
     try:
-        create_demo_data()
-        create_sample_labels_file()
+        for result in run_in_pool(render, tasks, args.workers, args.chunk_size):
+            progress_bar.update(1)
+            if result is None:
+                continue
+            
+            split_name, image, text = result
+            if write_files:
+                annotation_files[split_name].write(f"{image}\t{text}\n")
+            else:
+                writers[split_name].add(image, text)
+                summary['bytes'] += len(image)
+            
+            summary[split_name] += 1
+            text_lengths.append(len(text))
+            text_buffer.append(text)
+            if len(text_buffer) >= 4096:
+                char_counts.update(count_characters(text_buffer))
+                text_buffer = []
+    finally:
+        progress_bar.close()
+        for f in annotation_files.values():
+            f.close()
+        shard_info = {split_name: writer.close() for split_name, writer in writers.items()}
+    
+    char_counts.update(count_characters(text_buffer))
+    
+    if write_files:
+        summary['bytes'] = sum(path.stat().st_size for split_name in ('train', 'val')
+                               for path in (output_dir / 'images' / split_name).iterdir())
+    else:
+        with open(output_dir / 'metadata' / 'shards.json', 'w', encoding='utf-8') as f:
+            json.dump({'shard_format': args.shard_format, 'shard_size': args.shard_size, 'splits': shard_info},
+                      f, ensure_ascii=False, indent=2)
+    
+    # metadata แบบเดียวกับ convert_data.py (สถิติข้อความคำนวณระหว่างทาง ไม่ต้องเก็บ labels ทั้งหมด)
+    char_dict = create_character_dict([], char_counts=char_counts)
+    save_character_frequencies(char_counts, str(output_dir))
+    text_statistics = {
+        'min_length': min(text_lengths, default=0),
+        'max_length': max(text_lengths, default=0),
+        'avg_length': sum(text_lengths) / len(text_lengths) if text_lengths else 0,
+        'total_characters': sum(text_lengths)
+    }
+    save_dataset_metadata(range(summary['train']), range(summary['val']), char_dict, str(output_dir),
+                          text_statistics=text_statistics)
+    
+    summary['characters'] = len(char_dict)
+    return summary
+
+def iter_synthetic_texts(count, corpus=None, rare_chars=None, rare_ratio=0.0, seed=42, thai=True):
+    """สร้าง (index, ข้อความ) ทีละบรรทัด: สุ่มจาก corpus หรือสุ่มคำ และแทรกตัวอักษรหายากใน rare_ratio ของบรรทัด"""
+    rng = np.random.default_rng(seed)
+    
+    for index in range(count):
+        if corpus:
+            text = corpus[rng.integers(len(corpus))]
+        else:
+            text = random_text(rng, rng.integers(3, 26), thai)
         
-        print(f"\n🎯 Demo data ready!")
-        print(f"You can now test the data preparation system.")
+        if rare_chars and rng.random() < rare_ratio:
+            chars, probabilities = rare_chars
+            for char in rng.choice(chars, rng.integers(1, 4), p=probabilities):
+                text = insert_character(text, str(char), rng)
         
-    except Exception as e:
-        print(f"❌ Error creating demo data: {e}")
-        print(f"Please check that required packages are installed:")
+        yield index, text
+
+def random_text(rng, length, thai=True):
+    """ข้อความสุ่มยาวประมาณ length ตัวอักษร: คำไทย (1-3 พยางค์), คำละติน และตัวเลข คั่นด้วยช่องว่าง"""
+    words = []
+    total = 0
+    while total < length:
+        kind = rng.random()
+        if thai and kind < 0.6:
+            word = ''.join(thai_syllable(rng) for _ in range(rng.integers(1, 4)))
+        elif kind < 0.85:
+            word = ''.join(rng.choice(list(LATIN_CHARSET), rng.integers(2, 9)))
+        else:
+            word = ''.join(rng.choice(list(DIGITS), rng.integers(1, 7)))
+        words.append(word)
+        total += len(word) + 1
+    return ' '.join(words)
+
+def thai_syllable(rng):
+    """พยางค์ไทยสุ่มหนึ่งพยางค์ (สระหน้า/บน/ล่าง/หลัง และวรรณยุกต์อยู่ถูกตำแหน่งตามพยัญชนะต้น)"""
+    def pick(chars):
+        return chars[rng.integers(len(chars))]
+    
+    initial = pick(THAI_CONSONANTS)
+    tone = pick(THAI_TONE_MARKS) if rng.random() < 0.3 else ''
+    final = pick(THAI_FINAL_CONSONANTS) if rng.random() < 0.5 else ''
+    kind = rng.integers(6)
+    
+    if kind == 0:
+        # กา กาน ก่ะ น้ำ (ะ และ ำ ไม่มีตัวสะกด)
+        vowel = pick("าะำ")
+        return initial + tone + vowel + (final if vowel == 'า' else '')
+    if kind == 1:
+        # กิน ปู่ มืด
+        return initial + pick(THAI_UPPER_LOWER_VOWELS) + tone + final
+    if kind == 2:
+        # เก แม่ โต๊ะ เดือน ไม่ทำ: สระหน้า + พยัญชนะต้น + ตัวสะกด
+        return pick("เแโ") + initial + tone + final
+    if kind == 3:
+        # ใจ ไม้ (ไม่มีตัวสะกด)
+        return pick("ใไ") + initial + tone
+    if kind == 4:
+        # กัน มั่น (ไม้หันอากาศต้องมีตัวสะกด)
+        return initial + 'ั' + tone + (final or pick(THAI_FINAL_CONSONANTS))
+    # คน ก่ง (พยางค์ปิดไม่มีรูปสระ)
+    return initial + tone + (final or pick(THAI_FINAL_CONSONANTS))
+
+def insert_character(text, char, rng):
+    """แทรกตัวอักษรในตำแหน่งสุ่มที่ไม่ทำให้พยางค์ไทยผิดรูป
+    
+    สระบน/ล่างและวรรณยุกต์ต่อท้ายพยัญชนะต้นที่ยังไม่มีเครื่องหมาย, สระหน้าวางหน้าพยัญชนะไทย
+    ตัวอื่นแทรกระหว่างกลุ่มตัวอักษร (ไม่แยกพยัญชนะออกจากเครื่องหมายของมัน)
+    """
+    if unicodedata.category(char) == 'Mn':
+        # เฉพาะพยัญชนะต้น (ตัวที่ไม่ได้ตามหลังตัวอักษรไทยอื่น) เพื่อไม่ให้เครื่องหมายไปอยู่บนตัวสะกด
+        positions = [i + 1 for i, c in enumerate(text)
+                     if c in THAI_CONSONANTS
+                     and (i == 0 or text[i - 1] in THAI_LEADING_VOWELS or not contains_thai(text[i - 1]))
+                     and (i + 1 == len(text) or unicodedata.category(text[i + 1]) != 'Mn')]
+    elif char in THAI_LEADING_VOWELS:
+        positions = [i for i, c in enumerate(text)
+                     if c in THAI_CONSONANTS and (i == 0 or text[i - 1] not in THAI_LEADING_VOWELS)]
+    else:
+        positions = [i for i in range(len(text) + 1)
+                     if (i == len(text) or unicodedata.category(text[i]) != 'Mn')
+                     and (i == 0 or text[i - 1] not in THAI_LEADING_VOWELS)]
+    
+    # ไม่มีตำแหน่งที่ถูกต้อง (เช่น วรรณยุกต์ในบรรทัดที่ไม่มีพยัญชนะไทย): เพิ่มพยัญชนะให้
+    if not positions:
+        if unicodedata.category(char) == 'Mn' or char in THAI_LEADING_VOWELS:
+            consonant = THAI_CONSONANTS[rng.integers(len(THAI_CONSONANTS))]
+            cluster = consonant + char if unicodedata.category(char) == 'Mn' else char + consonant
+            return f"{text} {cluster}" if text else cluster
+        positions = [len(text)]
+    
+    position = positions[rng.integers(len(positions))]
+    return text[:position] + char + text[position:]
+
+def contains_thai(text):
+    """ข้อความมีตัวอักษรในช่วง Unicode ภาษาไทยหรือไม่"""
+    return any('\u0e00' <= char <= '\u0e7f' for char in text)
+
+def split_clusters(text):
+    """แยกข้อความเป็นกลุ่มตัวอักษร (ตัวอักษรหลัก + สระบน/ล่าง/วรรณยุกต์ที่ตามมา) ซึ่งวาดและตัดบรรทัดเป็นหน่วยเดียวกัน"""
+    clusters = []
+    for char in text:
+        if clusters and unicodedata.category(char) == 'Mn':
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+    return clusters
+
+def render_sample(task, output_dir, fonts, heights, max_width, codec, train_ratio=0.8, seed=42):
+    """(ทำงานใน worker process) วาดและ encode ข้อความหนึ่งบรรทัด
+    
+    output_dir = None: คืน bytes ของรูป (โหมด shards) ไม่เช่นนั้นเขียนไฟล์ลง images/<split>/ และคืน path ใน annotation
+    คืนค่า (split, path หรือ bytes, ข้อความที่วาดจริง) หรือ None ถ้าวาดไม่ได้
+    """
+    index, text = task
+    rng = np.random.default_rng([seed, index])
+    
+    image, text = render_text_line(text, rng, fonts, int(rng.choice(heights)), max_width)
+    if image is None:
+        return None
+    
+    name = f"synthetic_{index:09d}"
+    split_name = hash_split(name, train_ratio, seed)
+    name += codec.extension
+    data = codec.encode(image, 'RGB')
+    
+    if output_dir is None:
+        return split_name, data, text
+    
+    with open(Path(output_dir) / 'images' / split_name / name, 'wb') as f:
+        f.write(data)
+    return split_name, f"images/{split_name}/{name}", text
+
+def render_text_line(text, rng, fonts, height, max_width):
+    """วาดข้อความบนพื้นหลังสุ่ม (สี gradient, noise, blur) คืนค่า (RGB array, ข้อความที่วาด) หรือ (None, None)
+    
+    ประกอบบรรทัดจาก mask ของแต่ละกลุ่มตัวอักษรที่ cache ไว้ (เร็วกว่า ImageDraw.text ทั้งบรรทัดหลายเท่า)
+    สระบน/ล่างและวรรณยุกต์ถูกวาดพร้อมพยัญชนะของมัน จึงวางตำแหน่งตาม metrics ของฟอนต์
+    """
+    font_path = fonts[rng.integers(len(fonts))] if fonts else None
+    font, glyphs, (ascent, descent) = load_font(font_path, max(8, int(height * rng.uniform(0.55, 0.8))))
+    
+    # ตัดข้อความให้พอดี max_width ทีละกลุ่มตัวอักษรด้วยความกว้างที่ cache ไว้ (ไม่ต้อง layout ทั้งบรรทัดก่อน)
+    padding = height // 4
+    width = 2 * padding
+    clusters = split_clusters(text)
+    kept = 0
+    for cluster in clusters:
+        advance = load_glyph(font, glyphs, cluster)[3]
+        if width + advance > max_width:
+            break
+        width += advance
+        kept += 1
+    
+    if kept < len(clusters):
+        # สระหน้าที่พยัญชนะถูกตัดออกไปแล้วไม่มีความหมาย
+        text = ''.join(clusters[:kept]).rstrip(THAI_LEADING_VOWELS + ' ')
+    
+    text = text.strip()
+    if not text:
+        return None, None
+    clusters = split_clusters(text)
+    width = 2 * padding + sum(load_glyph(font, glyphs, cluster)[3] for cluster in clusters)
+    width = max(height, int(np.ceil(width)))
+    
+    # วางตัวอักษรลงใน mask ตามตำแหน่งสะสมของ advance
+    mask = np.zeros((height, width), dtype=np.uint8)
+    top = (height - ascent - descent) // 2 + int(rng.integers(-2, 3))
+    x = padding
+    for cluster in clusters:
+        glyph, left, glyph_top, advance = load_glyph(font, glyphs, cluster)
+        if glyph is not None:
+            x0, y0 = int(round(x)) + left, top + glyph_top
+            x1, y1 = min(x0 + glyph.shape[1], width), min(y0 + glyph.shape[0], height)
+            if x0 >= 0 and y0 >= 0 and x1 > x0 and y1 > y0:
+                np.maximum(mask[y0:y1, x0:x1], glyph[:y1 - y0, :x1 - x0], out=mask[y0:y1, x0:x1])
+        x += advance
+    
+    # ผสมสีตัวอักษรกับพื้นหลัง gradient แล้วเติม noise (float32 ตลอด)
+    alpha = mask[:, :, None].astype(np.float32) / 255
+    base = rng.uniform(170, 255, 3).astype(np.float32)
+    gradient = np.linspace(0, rng.uniform(-40, 40), width, dtype=np.float32)[None, :, None]
+    background = base + gradient
+    color = rng.uniform(0, 90, 3).astype(np.float32)
+    
+    image = background + (color - background) * alpha
+    image += rng.standard_normal((height, width, 1), dtype=np.float32) * rng.uniform(0, 8)
+    image = np.clip(image, 0, 255, out=image).astype(np.uint8)
+    
+    if rng.random() < 0.3:
+        import cv2
+        image = cv2.GaussianBlur(image, (3, 3), rng.uniform(0.3, 0.9))
+    
+    return image, text
+
+def load_font(font_path, size):
+    """โหลดฟอนต์ (cache ต่อ process) คืนค่า (font, cache ของ glyph, (ascent, descent))"""
+    key = (font_path, size)
+    if key not in _font_cache:
+        font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default(size=size)
+        _font_cache[key] = (font, {}, font.getmetrics())
+    return _font_cache[key]
+
+def load_glyph(font, glyphs, cluster):
+    """mask และ metrics ของกลุ่มตัวอักษรหนึ่งกลุ่ม (วาดครั้งแรกครั้งเดียวแล้ว cache)
+    
+    คืนค่า (uint8 mask หรือ None ถ้าไม่มี pixel, ระยะซ้าย, ระยะจากบรรทัดบน, advance)
+    """
+    if cluster not in glyphs:
+        left, top, right, bottom = font.getbbox(cluster)
+        glyph = None
+        if right > left and bottom > top:
+            image = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(image).text((-left, -top), cluster, font=font, fill=255)
+            glyph = np.asarray(image)
+        glyphs[cluster] = (glyph, left, top, font.getlength(cluster))
+    return glyphs[cluster]
+
+def font_supports_thai(font_path):
+    """ฟอนต์มี glyph ภาษาไทยหรือไม่: ก ข ฮ ต้องวาดต่างจากกัน และต่างจาก glyph ของตัวอักษรที่ไม่มีในฟอนต์"""
+    font, glyphs, _ = load_font(font_path, 32)
+    masks = [load_glyph(font, glyphs, char) for char in ('ก', 'ข', 'ฮ', '\uffff')]
+    keys = [None if mask[0] is None else (mask[0].shape, mask[0].tobytes()) for mask in masks]
+    return None not in keys[:3] and len(set(keys)) == len(keys)
+
+def find_font_files(paths):
+    """รวมไฟล์ฟอนต์จากไฟล์หรือ directory ที่กำหนด (เรียงชื่อ เพื่อให้ seed เดิมได้ผลเดิม)"""
+    fonts = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            fonts.extend(sorted(str(p) for p in path.rglob('*') if p.suffix.lower() in FONT_EXTENSIONS))
+        elif path.suffix.lower() in FONT_EXTENSIONS and path.exists():
+            fonts.append(str(path))
+    return fonts
+
+def load_corpus(corpus_file):
+    """อ่าน corpus (หนึ่งบรรทัดต่อหนึ่งข้อความ) ตัดบรรทัดว่างออก"""
+    with open(corpus_file, 'r', encoding='utf-8') as f:
+        return [line.strip().replace('\t', ' ') for line in f if line.strip()]
+
+def load_rare_characters(char_freq_file=None, max_count=20, extra_chars=''):
+    """ตัวอักษรที่ต้องการเพิ่มจำนวน: ตัวที่พบไม่เกิน max_count ครั้งใน character_freq.txt และ extra_chars
+    
+    คืนค่า (list ตัวอักษร, ความน่าจะเป็น) โดยตัวที่พบน้อยกว่าถูกเลือกบ่อยกว่า (ตามสัดส่วน 1 / (count + 1)) หรือ None
+    """
+    counts = {}
+    if char_freq_file:
+        with open(char_freq_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) >= 2 and len(fields[0]) == 1 and fields[0].strip() and int(fields[1]) <= max_count:
+                    counts[fields[0]] = int(fields[1])
+    
+    for char in extra_chars:
+        if char.strip():
+            counts.setdefault(char, 0)
+    
+    if not counts:
+        return None
+    
+    chars = sorted(counts)
+    weights = np.array([1 / (counts[char] + 1) for char in chars])
+    return chars, weights / weights.sum()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Find duplicate and near-duplicate images for PaddleOCR Recognition datasets
+หารูปภาพที่ซ้ำกัน (เนื้อไฟล์เหมือนกันทุก byte) และรูปที่เกือบซ้ำ (perceptual hash ใกล้กัน)
+
+Usage:
+    python dedup_images.py [options]
+    
+    # เขียนไฟล์ label ใหม่ที่ตัดรูปซ้ำออก (เก็บรูปแรกของแต่ละกลุ่ม) แล้วใช้กับ convert_data.py
+    python dedup_images.py --workers 8 --output-labels input/labels_dedup.txt
+    python convert_data.py --input-labels input/labels_dedup.txt
+    
+    # profile process หลัก (metrics ของทุกขั้นตอนอยู่ใน output/validation_reports/run_metrics.json เสมอ)
+    python dedup_images.py --workers 8 --profile cprofile
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+# เพิ่ม path สำหรับ import utils
+sys.path.append(str(Path(__file__).parent))
+
+from utils import *
+from run_metrics import PROFILE_MODES, RunMetrics
+
+# cache ของ hash ต่อรูป (หนึ่ง JSON ต่อบรรทัด) คำนวณใหม่เฉพาะไฟล์ที่ขนาด/mtime เปลี่ยน
+# อยู่นอก recognition_dataset เพื่อไม่ให้ upload_to_s3.py อัปโหลดไปกับ dataset
+HASH_CACHE_FILE = 'output/cache/image_hashes.jsonl'
+
+# dHash ขนาด 16x4 = 64 bit (รูปบรรทัดข้อความกว้างกว่าสูง จึงใช้ความละเอียดแนวนอนมากกว่า)
+DHASH_WIDTH = 16
+DHASH_HEIGHT = 4
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicate and near-duplicate images')
+    parser.add_argument('--input-images', default='input/images',
+                       help='Path to input images directory')
+    parser.add_argument('--input-labels', default='input/labels.txt',
+                       help='Path to input labels file')
+    parser.add_argument('--text-only', action='store_true',
+                       help='Label file contains text only; map line N to the N-th image (sorted by name)')
+    parser.add_argument('--image-name-pattern', default=None,
+                       help='Image file name for text-only lines, e.g. img_{index:03d}.jpg (index starts at 1)')
+    parser.add_argument('--max-distance', type=int, default=4,
+                       help='Maximum dHash Hamming distance for near duplicates (0 = exact duplicates only)')
+    parser.add_argument('--any-text', action='store_true',
+                       help='Group near duplicates even when their labels differ (default: same label required; '
+                            'text-line crops of different words can have close hashes)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help=f'Number of worker processes for hashing (max {os.cpu_count()})')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                       help='Number of images per work unit sent to a worker')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Rehash every image and do not update the hash cache')
+    parser.add_argument('--output-labels', default=None,
+                       help='Write a tab-separated label file keeping only the first image of each group')
+    parser.add_argument('--report', default='output/validation_reports/duplicates.json',
+                       help='Duplicate groups report (JSON)')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default='off',
+                       help='Profile the main process with cProfile or tracemalloc (results in run_metrics.json)')
+    
+    args = parser.parse_args()
+    if args.image_name_pattern:
+        try:
+            check_image_name_pattern(args.image_name_pattern)
+        except ValueError as e:
+            parser.error(f"--image-name-pattern: {e}")
+    setup_logging()
+    
+    print("🧬 PaddleOCR Duplicate Image Finder")
+    print("="*40)
+    
+    if not Path(args.input_labels).exists():
+        print(f"❌ Input labels file not found: {args.input_labels}")
+        return
+    
+    # อ่าน labels แบบ streaming
+    labels = []
+    for record in iter_label_file(args.input_labels, args.input_images,
+                                  args.text_only, args.image_name_pattern):
+        if record['error']:
+            logging.warning(record['error'])
+            continue
+        labels.append(record)
+    
+    print(f"📊 Found {len(labels)} labelled images")
+    
+    metrics = RunMetrics('dedup_images', args.profile, Path(args.report).parent / 'run_metrics.json')
+    
+    # คำนวณ hash แบบขนาน (ใช้ cache บน disk)
+    metrics.start_stage('hash')
+    image_paths = [Path(args.input_images) / label['image_path'] for label in labels]
+    entries = hash_images(image_paths, args.workers, args.chunk_size,
+                          None if args.no_cache else HASH_CACHE_FILE)
+    metrics.end_stage(len(labels), sum(entry['size'] for entry in entries if entry))
+    
+    metrics.start_stage('group')
+    texts = None if args.any_text else [label['text'] for label in labels]
+    groups = find_duplicate_groups(entries, args.max_distance, texts)
+    metrics.end_stage(len(labels))
+    
+    unreadable = sum(entry is None for entry in entries)
+    duplicates = sum(len(group['members']) - 1 for group in groups)
+    
+    print(f"\n📈 Duplicate Summary:")
+    print(f"  🧩 Duplicate groups: {len(groups)} "
+          f"({sum(group['kind'] == 'exact' for group in groups)} exact, "
+          f"{sum(group['kind'] == 'near' for group in groups)} near)")
+    print(f"  🗑️  Redundant images: {duplicates}")
+    if unreadable:
+        print(f"  ❌ Unreadable images: {unreadable}")
+    
+    for group in groups[:5]:
+        names = ", ".join(labels[i]['image_path'] for i in group['members'][:4])
+        print(f"  • [{group['kind']}] {names}{' ...' if len(group['members']) > 4 else ''}")
+    
+    save_duplicate_report(groups, labels, args.report)
+    print(f"\n📋 Report saved: {args.report}")
+    
+    if args.output_labels:
+        dropped = {i for group in groups for i in group['members'][1:]}
+        Path(args.output_labels).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output_labels, 'w', encoding='utf-8') as f:
+            for i, label in enumerate(labels):
+                if i not in dropped:
+                    f.write(f"{label['image_path']}\t{label['text']}\n")
+        print(f"✅ Saved {len(labels) - len(dropped)} labels without duplicates: {args.output_labels}")
+    
+    metrics.set(images=len(labels), groups=len(groups), redundant=duplicates, unreadable=unreadable, workers=args.workers)
+    metrics.print_summary()
+    metrics.save()
+
+def compute_dhash(gray_image):
+    """difference hash: เทียบความสว่างของ pixel ที่ติดกันในรูปย่อขนาด (DHASH_WIDTH + 1) x DHASH_HEIGHT"""
+    import cv2
+    import numpy as np
+    
+    small = cv2.resize(gray_image, (DHASH_WIDTH + 1, DHASH_HEIGHT), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hash_cached_image(task):
+    """(ทำงานใน worker process ได้) คำนวณ content hash และ dHash ของรูปหนึ่งไฟล์
+    
+    ใช้ค่าจาก cache ถ้าขนาดและ mtime ของไฟล์ไม่เปลี่ยน คืน entry หรือ None ถ้าอ่านไฟล์ไม่ได้
+    dhash เป็น None ถ้า decode รูปไม่ได้ (ยังหาไฟล์ที่ซ้ำทุก byte ได้)
+    """
+    import cv2
+    import numpy as np
+    
+    image_path, cache_entry = task
+    
+    try:
+        stat = os.stat(image_path)
+        if cache_entry and cache_entry['size'] == stat.st_size and cache_entry['mtime_ns'] == stat.st_mtime_ns:
+            return cache_entry
+        
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logging.error(f"Cannot read image {image_path}: {e}")
+        return None
+    
+    gray_image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    
+    return {
+        'source': image_path,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'content': hashlib.blake2b(data, digest_size=16).hexdigest(),
+        'dhash': compute_dhash(gray_image) if gray_image is not None and gray_image.size else None
+    }
+
+def hash_images(image_paths, workers=1, chunk_size=64, cache_file=HASH_CACHE_FILE):
+    """คำนวณ hash ของทุกรูปแบบขนาน คืน list ของ entry ตามลำดับเดิม (None = อ่านไม่ได้)"""
+    cache = load_hash_cache(cache_file) if cache_file else {}
+    tasks = ((str(path), cache.get(str(path))) for path in image_paths)
+    entries = list(run_in_pool(hash_cached_image, tasks, workers, chunk_size))
+    
+    if cache_file:
+        save_hash_cache(cache_file, {entry['source']: entry for entry in entries if entry}.values())
+    
+    return entries
+
+def load_hash_cache(cache_file):
+    """โหลด hash cache (JSON lines) เป็น dict ตาม source path"""
+    cache = {}
+    
+    if not Path(cache_file).exists():
+        return cache
+    
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cache[entry['source']] = entry
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable hash cache {cache_file}: {e}")
+        return {}
+    
+    return cache
+
+def save_hash_cache(cache_file, entries):
+    """บันทึก hash cache แบบ atomic (เขียนไฟล์ชั่วคราวแล้วแทนที่)"""
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    temp_file = f"{cache_file}.tmp"
+    
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    
+    os.replace(temp_file, cache_file)
+
+def hamming_distance(a, b):
+    """จำนวน bit ที่ต่างกันระหว่าง hash สองค่า"""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """BK-tree สำหรับค้นหา hash ที่ Hamming distance ไม่เกินค่าที่กำหนด โดยไม่ต้องเทียบทุกคู่"""
+    
+    def __init__(self):
+        # node = [hash, list ของ item ที่ hash เท่ากัน, dict ระยะ -> node ลูก]
+        self.root = None
+    
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+    
+    def search(self, value, max_distance):
+        """คืน (distance, item) ทั้งหมดที่ hash ห่างจาก value ไม่เกิน max_distance"""
+        if self.root is None:
+            return []
+        
+        found = []
+        stack = [self.root]
+        
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            
+            # triangle inequality: ลูกที่อยู่นอกช่วงนี้ไม่มีทางใกล้พอ
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        
+        return found
+
+def find_duplicate_groups(entries, max_distance=4, texts=None):
+    """จัดกลุ่มรูปซ้ำ: content hash เดียวกัน หรือ dHash ห่างกันไม่เกิน max_distance
+    
+    ถ้ากำหนด texts รูปที่เกือบซ้ำต้องมีข้อความเดียวกันด้วย (รูปคำต่างกันที่ฟอนต์/ขนาดคล้ายกันอาจมี dHash ใกล้กัน)
+    และจะค้นหาเฉพาะภายในข้อความเดียวกัน รูปที่ซ้ำทุก byte ถูกจัดกลุ่มเสมอ
+    คืน list ของ {'kind': 'exact' | 'near', 'members': list ของ index} เฉพาะกลุ่มที่มีมากกว่า 1 รูป
+    สมาชิกเรียงตามลำดับเดิม (รูปแรกของกลุ่มคือรูปที่ควรเก็บไว้)
+    """
+    parent = list(range(len(entries)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # ใช้ index ที่น้อยกว่าเป็น root เพื่อให้รูปแรกเป็นตัวแทนกลุ่ม
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    
+    # รูปที่ซ้ำทุก byte
+    first_by_content = {}
+    for i, entry in enumerate(entries):
+        if entry is None:
+            continue
+        first = first_by_content.setdefault(entry['content'], i)
+        if first != i:
+            union(first, i)
+    
+    # รูปที่เกือบซ้ำ: ค้นหาใน BK-tree (หนึ่ง tree ต่อข้อความ) เฉพาะตัวแทนของแต่ละ content hash
+    # tree เก็บเฉพาะรูปแรกของแต่ละกลุ่ม รูปใหม่เข้ากลุ่มที่ตัวแทนใกล้ที่สุด จึงไม่เกิดการต่อกันเป็นลูกโซ่
+    # (A ใกล้ B, B ใกล้ C แต่ A ไกลจาก C)
+    if max_distance > 0:
+        trees = {}
+        for i in sorted(first_by_content.values()):
+            dhash = entries[i]['dhash']
+            if dhash is None:
+                continue
+            
+            tree = trees.setdefault(texts[i] if texts is not None else None, BKTree())
+            matches = tree.search(dhash, max_distance)
+            if matches:
+                union(min(matches)[1], i)
+            else:
+                tree.add(dhash, i)
+    
+    members_by_root = {}
+    for i in range(len(entries)):
+        if entries[i] is not None:
+            members_by_root.setdefault(find(i), []).append(i)
+    
+    groups = []
+    for root, members in sorted(members_by_root.items()):
+        if len(members) < 2:
+            continue
+        exact = len({entries[i]['content'] for i in members}) == 1
+        groups.append({'kind': 'exact' if exact else 'near', 'members': members})
+    
+    return groups
+
+def save_duplicate_report(groups, labels, report_file):
+    """บันทึกกลุ่มรูปซ้ำเป็น JSON (รูปแรกของแต่ละกลุ่มคือรูปที่เก็บไว้)"""
+    Path(report_file).parent.mkdir(parents=True, exist_ok=True)
+    
+    report = {
+        'total_images': len(labels),
+        'duplicate_groups': len(groups),
+        'redundant_images': sum(len(group['members']) - 1 for group in groups),
+        'groups': [
+            {
+                'kind': group['kind'],
+                'label_conflict': len({labels[i]['text'] for i in group['members']}) > 1,
+                'members': [
+                    {
+                        'image_path': labels[i]['image_path'],
+                        'text': labels[i]['text'],
+                        'line_number': labels[i].get('line_number')
+                    }
+                    for i in group['members']
+                ]
+            }
+            for group in groups
+        ]
+    }
+    
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
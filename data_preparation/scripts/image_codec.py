@@ -0,0 +1,189 @@
+"""
+Image encoders for Recognition datasets
+encode รูปภาพที่ปรับขนาดแล้วจาก numpy array โดยตรง (ไม่แปลงเป็น PIL Image ถ้าไม่จำเป็น)
+
+Backends (เรียงจากเร็วไปช้า - ดู benchmarks/codec_formats.py):
+    turbojpeg: libjpeg-turbo ผ่าน PyTurboJPEG (optional: pip install PyTurboJPEG) รองรับเฉพาะ JPEG ที่ไม่ optimize
+    cv2:       cv2.imencode รับ BGR array ที่ได้จาก cv2.imread/imdecode ได้โดยตรง
+    pil:       PIL Image.save (JPEG optimize เหมือนการบันทึกแบบเดิมก่อนมี codec)
+    auto:      backend ที่เร็วที่สุดที่ติดตั้งไว้และรองรับรูปแบบที่เลือก
+
+รูปแบบที่รองรับ:
+    jpeg: quality 1-100, optimize = Huffman table ที่เหมาะกับแต่ละรูป (ไฟล์เล็กลง encode ช้าลง)
+    png:  lossless เสมอ, optimize = บีบอัดระดับสูงสุด
+    webp: quality 1-100 หรือ lossless
+
+JPEG จาก cv2 และ pil เหมือนกันทุก byte เมื่อใช้ libjpeg-turbo ตัวเดียวกัน (opencv-python และ Pillow wheels)
+"""
+
+import io
+import logging
+from abc import ABC, abstractmethod
+
+CODEC_BACKENDS = ['auto', 'turbojpeg', 'cv2', 'pil']
+IMAGE_FORMATS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp'}
+
+# TurboJPEG หนึ่งตัวต่อ process (ctypes handle ส่งข้าม process ไม่ได้)
+_turbojpeg = None
+
+class ImageCodec(ABC):
+    """ตัว encode รูปภาพพื้นฐาน รับ uint8 array (H, W, 3) ในลำดับสี channel_order"""
+    
+    name = None
+    
+    def __init__(self, image_format='jpeg', quality=95, optimize=True, lossless=False):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format} (expected one of {list(IMAGE_FORMATS)})")
+        if lossless and image_format == 'jpeg':
+            raise ValueError("Lossless output needs --image-format png or webp")
+        
+        self.image_format = image_format
+        self.quality = quality
+        self.optimize = optimize
+        self.lossless = lossless or image_format == 'png'
+    
+    @property
+    def extension(self):
+        return IMAGE_FORMATS[self.image_format]
+    
+    def encode(self, image, channel_order='RGB'):
+        """encode array เป็น bytes ของรูปแบบที่กำหนด"""
+        return self._encode(image, channel_order)
+    
+    def save(self, image, output_path, channel_order='RGB'):
+        """encode และเขียนไฟล์ คืนค่า True ถ้าสำเร็จ"""
+        try:
+            data = self._encode(image, channel_order)
+            with open(output_path, 'wb') as f:
+                f.write(data)
+            return True
+        
+        except Exception as e:
+            logging.error(f"Cannot save image {output_path}: {e}")
+            return False
+    
+    def describe(self):
+        """คำอธิบายสั้นๆ สำหรับรายงาน เช่น 'jpeg q95 optimize (cv2)'"""
+        options = 'lossless' if self.lossless else f"q{self.quality}"
+        if self.optimize and self.image_format != 'webp':
+            options += ' optimize'
+        return f"{self.image_format} {options} ({self.name})"
+    
+    @abstractmethod
+    def _encode(self, image, channel_order):
+        """encode array เป็น bytes (raise ถ้า encode ไม่ได้)"""
+    
+    @classmethod
+    @abstractmethod
+    def supports(cls, image_format, optimize=True, lossless=False):
+        """backend นี้ติดตั้งไว้และรองรับรูปแบบนี้หรือไม่"""
+
+class TurboJpegCodec(ImageCodec):
+    """encode JPEG ด้วย libjpeg-turbo โดยตรง รับได้ทั้ง RGB และ BGR โดยไม่ต้องแปลงสี"""
+    
+    name = 'turbojpeg'
+    
+    def _encode(self, image, channel_order):
+        from turbojpeg import TJPF_BGR, TJPF_RGB, TJSAMP_420
+        
+        # chroma subsampling 4:2:0 เหมือนค่าเริ่มต้นของ cv2 และ PIL
+        pixel_format = TJPF_BGR if channel_order == 'BGR' else TJPF_RGB
+        return _load_turbojpeg().encode(image, quality=self.quality, pixel_format=pixel_format,
+                                        jpeg_subsample=TJSAMP_420)
+    
+    @classmethod
+    def supports(cls, image_format, optimize=True, lossless=False):
+        if image_format != 'jpeg' or optimize:
+            return False
+        try:
+            _load_turbojpeg()
+            return True
+        except Exception:
+            return False
+
+class Cv2Codec(ImageCodec):
+    """encode ด้วย cv2.imencode (BGR array ไม่ต้องแปลงสีหรือคัดลอก)"""
+    
+    name = 'cv2'
+    
+    def _encode(self, image, channel_order):
+        import cv2
+        
+        if channel_order != 'BGR':
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        
+        if self.image_format == 'jpeg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality, cv2.IMWRITE_JPEG_OPTIMIZE, int(self.optimize)]
+        elif self.image_format == 'png':
+            params = [cv2.IMWRITE_PNG_COMPRESSION, 9 if self.optimize else 6]
+        else:
+            # quality มากกว่า 100 = lossless
+            params = [cv2.IMWRITE_WEBP_QUALITY, 101 if self.lossless else self.quality]
+        
+        success, buffer = cv2.imencode(self.extension, image, params)
+        if not success:
+            raise ValueError(f"cv2 cannot encode {self.image_format}")
+        return buffer.tobytes()
+    
+    @classmethod
+    def supports(cls, image_format, optimize=True, lossless=False):
+        try:
+            import cv2
+        except ImportError:
+            return False
+        return cv2.haveImageWriter(IMAGE_FORMATS[image_format])
+
+class PilCodec(ImageCodec):
+    """encode ด้วย PIL (ต้องแปลง array เป็น PIL Image ก่อน)"""
+    
+    name = 'pil'
+    
+    def _encode(self, image, channel_order):
+        from PIL import Image
+        
+        if channel_order == 'BGR':
+            image = image[:, :, ::-1]
+        
+        buffer = io.BytesIO()
+        image = Image.fromarray(image)
+        if self.image_format == 'jpeg':
+            image.save(buffer, 'JPEG', quality=self.quality, optimize=self.optimize)
+        elif self.image_format == 'png':
+            image.save(buffer, 'PNG', optimize=self.optimize)
+        else:
+            image.save(buffer, 'WEBP', quality=self.quality, lossless=self.lossless)
+        return buffer.getvalue()
+    
+    @classmethod
+    def supports(cls, image_format, optimize=True, lossless=False):
+        from PIL import features
+        return image_format != 'webp' or features.check('webp')
+
+_CODECS = {'turbojpeg': TurboJpegCodec, 'cv2': Cv2Codec, 'pil': PilCodec}
+
+def available_backends(image_format='jpeg', optimize=True, lossless=False):
+    """backend ที่ใช้ได้กับรูปแบบนี้ เรียงจากเร็วไปช้า"""
+    return [name for name, codec in _CODECS.items() if codec.supports(image_format, optimize, lossless)]
+
+def create_image_codec(backend='auto', image_format='jpeg', quality=95, optimize=True, lossless=False):
+    """สร้างตัว encode ตาม backend ที่กำหนด (auto = เร็วที่สุดที่ใช้ได้)"""
+    if backend not in CODEC_BACKENDS:
+        raise ValueError(f"Unknown codec backend: {backend} (expected one of {CODEC_BACKENDS})")
+    
+    backends = available_backends(image_format, optimize, lossless)
+    if backend == 'auto':
+        if not backends:
+            raise ValueError(f"No installed backend can write {image_format}")
+        backend = backends[0]
+    elif backend not in backends:
+        hint = " (pip install PyTurboJPEG; JPEG without optimize only)" if backend == 'turbojpeg' else ""
+        raise ValueError(f"Codec backend {backend} cannot write {image_format}{hint}")
+    
+    return _CODECS[backend](image_format, quality, optimize, lossless)
+
+def _load_turbojpeg():
+    global _turbojpeg
+    if _turbojpeg is None:
+        from turbojpeg import TurboJPEG
+        _turbojpeg = TurboJPEG()
+    return _turbojpeg
@@ -4,16 +4,44 @@ Resize images for PaddleOCR Recognition training
 
 Usage:
     python resize_images.py [options]
+    
+    # จัดกลุ่มตามความกว้างหลังปรับขนาดและบันทึกแต่ละกลุ่มเป็น .npy (memory-mappable)
+    python resize_images.py --batch-mode --emit-npy --bucket-step 32
+    
+    # pipeline: อ่านไฟล์ / decode-resize-encode (หลาย process) / เขียนไฟล์ ทำงานพร้อมกัน
+    python resize_images.py --workers 8
+    
+    # decode รูปเต็มขนาดทุกรูป (ค่าเริ่มต้น auto: JPEG ขนาดใหญ่ถูก decode แบบย่อ 1/2-1/8 ก่อนปรับขนาด)
+    python resize_images.py --decode full
+    
+    # รูปแบบไฟล์ผลลัพธ์และ encoder (ค่าเริ่มต้น: JPEG optimize ด้วย backend ที่เร็วที่สุดที่ติดตั้งไว้)
+    python resize_images.py --image-format webp --lossless
+    python resize_images.py --no-optimize --codec turbojpeg
+    
+    # profile process หลัก (metrics ของทุกขั้นตอนอยู่ใน output/validation_reports/run_metrics.json เสมอ)
+    python resize_images.py --profile cprofile
 """
 
 import argparse
+import json
+import os
+import queue
 import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import numpy as np
+
 # เพิ่ม path สำหรับ import utils
 sys.path.append(str(Path(__file__).parent))
 
 from utils import *
+from image_codec import CODEC_BACKENDS, IMAGE_FORMATS, create_image_codec
+from run_metrics import PROFILE_MODES, RunMetrics
 
 def main():
     parser = argparse.ArgumentParser(description='Resize images for Recognition training')
@@ -28,13 +56,52 @@ def main():
     parser.add_argument('--min-width', type=int, default=16,
                        help='Minimum image width')
     parser.add_argument('--quality', type=int, default=95,
-                       help='JPEG quality (1-100)')
+                       help='JPEG/WebP quality (1-100)')
+    parser.add_argument('--codec', choices=CODEC_BACKENDS, default='auto',
+                       help='Image encoder backend (auto = fastest installed backend that supports the format)')
+    parser.add_argument('--image-format', choices=list(IMAGE_FORMATS), default='jpeg',
+                       help='Output image format')
+    parser.add_argument('--no-optimize', action='store_true',
+                       help='Skip the optimizing Huffman pass of JPEG (faster encode, larger files)')
+    parser.add_argument('--lossless', action='store_true',
+                       help='Lossless WebP output (PNG is always lossless)')
+    parser.add_argument('--file-index', default=None,
+                       help='Save/reuse the input file listing as a JSON index (e.g. output/metadata/input_files.json)')
+    parser.add_argument('--batch-mode', action='store_true',
+                       help='Group images into width buckets (from image headers) and write .npy per batch; each image is still resized individually (spread over --workers)')
+    parser.add_argument('--bucket-step', type=int, default=32,
+                       help='Bucket width granularity in pixels (batch mode)')
+    parser.add_argument('--batch-size', type=int, default=256,
+                       help='Images written to the .npy memmap per batch within a bucket (batch mode)')
+    parser.add_argument('--emit-npy', action='store_true',
+                       help='Also write each bucket as a padded uint8 .npy array plus widths/names (implies --batch-mode)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help=f'Decode/resize/encode processes; >1 enables the pipelined mode, or parallel buckets with --batch-mode (max {os.cpu_count()})')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Use the pipelined mode (reader thread -> process pool -> writer thread) even with 1 worker')
+    parser.add_argument('--prefetch', type=int, default=64,
+                       help='Bounded queue size between pipeline stages (caps memory use)')
+    parser.add_argument('--decode', choices=DECODE_MODES, default='auto',
+                       help='auto = reduced-resolution JPEG decode when the image is much larger than the target; full = always decode at full size')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default='off',
+                       help='Profile the main process with cProfile or tracemalloc (results in run_metrics.json)')
     
     args = parser.parse_args()
+    setup_logging()
+    
+    if args.emit_npy:
+        args.batch_mode = True
     
     print("🖼️  PaddleOCR Image Resizer")
     print("="*40)
     
+    try:
+        codec = create_image_codec(args.codec, args.image_format, args.quality,
+                                   not args.no_optimize, args.lossless)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    
     # ตรวจสอบ input directory
     input_path = Path(args.input_dir)
     if not input_path.exists():
@@ -45,13 +112,14 @@ def main():
     output_path = Path(args.output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # หาไฟล์รูปภาพทั้งหมด
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-    image_files = []
+    metrics = RunMetrics('resize_images', args.profile)
     
-    for ext in image_extensions:
-        image_files.extend(input_path.glob(f'*{ext}'))
-        image_files.extend(input_path.glob(f'*{ext.upper()}'))
+    # หาไฟล์รูปภาพทั้งหมด (scan directory รอบเดียว นามสกุลไม่สนตัวพิมพ์เล็ก/ใหญ่)
+    metrics.start_stage('scan')
+    image_entries = scan_image_files(input_path, index_file=args.file_index)
+    image_files = [Path(entry['path']) for entry in image_entries]
+    input_bytes = sum(entry['size'] for entry in image_entries)
+    metrics.end_stage(len(image_files))
     
     if not image_files:
         print(f"❌ No image files found in {args.input_dir}")
@@ -59,8 +127,86 @@ def main():
     
     print(f"📊 Found {len(image_files)} images to process")
     print(f"🎯 Target size: height={args.target_height}px, width={args.min_width}-{args.max_width}px")
+    print(f"💾 Output images: {codec.describe()}")
     
     # ประมวลผลรูปภาพ
+    npy_index = None
+    metrics.start_stage('resize')
+    if args.batch_mode:
+        processed, failed, size_stats, npy_index = resize_in_width_buckets(image_files, output_path, args, codec)
+    elif args.pipeline or args.workers > 1:
+        processed, failed, size_stats = resize_pipelined(image_files, output_path, args, codec, metrics)
+    else:
+        processed, failed, size_stats = resize_one_by_one(image_files, output_path, args, codec)
+    metrics.end_stage(processed + failed, input_bytes)
+    
+    # สรุปผลลัพธ์
+    print(f"\n📈 Resize Summary:")
+    print(f"  ✅ Processed: {processed}")
+    print(f"  ❌ Failed: {failed}")
+    print(f"  📁 Output: {args.output_dir}")
+    
+    if size_stats:
+        # คำนวณสถิติ
+        avg_original_width = sum(s['original'][0] for s in size_stats) / len(size_stats)
+        avg_resized_width = sum(s['resized'][0] for s in size_stats) / len(size_stats)
+        avg_ratio = sum(s['ratio'] for s in size_stats) / len(size_stats)
+        
+        print(f"\n📊 Size Statistics:")
+        print(f"  Original width (avg): {avg_original_width:.1f}px")
+        print(f"  Resized width (avg): {avg_resized_width:.1f}px")
+        print(f"  Scale ratio (avg): {avg_ratio:.3f}")
+        print(f"  Height: {args.target_height}px (all images)")
+    
+    # บันทึกรายงาน
+    report_file = "output/validation_reports/resize_report.txt"
+    Path("output/validation_reports").mkdir(parents=True, exist_ok=True)
+    
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write("IMAGE RESIZE REPORT\n")
+        f.write("="*50 + "\n\n")
+        f.write(f"Input directory: {args.input_dir}\n")
+        f.write(f"Output directory: {args.output_dir}\n")
+        f.write(f"Target height: {args.target_height}px\n")
+        f.write(f"Width range: {args.min_width}-{args.max_width}px\n")
+        f.write(f"JPEG quality: {args.quality}%\n")
+        f.write(f"Decode: {args.decode}\n")
+        f.write(f"Encoder: {codec.describe()}\n")
+        if args.batch_mode:
+            f.write(f"Batch mode: bucket step {args.bucket_step}px, batch size {args.batch_size}\n")
+        if npy_index:
+            f.write(f"NumPy buckets: {len(npy_index['buckets'])} arrays in {npy_index['npy_dir']}\n")
+        f.write("\n")
+        f.write(f"Results:\n")
+        f.write(f"  Total files: {len(image_files)}\n")
+        f.write(f"  Processed: {processed}\n")
+        f.write(f"  Failed: {failed}\n")
+        f.write(f"  Success rate: {(processed / len(image_files) * 100):.1f}%\n\n")
+        
+        if size_stats:
+            f.write("Size Statistics:\n")
+            f.write(f"  Average original width: {avg_original_width:.1f}px\n")
+            f.write(f"  Average resized width: {avg_resized_width:.1f}px\n")
+            f.write(f"  Average scale ratio: {avg_ratio:.3f}\n")
+    
+    print(f"\n📋 Report saved: {report_file}")
+    
+    metrics.set(images=len(image_files), processed=processed, failed=failed, workers=args.workers,
+                encoder=codec.describe(), decode=args.decode)
+    metrics.print_summary()
+    metrics.save()
+    
+    if npy_index:
+        print(f"📦 NumPy buckets: {len(npy_index['buckets'])} arrays in {npy_index['npy_dir']}")
+    
+    if processed > 0:
+        print(f"\n🚀 Next steps:")
+        print(f"1. Check resized images in: {args.output_dir}")
+        print(f"2. Update annotation file to point to resized images")
+        print(f"3. Validate data: python scripts/validate_data.py")
+
+def resize_one_by_one(image_files, output_path, args, codec):
+    """ปรับขนาดและบันทึกรูปภาพทีละรูป คืนค่า (processed, failed, size_stats)"""
     processed = 0
     failed = 0
     size_stats = []
@@ -69,21 +215,24 @@ def main():
     
     for image_file in image_files:
         try:
-            # โหลดรูปภาพ
-            image = load_image_safely(image_file)
+            # โหลดรูปภาพ (JPEG ขนาดใหญ่ decode แบบย่อ, คงลำดับสี BGR ไว้ให้ codec)
+            image, source_size = load_image_for_resize(
+                image_file, args.target_height, args.max_width, args.min_width, args.decode, 'BGR'
+            )
             if image is None:
                 failed += 1
                 continue
             
             # บันทึกขนาดเดิม
-            original_height, original_width = image.shape[:2]
+            original_width, original_height = source_size
             
             # ปรับขนาด
             resized_image = resize_image_keep_ratio(
                 image, 
                 args.target_height, 
                 args.max_width, 
-                args.min_width
+                args.min_width,
+                source_size
             )
             
             if resized_image is None:
@@ -91,11 +240,11 @@ def main():
                 continue
             
             # สร้างชื่อไฟล์ใหม่
-            output_filename = f"{image_file.stem}_resized.jpg"
+            output_filename = f"{image_file.stem}_resized{codec.extension}"
             output_file_path = output_path / output_filename
             
             # บันทึกรูปภาพ
-            success = save_image_safely(resized_image, output_file_path, args.quality)
+            success = codec.save(resized_image, output_file_path, 'BGR')
             
             if success:
                 processed += 1
@@ -122,55 +271,414 @@ def main():
     
     progress_bar.close()
     
-    # สรุปผลลัพธ์
-    print(f"\n📈 Resize Summary:")
-    print(f"  ✅ Processed: {processed}")
-    print(f"  ❌ Failed: {failed}")
-    print(f"  📁 Output: {args.output_dir}")
+    return processed, failed, size_stats
+
+def bucket_width(new_width, bucket_step, max_width):
+    """ปัดความกว้างขึ้นเป็นทวีคูณของ bucket_step (ไม่เกิน max_width)"""
+    step = max(1, bucket_step)
+    return min(-(-new_width // step) * step, max_width)
+
+def plan_width_buckets(image_files, args):
+    """อ่านขนาดรูปจาก header (ไม่ decode) แล้วจัดกลุ่มตามความกว้างหลังปรับขนาด
     
-    if size_stats:
-        # คำนวณสถิติ
-        avg_original_width = sum(s['original'][0] for s in size_stats) / len(size_stats)
-        avg_resized_width = sum(s['resized'][0] for s in size_stats) / len(size_stats)
-        avg_ratio = sum(s['ratio'] for s in size_stats) / len(size_stats)
+    คืนค่า (dict bucket_width -> list ของไฟล์ เรียงตามความกว้าง, list ไฟล์ที่อ่าน header ไม่ได้)
+    """
+    buckets = defaultdict(list)
+    unreadable = []
+    
+    for image_file in image_files:
+        info = probe_image_header(image_file)
+        if info is None:
+            unreadable.append(image_file)
+            continue
         
-        print(f"\n📊 Size Statistics:")
-        print(f"  Original width (avg): {avg_original_width:.1f}px")
-        print(f"  Resized width (avg): {avg_resized_width:.1f}px")
-        print(f"  Scale ratio (avg): {avg_ratio:.3f}")
-        print(f"  Height: {args.target_height}px (all images)")
+        width, height, _ = info
+        new_width = compute_resized_width(width, height, args.target_height, args.max_width, args.min_width)
+        buckets[bucket_width(new_width, args.bucket_step, args.max_width)].append(image_file)
     
-    # บันทึกรายงาน
-    report_file = "output/validation_reports/resize_report.txt"
-    Path("output/validation_reports").mkdir(parents=True, exist_ok=True)
+    return dict(sorted(buckets.items())), unreadable
+
+def open_npy_bucket(npy_dir, name, count, height, width):
+    """สร้าง .npy แบบ memory-mapped ขนาด (count, height, width, 3) uint8 เติมศูนย์ไว้ก่อน (padding)"""
+    return np.lib.format.open_memmap(
+        str(npy_dir / f"{name}_images.npy"), mode='w+', dtype=np.uint8,
+        shape=(count, height, width, 3)
+    )
+
+def finalize_npy_bucket(npy_dir, name, shape, widths, names):
+    """ปิด bucket: ตัดแถวที่ไม่ได้ใช้ (รูปที่โหลดไม่ได้) แล้วบันทึก widths และ names คู่กัน
     
-    with open(report_file, 'w', encoding='utf-8') as f:
-        f.write("IMAGE RESIZE REPORT\n")
-        f.write("="*50 + "\n\n")
-        f.write(f"Input directory: {args.input_dir}\n")
-        f.write(f"Output directory: {args.output_dir}\n")
-        f.write(f"Target height: {args.target_height}px\n")
-        f.write(f"Width range: {args.min_width}-{args.max_width}px\n")
-        f.write(f"JPEG quality: {args.quality}%\n\n")
-        f.write(f"Results:\n")
-        f.write(f"  Total files: {len(image_files)}\n")
-        f.write(f"  Processed: {processed}\n")
-        f.write(f"  Failed: {failed}\n")
-        f.write(f"  Success rate: {(processed / len(image_files) * 100):.1f}%\n\n")
+    ผู้เรียกต้อง flush และปล่อย memmap ของ bucket (del) ก่อน เพราะ Windows แทนที่หรือลบไฟล์ที่ยัง map อยู่ไม่ได้
+    """
+    images_file = npy_dir / f"{name}_images.npy"
+    count = len(names)
+    
+    if count == 0:
+        images_file.unlink()
+        return None
+    
+    if count < shape[0]:
+        tmp_file = npy_dir / f"{name}_images.tmp.npy"
+        source = np.load(images_file, mmap_mode='r')
+        trimmed = np.lib.format.open_memmap(str(tmp_file), mode='w+', dtype=np.uint8,
+                                            shape=(count,) + shape[1:])
+        trimmed[:] = source[:count]
+        trimmed.flush()
+        # ปล่อยทั้งสอง mapping ก่อนแทนที่ไฟล์
+        del source, trimmed
+        os.replace(tmp_file, images_file)
+    
+    np.save(npy_dir / f"{name}_widths.npy", np.asarray(widths, dtype=np.int32))
+    with open(npy_dir / f"{name}_names.txt", 'w', encoding='utf-8') as f:
+        f.writelines(f"{image_name}\n" for image_name in names)
+    
+    return {
+        'width': shape[2],
+        'count': count,
+        'images': images_file.name,
+        'widths': f"{name}_widths.npy",
+        'names': f"{name}_names.txt"
+    }
+
+def resize_in_width_buckets(image_files, output_path, args, codec):
+    """ปรับขนาดทีละ bucket ของความกว้าง และเขียน .npy ทีละ batch
+    
+    ความกว้างคำนวณจาก header ล่วงหน้า ทำให้รู้ขนาด array ของแต่ละ bucket ก่อน decode
+    รูปต้นฉบับใน bucket เดียวกันมีขนาดต่างกัน cv2.resize จึงรวมเป็น batch เดียวไม่ได้:
+    decode/resize/encode ทำทีละรูปกระจายไปยัง --workers process (ผลกลับมาตามลำดับเดิม)
+    ส่วนที่ทำเป็น batch คือการเขียน memmap ครั้งละ --batch-size รูป
+    รูปที่ขนาดจริงหลัง decode ไม่ตรงกับ header (เช่น EXIF rotation) จะถูกเก็บไว้เขียนเป็น array แยกตอนท้าย
+    คืนค่า (processed, failed, size_stats, npy_index หรือ None)
+    """
+    buckets, unreadable = plan_width_buckets(image_files, args)
+    for image_file in unreadable:
+        logging.error(f"Cannot read image header {image_file}")
+    
+    print(f"🪣 Width buckets ({args.bucket_step}px step): " +
+          ", ".join(f"{width}px×{len(files)}" for width, files in buckets.items()))
+    
+    npy_dir = None
+    npy_buckets = []
+    if args.emit_npy:
+        npy_dir = output_path / 'npy_buckets'
+        npy_dir.mkdir(parents=True, exist_ok=True)
+    
+    processed = 0
+    failed = len(unreadable)
+    size_stats = []
+    spill = defaultdict(list)
+    
+    progress_bar = create_progress_bar(len(image_files), "Resizing buckets")
+    progress_bar.update(len(unreadable))
+    
+    # ทุก bucket ใช้ pool เดียวกัน ผลลัพธ์เรียงตามลำดับไฟล์ใน buckets
+    process = partial(resize_bucket_image, output_path=output_path, target_height=args.target_height,
+                      max_width=args.max_width, min_width=args.min_width, codec=codec,
+                      decode=args.decode, keep_array=npy_dir is not None)
+    results = run_in_pool(process, [image_file for files in buckets.values() for image_file in files],
+                          args.workers, max(1, args.batch_size // max(1, args.workers)))
+    
+    for width, files in buckets.items():
+        name = f"bucket_w{width:04d}"
+        images = open_npy_bucket(npy_dir, name, len(files), args.target_height, width) if npy_dir else None
+        widths = []
+        names = []
         
-        if size_stats:
-            f.write("Size Statistics:\n")
-            f.write(f"  Average original width: {avg_original_width:.1f}px\n")
-            f.write(f"  Average resized width: {avg_resized_width:.1f}px\n")
-            f.write(f"  Average scale ratio: {avg_ratio:.3f}\n")
+        for start in range(0, len(files), args.batch_size):
+            batch_files = files[start:start + args.batch_size]
+            batch = np.zeros((len(batch_files), args.target_height, width, 3), dtype=np.uint8)
+            batch_widths = []
+            batch_names = []
+            
+            for image_file in batch_files:
+                error, source_size, new_size, resized_image = next(results)
+                if error:
+                    logging.error(f"Error processing {image_file}: {error}")
+                    failed += 1
+                    continue
+                
+                processed += 1
+                original_width, original_height = source_size
+                new_width, new_height = new_size
+                size_stats.append({
+                    'original': (original_width, original_height),
+                    'resized': (new_width, new_height),
+                    'ratio': new_width / original_width
+                })
+                
+                if processed <= 5:
+                    print(f"  ✓ {image_file.name}: {original_width}x{original_height} -> {new_width}x{new_height}")
+                
+                if images is None:
+                    continue
+                
+                # ขนาดจริงไม่ตรงกับ header: เก็บไว้ใน bucket ที่ถูกต้องตอนท้าย
+                actual_width = bucket_width(new_width, args.bucket_step, args.max_width)
+                if actual_width != width:
+                    spill[actual_width].append((image_file.name, resized_image))
+                    continue
+                
+                # padding ด้านขวาด้วยศูนย์
+                batch[len(batch_names), :, :new_width] = resized_image
+                batch_widths.append(new_width)
+                batch_names.append(image_file.name)
+            
+            # เขียนทั้ง batch ลง memmap ในครั้งเดียว
+            if images is not None and batch_names:
+                images[len(names):len(names) + len(batch_names)] = batch[:len(batch_names)]
+                widths.extend(batch_widths)
+                names.extend(batch_names)
+            
+            progress_bar.update(len(batch_files))
+        
+        if images is not None:
+            images.flush()
+            shape = images.shape
+            del images
+            entry = finalize_npy_bucket(npy_dir, name, shape, widths, names)
+            if entry:
+                npy_buckets.append(entry)
     
-    print(f"\n📋 Report saved: {report_file}")
+    progress_bar.close()
     
-    if processed > 0:
-        print(f"\n🚀 Next steps:")
-        print(f"1. Check resized images in: {args.output_dir}")
-        print(f"2. Update annotation file to point to resized images")
-        print(f"3. Validate data: python scripts/validate_data.py")
+    for width, items in sorted(spill.items()):
+        name = f"bucket_w{width:04d}_extra"
+        images = open_npy_bucket(npy_dir, name, len(items), args.target_height, width)
+        for i, (_, resized_image) in enumerate(items):
+            images[i, :, :resized_image.shape[1]] = resized_image
+        images.flush()
+        shape = images.shape
+        del images
+        entry = finalize_npy_bucket(npy_dir, name, shape,
+                                    [resized_image.shape[1] for _, resized_image in items],
+                                    [image_name for image_name, _ in items])
+        npy_buckets.append(entry)
+    
+    if npy_dir is None:
+        return processed, failed, size_stats, None
+    
+    npy_index = {
+        'npy_dir': str(npy_dir),
+        'target_height': args.target_height,
+        'channels': 3,
+        'color': 'RGB',
+        'bucket_step': args.bucket_step,
+        'buckets': npy_buckets
+    }
+    with open(npy_dir / 'buckets.json', 'w', encoding='utf-8') as f:
+        json.dump(npy_index, f, indent=2, ensure_ascii=False)
+    
+    return processed, failed, size_stats, npy_index
+
+def resize_bucket_image(image_file, output_path, target_height, max_width, min_width, codec, decode='auto', keep_array=False):
+    """(ทำงานใน worker process) โหลด -> resize -> บันทึกรูปหนึ่งรูปของโหมด bucket
+    
+    คืนค่า (ข้อความ error หรือ None, ขนาดเดิม, ขนาดใหม่, RGB array ที่ย่อแล้วถ้า keep_array)
+    """
+    try:
+        # โหลดรูปภาพ (JPEG ขนาดใหญ่ decode แบบย่อ, คงลำดับสี BGR ไว้ให้ codec)
+        image, source_size = load_image_for_resize(image_file, target_height, max_width, min_width, decode, 'BGR')
+        resized_image = resize_image_keep_ratio(image, target_height, max_width, min_width, source_size)
+        
+        if resized_image is None:
+            return "cannot load or resize image", None, None, None
+        if not codec.save(resized_image, Path(output_path) / f"{image_file.stem}_resized{codec.extension}", 'BGR'):
+            return "cannot save image", None, None, None
+        
+        new_height, new_width = resized_image.shape[:2]
+        # .npy เก็บเป็น RGB (แปลงเฉพาะรูปที่ย่อแล้ว)
+        return None, source_size, (new_width, new_height), resized_image[:, :, ::-1] if keep_array else None
+    
+    except Exception as e:
+        return str(e), None, None, None
+
+def resize_image_bytes(data, target_height, max_width, min_width, codec, decode='auto'):
+    """(ทำงานใน worker process) decode -> resize -> encode ด้วย codec จาก bytes ในหน่วยความจำ
+    
+    คืนค่า (jpeg bytes หรือ None, ขนาดเดิม, ขนาดใหม่, เวลาที่ใช้)
+    """
+    start = time.perf_counter()
+    image, source_size = decode_image_for_resize(data, target_height, max_width, min_width, decode, 'BGR')
+    resized_image = resize_image_keep_ratio(image, target_height, max_width, min_width, source_size)
+    
+    if resized_image is None:
+        return None, None, None, time.perf_counter() - start
+    
+    encoded = codec.encode(resized_image, 'BGR')
+    new_height, new_width = resized_image.shape[:2]
+    return encoded, source_size, (new_width, new_height), time.perf_counter() - start
+
+def resize_pipelined(image_files, output_path, args, codec, metrics=None):
+    """ปรับขนาดแบบ pipeline: reader thread -> process pool (decode/resize/encode) -> writer thread
+    
+    แต่ละขั้นเชื่อมกันด้วย queue ที่จำกัดขนาด (--prefetch) หน่วยความจำจึงคงที่ และ disk I/O ทำงานทับซ้อนกับงาน CPU
+    ผลลัพธ์ถูกเขียนตามลำดับเดิมและเหมือนกับโหมดทีละรูปทุก byte
+    เวลาทำงานของแต่ละขั้น (ทับซ้อนกัน) ถูกบันทึกลง metrics ถ้ากำหนด
+    คืนค่า (processed, failed, size_stats)
+    """
+    read_queue = queue.Queue(maxsize=max(1, args.prefetch))
+    write_queue = queue.Queue(maxsize=max(1, args.prefetch))
+    
+    # แต่ละ thread เขียนเฉพาะ key ของตัวเอง
+    timing = defaultdict(float)
+    counts = defaultdict(int)
+    size_stats = []
+    # exception ที่ทำให้ reader/writer หยุด ส่งต่อให้ thread หลัก raise หลังปิด pipeline
+    errors = []
+    
+    def reader():
+        try:
+            for image_file in image_files:
+                start = time.perf_counter()
+                try:
+                    data = image_file.read_bytes()
+                    counts['read'] += 1
+                    counts['read_bytes'] += len(data)
+                except OSError as e:
+                    logging.error(f"Cannot read image {image_file}: {e}")
+                    data = None
+                timing['read'] += time.perf_counter() - start
+                
+                # เวลาที่รอเพราะ queue เต็ม = ขั้นถัดไปช้ากว่าการอ่าน
+                start = time.perf_counter()
+                read_queue.put((image_file, data))
+                timing['read_blocked'] += time.perf_counter() - start
+        
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # thread หลักรอ sentinel นี้เสมอ ต้องส่งแม้ reader หยุดกลางทาง
+            read_queue.put(None)
+    
+    def writer():
+        try:
+            while True:
+                start = time.perf_counter()
+                item = write_queue.get()
+                timing['write_idle'] += time.perf_counter() - start
+                if item is None:
+                    break
+                
+                image_file, encoded, original_size, new_size = item
+                start = time.perf_counter()
+                try:
+                    with open(output_path / f"{image_file.stem}_resized{codec.extension}", 'wb') as f:
+                        f.write(encoded)
+                    counts['written'] += 1
+                    counts['written_bytes'] += len(encoded)
+                    
+                    size_stats.append({
+                        'original': original_size,
+                        'resized': new_size,
+                        'ratio': new_size[0] / original_size[0]
+                    })
+                    if counts['written'] <= 5:
+                        print(f"  ✓ {image_file.name}: {original_size[0]}x{original_size[1]} -> {new_size[0]}x{new_size[1]}")
+                        
+                except OSError as e:
+                    logging.error(f"Cannot save image {image_file}: {e}")
+                    counts['write_failed'] += 1
+                timing['write'] += time.perf_counter() - start
+        
+        except BaseException as e:
+            errors.append(e)
+            # รับงานที่เหลือทิ้งจนถึง sentinel เพื่อไม่ให้ write_queue.put ของ thread หลักค้างเมื่อ queue เต็ม
+            while write_queue.get() is not None:
+                pass
+    
+    print(f"🔀 Pipeline: 1 reader -> {args.workers} worker process(es) -> 1 writer (queue size {args.prefetch})")
+    
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for thread in threads:
+        thread.start()
+    
+    failed = 0
+    process = partial(resize_image_bytes, target_height=args.target_height, max_width=args.max_width,
+                      min_width=args.min_width, codec=codec, decode=args.decode)
+    progress_bar = create_progress_bar(len(image_files), "Resizing images")
+    
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        pending = deque()
+        max_pending = max(1, args.workers) * 4
+        reading = True
+        
+        while reading or pending:
+            # เติมงานให้ pool จนเต็มจำนวนที่กำหนด
+            while reading and len(pending) < max_pending:
+                item = read_queue.get()
+                if item is None:
+                    reading = False
+                    break
+                
+                image_file, data = item
+                if data is None:
+                    failed += 1
+                    progress_bar.update(1)
+                    continue
+                pending.append((image_file, executor.submit(process, data)))
+            
+            if not pending:
+                continue
+            
+            # รับผลตามลำดับเดิม
+            image_file, future = pending.popleft()
+            try:
+                encoded, original_size, new_size, seconds = future.result()
+                timing['process'] += seconds
+                counts['processed'] += 1
+                
+                if encoded is None:
+                    failed += 1
+                else:
+                    write_queue.put((image_file, encoded, original_size, new_size))
+                    
+            except Exception as e:
+                logging.error(f"Error processing {image_file}: {e}")
+                failed += 1
+            
+            progress_bar.update(1)
+    
+    write_queue.put(None)
+    for thread in threads:
+        thread.join()
+    
+    progress_bar.close()
+    
+    if errors:
+        raise RuntimeError(f"Resize pipeline stopped: {errors[0]!r}") from errors[0]
+    wall_time = time.perf_counter() - wall_start
+    
+    print_pipeline_timing(timing, counts, args.workers, wall_time)
+    
+    if metrics is not None:
+        metrics.add_stage('pipeline_read', counts['read'], timing['read'], counts['read_bytes'])
+        metrics.add_stage('pipeline_resize', counts['processed'], timing['process'])
+        metrics.add_stage('pipeline_write', counts['written'], timing['write'], counts['written_bytes'])
+    
+    return counts['written'], failed + counts['write_failed'], size_stats
+
+def print_pipeline_timing(timing, counts, workers, wall_time):
+    """แสดงเวลาของแต่ละขั้นใน pipeline และประเมินว่าคอขวดอยู่ที่ disk หรือ CPU"""
+    megabyte = 1024 * 1024
+    print("\n⏱️  Pipeline timing:")
+    for name, items, seconds in [('read', counts['read'], timing['read']),
+                                 ('resize', counts['processed'], timing['process']),
+                                 ('write', counts['written'], timing['write'])]:
+        print(f"  {name:<12} {items:>8} items  {seconds:>8.2f}s  {items / seconds if seconds > 0 else 0:>10.1f} items/s")
+    print(f"  Read {counts['read_bytes'] / megabyte:.1f} MB, wrote {counts['written_bytes'] / megabyte:.1f} MB "
+          f"in {wall_time:.2f}s wall time")
+    print(f"  Reader blocked on full queue: {timing['read_blocked']:.2f}s, "
+          f"writer idle waiting for work: {timing['write_idle']:.2f}s")
+    
+    # เวลาทำงานจริงของแต่ละขั้น (resize แบ่งกันทำหลาย process)
+    busy = {
+        'disk read': timing['read'],
+        'CPU (decode/resize/encode)': timing['process'] / max(1, workers),
+        'disk write': timing['write']
+    }
+    bottleneck = max(busy, key=busy.get)
+    print(f"  🔎 Bottleneck: {bottleneck} ({busy[bottleneck]:.2f}s busy of {wall_time:.2f}s)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+"""
+Run metrics for data preparation scripts
+วัดเวลา wall/CPU, items/s, bytes/s และ peak RSS ของแต่ละขั้นตอน แล้วบันทึกเป็น JSON ข้างรายงานอื่นๆ
+
+output/validation_reports/run_metrics.json เก็บผลการรันล่าสุดของแต่ละ script (key = ชื่อ script)
+เช่น {"convert_data": {"wall_seconds": ..., "stages": [{"name": "convert", "items_per_second": ...}]}}
+
+Profiling (--profile ของแต่ละ script, วัดเฉพาะ process หลัก):
+    cprofile:    บันทึก output/validation_reports/<script>.prof (เปิดด้วย snakeviz หรือ pstats) และ function ที่ใช้เวลามากที่สุด
+    tracemalloc: peak หน่วยความจำที่ Python จองในแต่ละขั้นตอน และบรรทัดที่จองมากที่สุด (ช้าลงประมาณ 2 เท่า)
+
+CPU time และ peak RSS รวม worker process ที่จบแล้ว (resource.getrusage, ไม่มีบน Windows)
+peak RSS เป็นค่าสูงสุดตั้งแต่เริ่ม process จนจบขั้นตอนนั้น ไม่ใช่เฉพาะภายในขั้นตอน
+"""
+
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILE_MODES = ['off', 'cprofile', 'tracemalloc']
+METRICS_FILE = 'output/validation_reports/run_metrics.json'
+
+# จำนวน function/บรรทัดที่บันทึกลง JSON เมื่อเปิด profiling
+PROFILE_TOP = 20
+
+class RunMetrics:
+    """เก็บ metrics ของการรัน script หนึ่งครั้ง (ขั้นตอนทำงานต่อกันทีละขั้น)"""
+    
+    def __init__(self, script, profile='off', output_file=METRICS_FILE):
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {profile} (expected one of {PROFILE_MODES})")
+        
+        self.script = script
+        self.profile = profile
+        self.output_file = Path(output_file)
+        self.stages = []
+        self.counters = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._current = None
+        self._profiler = None
+        self._start = _snapshot()
+        
+        if profile == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif profile == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start()
+    
+    def start_stage(self, name):
+        """เริ่มจับเวลาขั้นตอนใหม่ (ขั้นตอนที่ยังไม่จบจะถูกปิดก่อน)"""
+        if self._current is not None:
+            self.end_stage()
+        
+        if self.profile == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.reset_peak()
+        
+        self._current = (name, _snapshot())
+    
+    def end_stage(self, items=0, nbytes=0):
+        """จบขั้นตอนปัจจุบัน items/nbytes = จำนวนรายการ/ขนาดข้อมูลที่ขั้นตอนนี้ประมวลผล"""
+        if self._current is None:
+            return None
+        
+        name, start = self._current
+        self._current = None
+        end = _snapshot()
+        
+        stage = self.add_stage(name, items, end['wall'] - start['wall'], nbytes)
+        stage['cpu_seconds'] = _cpu_seconds(start, end)
+        stage['peak_rss_mb'] = end['peak_rss_mb']
+        stage['worker_peak_rss_mb'] = end['worker_peak_rss_mb']
+        
+        if self.profile == 'tracemalloc':
+            import tracemalloc
+            stage['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        
+        return stage
+    
+    def add_stage(self, name, items, seconds, nbytes=0):
+        """บันทึกขั้นตอนที่จับเวลาไว้เอง (เช่น เวลารวมของ thread ที่ทำงานทับซ้อนกัน ไม่มี CPU/RSS)"""
+        stage = {
+            'name': name,
+            'items': items,
+            'bytes': nbytes,
+            'wall_seconds': seconds,
+            'items_per_second': items / seconds if seconds > 0 else 0,
+            'bytes_per_second': nbytes / seconds if seconds > 0 else 0,
+            'cpu_seconds': None,
+            'peak_rss_mb': None,
+            'worker_peak_rss_mb': None
+        }
+        self.stages.append(stage)
+        return stage
+    
+    def set(self, **counters):
+        """บันทึกค่าสรุปอื่นๆ ของการรัน (เช่น processed, failed)"""
+        self.counters.update(counters)
+    
+    def print_summary(self):
+        """แสดงตาราง metrics ของทุกขั้นตอน"""
+        print("\n⏱️  Stage metrics:")
+        print(f"  {'stage':<16} {'items':>8} {'wall':>9} {'cpu':>9} {'items/s':>10} {'MB/s':>8} {'peak RSS':>10}")
+        for stage in self.stages:
+            cpu = f"{stage['cpu_seconds']:.2f}s" if stage['cpu_seconds'] is not None else '-'
+            rss = f"{stage['peak_rss_mb']:.0f} MB" if stage['peak_rss_mb'] is not None else '-'
+            throughput = f"{stage['bytes_per_second'] / (1024 * 1024):.1f}" if stage['bytes'] else '-'
+            print(f"  {stage['name']:<16} {stage['items']:>8} {stage['wall_seconds']:>8.2f}s {cpu:>9} "
+                  f"{stage['items_per_second']:>10.1f} {throughput:>8} {rss:>10}")
+    
+    def save(self):
+        """หยุด profiling และบันทึกผลการรันนี้ลง run_metrics.json (เก็บผลของ script อื่นไว้) คืนค่า dict ของการรันนี้"""
+        if self._current is not None:
+            self.end_stage()
+        
+        end = _snapshot()
+        run = {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'argv': sys.argv[1:],
+            'host': {
+                'hostname': platform.node(),
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count()
+            },
+            'wall_seconds': end['wall'] - self._start['wall'],
+            'cpu_seconds': _cpu_seconds(self._start, end),
+            'peak_rss_mb': end['peak_rss_mb'],
+            'worker_peak_rss_mb': end['worker_peak_rss_mb'],
+            'stages': self.stages,
+            'counters': self.counters
+        }
+        
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        if self.profile == 'cprofile':
+            run['profile'] = self._save_cprofile()
+        elif self.profile == 'tracemalloc':
+            run['profile'] = self._save_tracemalloc()
+        
+        runs = {}
+        if self.output_file.exists():
+            try:
+                with open(self.output_file, 'r', encoding='utf-8') as f:
+                    runs = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Cannot read {self.output_file}, starting a new file: {e}")
+        
+        runs[self.script] = run
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            json.dump(runs, f, ensure_ascii=False, indent=2)
+        
+        print(f"📋 Run metrics saved: {self.output_file}")
+        return run
+    
+    def _save_cprofile(self):
+        import pstats
+        
+        self._profiler.disable()
+        profile_file = self.output_file.parent / f"{self.script}.prof"
+        self._profiler.dump_stats(profile_file)
+        
+        stats = pstats.Stats(self._profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        functions = [{
+            'function': f"{Path(filename).name}:{line}({name})",
+            'calls': calls,
+            'total_seconds': total,
+            'cumulative_seconds': cumulative
+        } for (filename, line, name), (_, calls, total, cumulative, _) in top]
+        
+        print(f"\n🔬 Top functions by cumulative time (full profile: {profile_file}):")
+        for function in functions[:10]:
+            print(f"  {function['cumulative_seconds']:>8.2f}s {function['calls']:>9}  {function['function']}")
+        
+        return {'mode': 'cprofile', 'file': str(profile_file), 'top_functions': functions}
+    
+    def _save_tracemalloc(self):
+        import tracemalloc
+        
+        # ไม่นับ bytecode ของ module ที่ import
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+        ])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        allocations = [{
+            'location': f"{Path(stat.traceback[0].filename).name}:{stat.traceback[0].lineno}",
+            'size_mb': stat.size / (1024 * 1024),
+            'blocks': stat.count
+        } for stat in snapshot.statistics('lineno')[:PROFILE_TOP]]
+        
+        print(f"\n🔬 Largest live allocations at exit:")
+        for allocation in allocations[:10]:
+            print(f"  {allocation['size_mb']:>8.2f} MB {allocation['blocks']:>9}  {allocation['location']}")
+        
+        return {'mode': 'tracemalloc', 'traced_peak_mb': peak / (1024 * 1024), 'top_allocations': allocations}
+
+def _snapshot():
+    """เวลา wall, CPU time (process หลักและ worker ที่จบแล้ว) และ peak RSS ณ ขณะนี้"""
+    snapshot = {'wall': time.perf_counter(), 'peak_rss_mb': None, 'worker_peak_rss_mb': None}
+    
+    if resource is None:
+        snapshot['cpu'] = time.process_time()
+        snapshot['worker_cpu'] = 0.0
+        return snapshot
+    
+    # ru_maxrss เป็น KB บน Linux และ bytes บน macOS
+    rss_unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN)
+    snapshot['cpu'] = own.ru_utime + own.ru_stime
+    snapshot['worker_cpu'] = workers.ru_utime + workers.ru_stime
+    snapshot['peak_rss_mb'] = own.ru_maxrss * rss_unit / (1024 * 1024)
+    snapshot['worker_peak_rss_mb'] = workers.ru_maxrss * rss_unit / (1024 * 1024)
+    return snapshot
+
+def _cpu_seconds(start, end):
+    return (end['cpu'] - start['cpu']) + (end['worker_cpu'] - start['worker_cpu'])
@@ -0,0 +1,207 @@
+"""
+S3 transfer helpers shared by upload_to_s3.py and the training notebooks
+ฟังก์ชันสำหรับรับส่งข้อมูลกับ S3 ใช้ร่วมกันระหว่าง scripts และ notebooks
+
+Usage (notebook):
+    sys.path.insert(0, 'data_preparation/scripts')
+    from s3_transfer import download_s3_folder
+    stats = download_s3_folder(S3_BUCKET, f"{S3_DATA_PREFIX}/images/train", "s3_data/images/train")
+
+Usage (command line):
+    python s3_transfer.py --bucket your-bucket-name --s3-prefix recognition-data --local-dir data --workers 32
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+# ต้องตรงกับ TransferConfig ของ upload_to_s3.py เพื่อคำนวณ ETag ของไฟล์ multipart ให้ตรงกับ S3
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+
+def create_s3_client(workers=10, endpoint_url=None):
+    """สร้าง S3 client ที่มี connection pool พอสำหรับ thread ทั้งหมด (ใช้ร่วมกันได้ทุก thread)"""
+    # import เมื่อสร้าง client ครั้งแรก (import boto3 ใช้เวลาหลายร้อย ms)
+    import boto3
+    from botocore.config import Config
+    
+    config = Config(max_pool_connections=max(10, workers * 2))
+    return boto3.client('s3', endpoint_url=endpoint_url, config=config)
+
+def list_s3_objects(s3_client, bucket, prefix):
+    """list object ทั้งหมดภายใต้ prefix (paginated)
+    
+    คืน dict key -> {'size', 'etag', 'last_modified'} (last_modified เป็น Unix timestamp)
+    """
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = {
+                'size': obj['Size'],
+                'etag': obj['ETag'].strip('"'),
+                'last_modified': obj['LastModified'].timestamp()
+            }
+    
+    return objects
+
+def compute_s3_etag(file_path, file_size):
+    """คำนวณ ETag ที่ S3 จะได้เมื่ออัปโหลดไฟล์ด้วย TransferConfig ของ upload_to_s3.py
+    
+    ไฟล์เล็ก: MD5 ของไฟล์ / ไฟล์ multipart: MD5 ของ MD5 แต่ละ part ตามด้วย -<จำนวน part>
+    """
+    with open(file_path, 'rb') as f:
+        if file_size < MULTIPART_THRESHOLD:
+            return hashlib.md5(f.read()).hexdigest()
+        
+        part_digests = []
+        for chunk in iter(lambda: f.read(MULTIPART_CHUNKSIZE), b''):
+            part_digests.append(hashlib.md5(chunk).digest())
+    
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+def is_local_copy_identical(local_path, remote):
+    """ตรวจสอบว่าไฟล์ในเครื่องเหมือนกับ object ใน S3 (ขนาด + mtime หรือ ETag)"""
+    try:
+        stat = os.stat(local_path)
+    except OSError:
+        return False
+    
+    if stat.st_size != remote['size']:
+        return False
+    
+    # ไฟล์ที่ดาวน์โหลดโดย script นี้มี mtime เท่ากับ LastModified ของ object
+    if int(stat.st_mtime) == int(remote['last_modified']):
+        return True
+    
+    return compute_s3_etag(local_path, stat.st_size) == remote['etag']
+
+def download_file_with_retry(s3_client, bucket, key, local_path, remote, retries=3):
+    """ดาวน์โหลดไฟล์หนึ่งไฟล์ (ข้ามถ้าเหมือนเดิม) พร้อมลองใหม่แบบ exponential backoff
+    
+    คืนค่า 'downloaded' หรือ 'skipped' และ raise exception ถ้าลองครบแล้วยังไม่สำเร็จ
+    """
+    if is_local_copy_identical(local_path, remote):
+        return 'skipped'
+    
+    Path(local_path).parent.mkdir(parents=True, exist_ok=True)
+    
+    for attempt in range(retries + 1):
+        try:
+            # s3transfer เขียนลงไฟล์ชั่วคราวแล้ว rename เมื่อเสร็จ จึงไม่มีไฟล์ครึ่งๆ กลางๆ
+            s3_client.download_file(bucket, key, str(local_path))
+            os.utime(local_path, (remote['last_modified'], remote['last_modified']))
+            return 'downloaded'
+        
+        except Exception as e:
+            if attempt == retries:
+                raise
+            
+            delay = min(0.5 * (2 ** attempt), 30) * random.uniform(0.5, 1.5)
+            logging.warning(f"Retrying {key} in {delay:.1f}s (attempt {attempt + 1}/{retries}): {e}")
+            time.sleep(delay)
+
+def download_s3_folder(bucket, prefix, local_dir, s3_client=None, workers=16, retries=3, show_progress=True):
+    """ดาวน์โหลดทุก object ภายใต้ prefix แบบขนาน (resumable - ไฟล์ที่มีอยู่แล้วและเหมือนเดิมจะถูกข้าม)
+    
+    คืนค่า dict ที่มี total, downloaded, skipped, failed, bytes และ seconds
+    """
+    from tqdm import tqdm
+    
+    s3_client = s3_client or create_s3_client(workers)
+    prefix = prefix.rstrip('/') + '/' if prefix else ''
+    
+    start_time = time.time()
+    remote_objects = list_s3_objects(s3_client, bucket, prefix)
+    
+    # ข้าม "directory" objects
+    keys = [key for key in remote_objects if not key.endswith('/')]
+    stats = {'total': len(keys), 'downloaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+    
+    if show_progress:
+        print(f"📥 s3://{bucket}/{prefix} -> {local_dir} ({len(keys)} files, {workers} workers)")
+    
+    progress_bar = tqdm(total=len(keys), desc="Downloading", unit="files", disable=not show_progress)
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {}
+        key_iter = iter(keys)
+        max_pending = max(1, workers) * 4
+        
+        while True:
+            # เติมงานให้ pool จนเต็มจำนวนที่กำหนด
+            for key in key_iter:
+                local_path = Path(local_dir) / key[len(prefix):]
+                future = executor.submit(
+                    download_file_with_retry, s3_client, bucket, key,
+                    local_path, remote_objects[key], retries
+                )
+                pending[future] = key
+                if len(pending) >= max_pending:
+                    break
+            
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    status = future.result()
+                except Exception as e:
+                    status = 'failed'
+                    logging.error(f"Failed to download {key}: {e}")
+                
+                stats[status] += 1
+                if status == 'downloaded':
+                    stats['bytes'] += remote_objects[key]['size']
+                progress_bar.update(1)
+    
+    progress_bar.close()
+    stats['seconds'] = time.time() - start_time
+    
+    if show_progress:
+        print_transfer_summary(stats)
+    
+    return stats
+
+def print_transfer_summary(stats):
+    """แสดงสรุปผลการดาวน์โหลดพร้อม throughput"""
+    seconds = stats['seconds']
+    print(f"  ✅ Downloaded: {stats['downloaded']}  ⏭️  Skipped: {stats['skipped']}  ❌ Failed: {stats['failed']}")
+    if seconds > 0:
+        print(f"  📈 Throughput: {stats['downloaded'] / seconds:.1f} files/s, "
+              f"{stats['bytes'] / seconds / (1024 * 1024):.2f} MB/s ({seconds:.1f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Download a Recognition dataset from S3 in parallel')
+    parser.add_argument('--bucket', required=True,
+                       help='S3 bucket name')
+    parser.add_argument('--s3-prefix', default='recognition-data',
+                       help='S3 prefix (folder) to download')
+    parser.add_argument('--local-dir', default='s3_data',
+                       help='Local destination directory')
+    parser.add_argument('--workers', type=int, default=16,
+                       help='Number of parallel downloads')
+    parser.add_argument('--retries', type=int, default=3,
+                       help='Retries per file (exponential backoff)')
+    parser.add_argument('--endpoint-url', default=None,
+                       help='Custom S3 endpoint (e.g. MinIO or moto server for local testing)')
+    
+    args = parser.parse_args()
+    
+    s3_client = create_s3_client(args.workers, args.endpoint_url)
+    stats = download_s3_folder(args.bucket, args.s3_prefix, args.local_dir,
+                               s3_client=s3_client, workers=args.workers, retries=args.retries)
+    
+    if stats['failed']:
+        print("⚠️  Some files failed to download - re-run to resume")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Packed shard writers for Recognition datasets
+เขียน Recognition dataset เป็นไฟล์ shard ขนาดใหญ่แทนรูปภาพเล็กๆ จำนวนมาก
+
+รูปแบบที่รองรับ:
+    lmdb: หนึ่ง LMDB environment ต่อ shard ใช้ key แบบเดียวกับ LMDBDataSet ของ PaddleOCR
+          (num-samples, image-%09d, label-%09d)
+    tar:  ไฟล์ .tar ต่อ shard พร้อม index (.index.jsonl) ที่เก็บ offset และขนาดของแต่ละรูป
+"""
+
+import io
+import json
+import logging
+import tarfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+SHARD_FORMATS = ['lmdb', 'tar']
+
+class ShardWriter(ABC):
+    """ตัวเขียน shard พื้นฐาน แบ่งข้อมูลเป็น shard ละ shard_size ตัวอย่าง"""
+    
+    def __init__(self, output_dir, shard_size=50000):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.shards = []
+        self.total_samples = 0
+        self._shard_samples = 0
+        self._is_open = False
+    
+    def add(self, image_bytes, label):
+        """เพิ่มรูปภาพ (encoded bytes) และข้อความหนึ่งตัวอย่าง"""
+        if self._is_open and self._shard_samples >= self.shard_size:
+            self._finish_shard()
+        
+        if not self._is_open:
+            self._open_shard(f"shard_{len(self.shards):05d}")
+            self._shard_samples = 0
+            self._is_open = True
+        
+        self._shard_samples += 1
+        self.total_samples += 1
+        self._write_sample(self._shard_samples, image_bytes, label)
+    
+    def close(self):
+        """ปิด shard สุดท้ายและคืนรายการ shard ที่เขียน"""
+        if self._is_open:
+            self._finish_shard()
+        return self.shards
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _finish_shard(self):
+        path = self._close_shard(self._shard_samples)
+        self.shards.append({'path': str(path), 'samples': self._shard_samples})
+        self._is_open = False
+        logging.info(f"Wrote shard {path} ({self._shard_samples} samples)")
+    
+    @abstractmethod
+    def _open_shard(self, name):
+        """เริ่ม shard ใหม่ชื่อ name"""
+    
+    @abstractmethod
+    def _write_sample(self, index, image_bytes, label):
+        """เขียนตัวอย่างลำดับที่ index (เริ่มที่ 1) ลง shard ปัจจุบัน"""
+    
+    @abstractmethod
+    def _close_shard(self, num_samples):
+        """ปิด shard ปัจจุบันและคืน path ของ shard"""
+
+class LmdbShardWriter(ShardWriter):
+    """เขียน shard เป็น LMDB ที่ LMDBDataSet ของ PaddleOCR อ่านได้โดยตรง"""
+    
+    # จำนวนตัวอย่างต่อหนึ่ง transaction
+    COMMIT_INTERVAL = 1000
+    
+    def __init__(self, output_dir, shard_size=50000, map_size=1 << 30):
+        import lmdb  # optional dependency - ตรวจสอบก่อนเริ่มเขียน
+        self._lmdb = lmdb
+        self.map_size = map_size
+        super().__init__(output_dir, shard_size)
+    
+    def _open_shard(self, name):
+        self._path = self.output_dir / name
+        self._env = self._lmdb.open(str(self._path), map_size=self.map_size)
+        self._pending = []
+    
+    def _write_sample(self, index, image_bytes, label):
+        self._pending.append((f"image-{index:09d}".encode(), image_bytes))
+        self._pending.append((f"label-{index:09d}".encode(), label.encode('utf-8')))
+        if len(self._pending) >= self.COMMIT_INTERVAL * 2:
+            self._commit()
+    
+    def _commit(self):
+        while True:
+            try:
+                with self._env.begin(write=True) as txn:
+                    for key, value in self._pending:
+                        txn.put(key, value)
+                break
+            except self._lmdb.MapFullError:
+                # ขยายขนาด map แล้วเขียน transaction เดิมใหม่
+                self.map_size *= 2
+                self._env.set_mapsize(self.map_size)
+        self._pending = []
+    
+    def _close_shard(self, num_samples):
+        self._pending.append((b"num-samples", str(num_samples).encode()))
+        self._commit()
+        self._env.close()
+        return self._path
+
+class TarShardWriter(ShardWriter):
+    """เขียน shard เป็น .tar พร้อม index สำหรับอ่านแบบ random access"""
+    
+    def __init__(self, output_dir, shard_size=50000, image_extension='.jpg'):
+        self.image_extension = image_extension
+        super().__init__(output_dir, shard_size)
+    
+    def _open_shard(self, name):
+        self._path = self.output_dir / f"{name}.tar"
+        self._tar = tarfile.open(self._path, 'w', format=tarfile.GNU_FORMAT)
+        self._index = open(self.output_dir / f"{name}.index.jsonl", 'w', encoding='utf-8')
+    
+    def _write_sample(self, index, image_bytes, label):
+        info = tarfile.TarInfo(f"image-{index:09d}{self.image_extension}")
+        info.size = len(image_bytes)
+        
+        # ตำแหน่งข้อมูลรูป = ตำแหน่งปัจจุบัน + ขนาด header ของ member
+        header = info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors)
+        offset = self._tar.offset + len(header)
+        self._tar.addfile(info, io.BytesIO(image_bytes))
+        
+        record = {'name': info.name, 'offset': offset, 'size': info.size, 'label': label}
+        self._index.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def _close_shard(self, num_samples):
+        self._tar.close()
+        self._index.close()
+        return self._path
+
+def create_shard_writer(shard_format, output_dir, shard_size=50000, image_extension='.jpg'):
+    """สร้างตัวเขียน shard ตามรูปแบบที่กำหนด (image_extension ใช้ตั้งชื่อรูปใน tar)"""
+    if shard_format == 'lmdb':
+        return LmdbShardWriter(output_dir, shard_size)
+    if shard_format == 'tar':
+        return TarShardWriter(output_dir, shard_size, image_extension)
+    raise ValueError(f"Unknown shard format: {shard_format} (expected one of {SHARD_FORMATS})")
@@ -4,6 +4,10 @@ Upload Recognition dataset to S3
 
 Usage:
     python upload_to_s3.py --bucket your-bucket-name [options]
+    python upload_to_s3.py --bucket your-bucket-name --concurrency 32
+    python upload_to_s3.py --bucket your-bucket-name --sync --delete  # อัปโหลดเฉพาะไฟล์ที่เปลี่ยน
+    python upload_to_s3.py --bucket test --endpoint-url http://localhost:9000  # MinIO / moto server
+    python upload_to_s3.py --bucket your-bucket-name --profile cprofile  # profile process หลัก
     
 Requirements:
     - AWS credentials configured (aws configure)
@@ -12,20 +16,28 @@ Requirements:
 
 import argparse
 import sys
+import json
+import random
+import threading
 from pathlib import Path
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # เพิ่ม path สำหรับ import utils
 sys.path.append(str(Path(__file__).parent))
 
-try:
-    import boto3
-    from botocore.exceptions import NoCredentialsError, ClientError
-except ImportError:
-    print("❌ boto3 not installed. Run: pip install boto3")
-    sys.exit(1)
-
 from utils import *
+from s3_transfer import (
+    MULTIPART_THRESHOLD, MULTIPART_CHUNKSIZE,
+    create_s3_client, list_s3_objects, compute_s3_etag
+)
+from run_metrics import PROFILE_MODES, RunMetrics
+
+# error codes ที่ลองใหม่ไม่มีประโยชน์
+NON_RETRYABLE_ERRORS = {'AccessDenied', 'NoSuchBucket', 'InvalidAccessKeyId', 'SignatureDoesNotMatch', '403'}
+
+# cache ค่า ETag ของไฟล์ในเครื่องที่ตรงกับ S3 แล้ว แยกตามปลายทาง s3://bucket/prefix (อยู่นอก dataset directory)
+MD5_MANIFEST_FILE = 'output/cache/s3_md5_manifest.json'
 
 def main():
     parser = argparse.ArgumentParser(description='Upload Recognition dataset to S3')
@@ -38,13 +50,39 @@ def main():
     parser.add_argument('--dry-run', action='store_true',
                        help='Show what would be uploaded without actually uploading')
     parser.add_argument('--skip-existing', action='store_true',
-                       help='Skip files that already exist in S3')
+                       help='Skip files whose key already exists in S3 (one LIST instead of HEAD per file)')
+    parser.add_argument('--sync', action='store_true',
+                       help='Upload only new or changed files (compare size and ETag/MD5 with S3)')
+    parser.add_argument('--delete', action='store_true',
+                       help='With --sync: delete S3 objects under the prefix that no longer exist locally')
+    parser.add_argument('--include-hidden', action='store_true',
+                       help="Also upload files/directories whose names start with '.' (skipped by default, e.g. images/.staging)")
     parser.add_argument('--max-files', type=int, default=0,
                        help='Maximum number of files to upload (0 = all)')
     parser.add_argument('--yes', '-y', action='store_true',
                        help='Skip confirmation prompt')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Number of files uploaded in parallel')
+    parser.add_argument('--retries', type=int, default=3,
+                       help='Retries per file (exponential backoff)')
+    parser.add_argument('--endpoint-url', default=None,
+                       help='Custom S3 endpoint (e.g. MinIO or moto server for local testing)')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default='off',
+                       help='Profile the main process with cProfile or tracemalloc (results in run_metrics.json)')
     
     args = parser.parse_args()
+    setup_logging()
+    
+    if args.delete and not args.sync:
+        parser.error("--delete requires --sync")
+    
+    # import boto3 หลังแปลง arguments (--help ไม่ต้องรอ import boto3)
+    try:
+        import boto3
+        from botocore.exceptions import NoCredentialsError, ClientError
+    except ImportError:
+        print("❌ boto3 not installed. Run: pip install boto3")
+        sys.exit(1)
     
     print("☁️  PaddleOCR S3 Dataset Uploader")
     print("="*50)
@@ -59,8 +97,10 @@ def main():
     # ตรวจสอบ AWS credentials
     print("\n🔐 Checking AWS credentials...")
     try:
-        s3_client = boto3.client('s3')
-        sts_client = boto3.client('sts')
+        # client เดียวใช้ร่วมกันทุก thread (boto3 client เป็น thread-safe)
+        # ขยาย connection pool ให้พอกับจำนวน thread
+        s3_client = create_s3_client(args.concurrency, args.endpoint_url)
+        sts_client = boto3.client('sts', endpoint_url=args.endpoint_url)
         
         # ตรวจสอบ identity
         identity = sts_client.get_caller_identity()
@@ -96,30 +136,79 @@ def main():
             print(f"❌ Bucket error: {e}")
         return
     
+    metrics = RunMetrics('upload_to_s3', args.profile)
+    
     # สร้างรายการไฟล์ที่จะอัปโหลด
     print(f"\n📂 Scanning dataset files...")
+    metrics.start_stage('scan')
     
     files_to_upload = []
     total_size = 0
     
-    for file_path in dataset_path.rglob('*'):
-        if file_path.is_file():
-            relative_path = file_path.relative_to(dataset_path)
-            s3_key = f"{args.s3_prefix}/{relative_path}"
-            file_size = file_path.stat().st_size
-            
-            files_to_upload.append({
-                'local_path': file_path,
-                'relative_path': relative_path,
-                's3_key': s3_key,
-                'size': file_size
-            })
-            total_size += file_size
+    # scan ครั้งเดียวด้วย os.scandir (ใช้ขนาด/mtime จาก scan ไม่ต้อง stat ซ้ำ)
+    # ข้ามไฟล์/โฟลเดอร์ที่ซ่อนอยู่ (เช่น images/.staging ที่ใช้เป็น conversion cache) ยกเว้น --include-hidden
+    for entry in scan_files(dataset_path, recursive=True, skip_hidden=not args.include_hidden):
+        relative_path = Path(entry['relative_path'])
+        files_to_upload.append({
+            'local_path': Path(entry['path']),
+            'relative_path': relative_path,
+            's3_key': f"{args.s3_prefix}/{entry['relative_path']}",
+            'size': entry['size'],
+            'mtime_ns': entry['mtime_ns']
+        })
+        total_size += entry['size']
+    
+    metrics.end_stage(len(files_to_upload), total_size)
     
     if not files_to_upload:
         print("❌ No files found to upload!")
         return
     
+    local_keys = {f['s3_key'] for f in files_to_upload}
+    
+    # เปรียบเทียบกับ S3 ด้วยการ list prefix ครั้งเดียว (แทน HEAD ทีละไฟล์)
+    skipped = 0
+    stale_keys = []
+    destination = f"s3://{args.bucket}/{args.s3_prefix}/"
+    # ETag ที่ยืนยันแล้วว่าตรงกับ S3 (บันทึกเฉพาะตอนอัปโหลดจริง ไม่บันทึกใน --dry-run)
+    md5_manifest = None
+    changed_etags = {}
+    
+    if args.sync or args.skip_existing:
+        print(f"\n🔄 Listing s3://{args.bucket}/{args.s3_prefix}/ ...")
+        metrics.start_stage('list')
+        remote_objects = list_s3_objects(s3_client, args.bucket, f"{args.s3_prefix}/")
+        metrics.end_stage(len(remote_objects))
+        print(f"  📊 Remote objects: {len(remote_objects)}")
+        
+        total_files = len(files_to_upload)
+        metrics.start_stage('compare')
+        if args.sync:
+            md5_manifest = load_md5_manifest(MD5_MANIFEST_FILE, destination)
+            files_to_upload, changed_etags = select_changed_files(
+                files_to_upload, remote_objects, md5_manifest, args.concurrency
+            )
+        else:
+            files_to_upload = [f for f in files_to_upload if f['s3_key'] not in remote_objects]
+        
+        skipped = total_files - len(files_to_upload)
+        total_size = sum(f['size'] for f in files_to_upload)
+        metrics.end_stage(total_files)
+        print(f"  ⏭️  Unchanged: {skipped}")
+        
+        if args.delete:
+            stale_keys = sorted(set(remote_objects) - local_keys)
+            print(f"  🗑️  Stale objects to delete: {len(stale_keys)}")
+    
+    if not files_to_upload and not stale_keys:
+        print(f"\n✅ S3 is already up to date - nothing to upload")
+        if md5_manifest is not None and not args.dry_run:
+            save_md5_manifest(MD5_MANIFEST_FILE, destination, md5_manifest)
+        metrics.set(uploaded=0, skipped=skipped, failed=0, deleted=0)
+        metrics.print_summary()
+        metrics.save()
+        return
+    
     # จำกัดจำนวนไฟล์หากต้องการ
     if args.max_files > 0 and len(files_to_upload) > args.max_files:
         print(f"⚠️  Limiting upload to {args.max_files} files (out of {len(files_to_upload)})")
@@ -131,7 +220,8 @@ def main():
     print(f"  🎯 S3 destination: s3://{args.bucket}/{args.s3_prefix}/")
     
     # แสดงตัวอย่างไฟล์
-    print(f"\n📋 Sample files:")
+    if files_to_upload:
+        print(f"\n📋 Sample files:")
     for file_info in files_to_upload[:5]:
         size_str = format_size(file_info['size'])
         print(f"  📄 {file_info['relative_path']} ({size_str})")
@@ -142,13 +232,22 @@ def main():
     # Dry run
     if args.dry_run:
         print(f"\n🔍 DRY RUN - No files will be uploaded")
+        if stale_keys:
+            print(f"Would delete {len(stale_keys)} stale objects, e.g.:")
+            for key in stale_keys[:5]:
+                print(f"  🗑️  s3://{args.bucket}/{key}")
         print(f"Command to actually upload:")
         print(f"  python {Path(__file__).name} --bucket {args.bucket} --s3-prefix {args.s3_prefix}")
+        metrics.set(dry_run=True, to_upload=len(files_to_upload), skipped=skipped, stale=len(stale_keys))
+        metrics.print_summary()
+        metrics.save()
         return
     
     # ยืนยันการอัปโหลด
     if not args.yes:
         print(f"\n⚠️  Ready to upload {len(files_to_upload)} files ({format_size(total_size)}) to S3")
+        if stale_keys:
+            print(f"⚠️  {len(stale_keys)} objects will be DELETED from s3://{args.bucket}/{args.s3_prefix}/")
         
         try:
             import sys
@@ -167,49 +266,34 @@ def main():
             return
     
     # เริ่มอัปโหลด
-    print(f"\n📤 Starting upload...")
+    print(f"\n📤 Starting upload ({args.concurrency} concurrent)...")
     
-    uploaded = 0
-    skipped = 0
-    failed = 0
     start_time = time.time()
     
-    progress_bar = create_progress_bar(len(files_to_upload), "Uploading")
+    metrics.start_stage('upload')
+    stats = upload_files(
+        s3_client, args.bucket, files_to_upload,
+        concurrency=args.concurrency,
+        retries=args.retries
+    )
+    uploaded, failed = stats['uploaded'], stats['failed']
+    metrics.end_stage(uploaded + failed, stats['uploaded_bytes'])
     
-    for file_info in files_to_upload:
-        try:
-            # ตรวจสอบว่าไฟล์มีอยู่ใน S3 แล้วหรือไม่
-            if args.skip_existing:
-                try:
-                    s3_client.head_object(Bucket=args.bucket, Key=file_info['s3_key'])
-                    skipped += 1
-                    progress_bar.update(1)
-                    continue
-                except ClientError as e:
-                    if e.response['Error']['Code'] != '404':
-                        raise
-            
-            # อัปโหลดไฟล์
-            s3_client.upload_file(
-                str(file_info['local_path']),
-                args.bucket,
-                file_info['s3_key']
-            )
-            
-            uploaded += 1
-            
-            # แสดงความคืบหน้า
-            if uploaded <= 5:
-                size_str = format_size(file_info['size'])
-                print(f"  ✅ {file_info['relative_path']} ({size_str})")
-            
-        except Exception as e:
-            failed += 1
-            logging.error(f"Failed to upload {file_info['relative_path']}: {e}")
-        
-        progress_bar.update(1)
+    if md5_manifest is not None:
+        # เพิ่มเฉพาะไฟล์ที่อัปโหลดสำเร็จและรู้ ETag แล้ว (ไฟล์ใหม่ถูก hash ครั้งแรกตอน --sync ครั้งถัดไป)
+        for relative_path in stats['uploaded_paths']:
+            key = relative_path.as_posix()
+            if key in changed_etags:
+                md5_manifest[key] = changed_etags[key]
+        save_md5_manifest(MD5_MANIFEST_FILE, destination, md5_manifest)
     
-    progress_bar.close()
+    # ลบ object ที่ไม่มีในเครื่องแล้ว
+    deleted = 0
+    if stale_keys:
+        print(f"\n🗑️  Deleting {len(stale_keys)} stale objects...")
+        metrics.start_stage('delete')
+        deleted = delete_s3_objects(s3_client, args.bucket, stale_keys)
+        metrics.end_stage(len(stale_keys))
     
     # สรุปผลการอัปโหลด
     elapsed_time = time.time() - start_time
@@ -218,14 +302,21 @@ def main():
     print(f"  ✅ Uploaded: {uploaded}")
     print(f"  ⏭️  Skipped: {skipped}")
     print(f"  ❌ Failed: {failed}")
+    if stale_keys:
+        print(f"  🗑️  Deleted: {deleted}")
     print(f"  ⏱️  Time: {elapsed_time:.1f} seconds")
     
-    if uploaded > 0:
-        avg_speed = total_size / elapsed_time if elapsed_time > 0 else 0
-        print(f"  📈 Average speed: {format_size(avg_speed)}/s")
+    if uploaded > 0 and elapsed_time > 0:
+        print(f"  📈 Throughput: {uploaded / elapsed_time:.1f} files/s, "
+              f"{stats['uploaded_bytes'] / elapsed_time / (1024 * 1024):.2f} MB/s")
     
     # บันทึกรายงานการอัปโหลด
-    save_upload_report(args, uploaded, skipped, failed, elapsed_time)
+    save_upload_report(args, uploaded, skipped, failed, elapsed_time, stats['uploaded_bytes'])
+    
+    metrics.set(uploaded=uploaded, skipped=skipped, failed=failed, deleted=deleted,
+                uploaded_bytes=stats['uploaded_bytes'], concurrency=args.concurrency)
+    metrics.print_summary()
+    metrics.save()
     
     # แสดงขั้นตอนถัดไป
     if uploaded > 0:
@@ -245,6 +336,185 @@ def main():
         if failed > 0:
             print(f"Check logs for upload errors")
 
+def create_transfer_config():
+    """ตั้งค่า TransferConfig: ไฟล์เล็กอัปโหลดครั้งเดียว ไฟล์ใหญ่ (เช่น shards) แบ่งเป็น multipart"""
+    from boto3.s3.transfer import TransferConfig
+    
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=4
+    )
+
+def select_changed_files(files, remote_objects, manifest, workers=8):
+    """เลือกเฉพาะไฟล์ใหม่หรือเปลี่ยนแปลง โดยเทียบขนาดและ ETag กับไฟล์ในเครื่อง
+    
+    คำนวณ MD5 เฉพาะไฟล์ที่ขนาดตรงกับใน S3 ใช้ค่าใน manifest (ตาม size + mtime) ถ้ามี
+    ไฟล์ที่ตรงกับ S3 ถูกบันทึกลง manifest ทันที
+    คืนค่า (ไฟล์ที่ต้องอัปโหลด, ETag ของไฟล์ที่ hash แล้วแต่ต่างจาก S3 {relative path: entry})
+    """
+    # ไฟล์ที่ไม่มีใน S3 หรือขนาดต่างกันถือว่าเปลี่ยนแปลงทันที
+    candidates = [
+        f for f in files
+        if f['s3_key'] in remote_objects and remote_objects[f['s3_key']]['size'] == f['size']
+    ]
+    
+    def local_etag(file_info):
+        key = file_info['relative_path'].as_posix()
+        mtime_ns = file_info['mtime_ns']
+        cached = manifest.get(key)
+        if cached and cached['size'] == file_info['size'] and cached['mtime_ns'] == mtime_ns:
+            return key, cached
+        etag = compute_s3_etag(file_info['local_path'], file_info['size'])
+        return key, {'size': file_info['size'], 'mtime_ns': mtime_ns, 'etag': etag}
+    
+    unchanged_keys = set()
+    changed_etags = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for file_info, (key, entry) in zip(candidates, executor.map(local_etag, candidates)):
+            if entry['etag'] == remote_objects[file_info['s3_key']]['etag']:
+                unchanged_keys.add(file_info['s3_key'])
+                manifest[key] = entry
+            else:
+                changed_etags[key] = entry
+    
+    return [f for f in files if f['s3_key'] not in unchanged_keys], changed_etags
+
+def load_md5_manifest(manifest_file, destination):
+    """โหลด ETag ที่บันทึกไว้ของปลายทาง destination (s3://bucket/prefix/) คืนค่า {relative path: entry}"""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get(destination, {})
+    except (OSError, ValueError):
+        return {}
+
+def save_md5_manifest(manifest_file, destination, entries):
+    """บันทึก ETag ของปลายทาง destination (เก็บของปลายทางอื่นไว้)"""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifests = json.load(f)
+    except (OSError, ValueError):
+        manifests = {}
+    
+    manifests[destination] = entries
+    try:
+        Path(manifest_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifests, f)
+    except OSError as e:
+        logging.warning(f"Cannot save MD5 manifest {manifest_file}: {e}")
+
+def delete_s3_objects(s3_client, bucket, keys):
+    """ลบ object เป็น batch ละ 1000 keys (ขีดจำกัดของ DeleteObjects) คืนจำนวนที่ลบสำเร็จ"""
+    from botocore.exceptions import ClientError
+    
+    deleted = 0
+    
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        except ClientError as e:
+            logging.error(f"Failed to delete objects: {e}")
+            continue
+        
+        errors = response.get('Errors', [])
+        for error in errors:
+            logging.error(f"Failed to delete {error.get('Key')}: {error.get('Message')}")
+        deleted += len(batch) - len(errors)
+    
+    return deleted
+
+def upload_file_with_retry(s3_client, bucket, file_info, transfer_config, retries=3):
+    """อัปโหลดไฟล์หนึ่งไฟล์ พร้อมลองใหม่แบบ exponential backoff
+    
+    คืนค่า 'uploaded' และ raise exception ถ้าลองครบแล้วยังไม่สำเร็จ
+    """
+    from botocore.exceptions import ClientError
+    
+    for attempt in range(retries + 1):
+        try:
+            s3_client.upload_file(
+                str(file_info['local_path']),
+                bucket,
+                file_info['s3_key'],
+                Config=transfer_config
+            )
+            return 'uploaded'
+            
+        except Exception as e:
+            if isinstance(e, ClientError) and e.response['Error']['Code'] in NON_RETRYABLE_ERRORS:
+                raise
+            if attempt == retries:
+                raise
+            
+            # exponential backoff พร้อม jitter
+            delay = min(0.5 * (2 ** attempt), 30) * random.uniform(0.5, 1.5)
+            logging.warning(f"Retrying {file_info['relative_path']} in {delay:.1f}s "
+                            f"(attempt {attempt + 1}/{retries}): {e}")
+            time.sleep(delay)
+
+def upload_files(s3_client, bucket, files_to_upload, concurrency=1, retries=3):
+    """อัปโหลดไฟล์ทั้งหมดด้วย thread pool โดยใช้ client ร่วมกัน
+    
+    ส่งงานเข้า pool ครั้งละไม่เกิน concurrency * 4 ไฟล์ เพื่อไม่ให้หน่วยความจำโตตามจำนวนไฟล์
+    คืนค่า dict ที่มี uploaded, failed, uploaded_bytes และ uploaded_paths (relative path ของไฟล์ที่อัปโหลดสำเร็จ)
+    """
+    transfer_config = create_transfer_config()
+    stats = {'uploaded': 0, 'failed': 0, 'uploaded_bytes': 0, 'uploaded_paths': []}
+    lock = threading.Lock()
+    
+    progress_bar = create_progress_bar(len(files_to_upload), "Uploading")
+    
+    def record_result(file_info, future):
+        try:
+            status = future.result()
+        except Exception as e:
+            status = 'failed'
+            logging.error(f"Failed to upload {file_info['relative_path']}: {e}")
+        
+        with lock:
+            stats[status] += 1
+            if status == 'uploaded':
+                stats['uploaded_bytes'] += file_info['size']
+                stats['uploaded_paths'].append(file_info['relative_path'])
+                
+                # แสดงความคืบหน้า
+                if stats['uploaded'] <= 5:
+                    size_str = format_size(file_info['size'])
+                    progress_bar.write(f"  ✅ {file_info['relative_path']} ({size_str})")
+        
+        progress_bar.update(1)
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = {}
+        file_iter = iter(files_to_upload)
+        max_pending = max(1, concurrency) * 4
+        
+        while True:
+            # เติมงานให้ pool จนเต็มจำนวนที่กำหนด
+            for file_info in file_iter:
+                future = executor.submit(
+                    upload_file_with_retry, s3_client, bucket, file_info,
+                    transfer_config, retries
+                )
+                pending[future] = file_info
+                if len(pending) >= max_pending:
+                    break
+            
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record_result(pending.pop(future), future)
+    
+    progress_bar.close()
+    return stats
+
 def format_size(size_bytes):
     """แปลงขนาดไฟล์เป็นรูปแบบที่อ่านง่าย"""
     if size_bytes == 0:
@@ -257,7 +527,7 @@ def format_size(size_bytes):
     
     return f"{size_bytes:.1f}TB"
 
-def save_upload_report(args, uploaded, skipped, failed, elapsed_time):
+def save_upload_report(args, uploaded, skipped, failed, elapsed_time, uploaded_bytes=0):
     """บันทึกรายงานการอัปโหลด"""
     report_dir = Path("output/validation_reports")
     report_dir.mkdir(parents=True, exist_ok=True)
@@ -277,7 +547,12 @@ def save_upload_report(args, uploaded, skipped, failed, elapsed_time):
         f.write(f"Uploaded: {uploaded}\n")
         f.write(f"Skipped: {skipped}\n")
         f.write(f"Failed: {failed}\n")
-        f.write(f"Duration: {elapsed_time:.1f} seconds\n\n")
+        f.write(f"Duration: {elapsed_time:.1f} seconds\n")
+        f.write(f"Concurrency: {args.concurrency}\n")
+        if elapsed_time > 0:
+            f.write(f"Throughput: {uploaded / elapsed_time:.1f} files/s, "
+                    f"{uploaded_bytes / elapsed_time / (1024 * 1024):.2f} MB/s\n")
+        f.write("\n")
         
         f.write("S3 PATHS\n")
         f.write("-" * 20 + "\n")
@@ -1,29 +1,54 @@
 """
 Utility functions for data preparation
 ฟังก์ชันสำหรับใช้ร่วมกันในการเตรียมข้อมูล
+
+การ import module นี้ไม่สร้างไฟล์หรือ directory ใดๆ: แต่ละ script เรียก setup_logging() เองตอนเริ่ม main()
+cv2, NumPy, PIL และ tqdm ถูก import ภายในฟังก์ชันที่ใช้ (ครั้งแรกที่เรียก) เพื่อให้ scripts ที่ไม่ประมวลผลรูปภาพเริ่มทำงานเร็ว
 """
 
+import io
 import os
+import hashlib
+import re
 import json
-import cv2
-import numpy as np
-from PIL import Image
+import math
+import random
+import string
+import struct
+import unicodedata
 from pathlib import Path
-from tqdm import tqdm
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from statistics import NormalDist
 import logging
 
-# ตั้งค่า logging
-# สร้าง directory ก่อน
-Path('output/validation_reports').mkdir(parents=True, exist_ok=True)
+# log file ที่ทุก script เขียนร่วมกัน
+LOG_FILE = 'output/validation_reports/processing.log'
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('output/validation_reports/processing.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging(log_file=LOG_FILE, level=logging.INFO):
+    """ตั้งค่า logging ไปที่ console และ log_file (None = console เท่านั้น) เรียกครั้งเดียวตอนเริ่ม main()"""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        # สร้าง directory ก่อนเปิด log file
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handlers.insert(0, logging.FileHandler(log_file, encoding='utf-8'))
+    
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+# นามสกุลไฟล์รูปภาพที่รองรับ (เทียบแบบไม่สนตัวพิมพ์เล็ก/ใหญ่)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+# รูปที่ decode แบบย่อ (JPEG DCT scaling) ต้องใหญ่กว่าขนาดสุดท้ายอย่างน้อยกี่เท่า ส่วนที่เหลือย่อด้วย INTER_AREA
+REDUCED_DECODE_MARGIN = 4
+DECODE_MODES = ['auto', 'full']
+
+# ช่วงความยาวข้อความ (จำนวนตัวอักษร) สำหรับแบ่งชั้นข้อมูล
+LENGTH_STRATA = [(1, 5), (6, 10), (11, 20), (21, 50), (51, None)]
 
 def setup_directories():
     """สร้าง directories ที่จำเป็น"""
@@ -39,82 +64,229 @@ def setup_directories():
         Path(directory).mkdir(parents=True, exist_ok=True)
         logging.info(f"Created directory: {directory}")
 
-def load_image_safely(image_path):
-    """โหลดรูปภาพอย่างปลอดภัย"""
+def load_image_safely(image_path, channel_order='RGB'):
+    """โหลดรูปภาพอย่างปลอดภัย (channel_order='BGR' ใช้ผลจาก OpenCV โดยไม่แปลงสี)"""
+    import cv2
+    from PIL import Image
+    
     try:
         # ลองใช้ OpenCV ก่อน
         img = cv2.imread(str(image_path))
         if img is not None:
-            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            return img if channel_order == 'BGR' else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         
         # ถ้าไม่ได้ ใช้ PIL
         img = Image.open(image_path)
-        return np.array(img.convert('RGB'))
+        return _pil_to_array(img, channel_order)
         
     except Exception as e:
         logging.error(f"Cannot load image {image_path}: {e}")
         return None
 
-def save_image_safely(image, output_path, quality=95):
-    """บันทึกรูปภาพอย่างปลอดภัย"""
+def decode_image_bytes(data, channel_order='RGB'):
+    """decode รูปภาพจาก bytes ในหน่วยความจำ (ผลลัพธ์เหมือน load_image_safely) คืนค่า array หรือ None"""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    
     try:
-        # แปลงกลับเป็น PIL Image
-        if isinstance(image, np.ndarray):
-            image = Image.fromarray(image)
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            return img if channel_order == 'BGR' else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         
-        # บันทึกด้วยคุณภาพที่กำหนด
-        image.save(output_path, 'JPEG', quality=quality, optimize=True)
-        return True
+        img = Image.open(io.BytesIO(data))
+        return _pil_to_array(img, channel_order)
         
     except Exception as e:
-        logging.error(f"Cannot save image {output_path}: {e}")
-        return False
+        logging.error(f"Cannot decode image bytes: {e}")
+        return None
 
-def resize_image_keep_ratio(image, target_height=32, max_width=512, min_width=16):
-    """ปรับขนาดรูปภาพโดยคงสัดส่วน"""
+def _pil_to_array(img, channel_order='RGB'):
+    """PIL Image -> array ในลำดับสี channel_order"""
+    import cv2
+    import numpy as np
+    
+    image = np.array(img.convert('RGB'))
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR) if channel_order == 'BGR' else image
+
+def reduced_decode_scale(width, height, target_height=32, max_width=512, min_width=16, margin=REDUCED_DECODE_MARGIN):
+    """เลือกอัตราย่อ (8, 4, 2 หรือ 1) ที่มากที่สุดที่ยังให้รูปใหญ่กว่าขนาดสุดท้ายอย่างน้อย margin เท่าทั้งสองด้าน"""
+    final_width = compute_resized_width(width, height, target_height, max_width, min_width)
+    
+    for scale in (8, 4, 2):
+        if height / scale >= target_height * margin and width / scale >= final_width * margin:
+            return scale
+    return 1
+
+def decode_image_for_resize(data, target_height=32, max_width=512, min_width=16, decode='auto', channel_order='RGB'):
+    """decode รูปภาพจาก bytes เพื่อนำไปย่อเป็น target_height
+    
+    decode='auto': JPEG ที่ใหญ่กว่าขนาดสุดท้ายมากจะถูก decode แบบย่อ 1/2, 1/4 หรือ 1/8 ใน DCT domain
+    (cv2 IMREAD_REDUCED_* หรือ PIL draft) ซึ่ง decode pixel น้อยกว่าหลายเท่า แล้วจึงย่อต่อด้วย resize_image_keep_ratio
+    decode='full' หรือรูปแบบอื่น: เหมือน decode_image_bytes
+    channel_order='BGR' ข้ามการแปลงสีทั้งรูป (ใช้คู่กับ image_codec ที่ encode จาก BGR ได้โดยตรง)
+    คืนค่า (array, (width, height) ของรูปเต็ม) หรือ (None, None) ถ้า decode ไม่ได้
+    """
+    header = None
+    if decode == 'auto' and data[:2] == b'\xff\xd8':
+        stream = io.BytesIO(data)
+        stream.seek(2)
+        header = _probe_jpeg(stream)
+    
+    scale = reduced_decode_scale(header[0], header[1], target_height, max_width, min_width) if header else 1
+    if scale == 1:
+        image = decode_image_bytes(data, channel_order)
+        return image, image_size(image)
+    
+    import cv2
+    import numpy as np
+    from PIL import Image
+    
+    width, height = header[:2]
+    
+    try:
+        flag = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[scale]
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+        if img is not None:
+            image = img if channel_order == 'BGR' else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        else:
+            # ถ้า OpenCV decode ไม่ได้ ให้ libjpeg ของ PIL ย่อใน DCT domain แทน
+            img = Image.open(io.BytesIO(data))
+            img.draft('RGB', (width // scale, height // scale))
+            image = _pil_to_array(img, channel_order)
+        
+    except Exception as e:
+        logging.error(f"Cannot decode image bytes: {e}")
+        return None, None
+    
+    # OpenCV หมุนรูปตาม EXIF orientation แล้ว: ขนาดของรูปเต็มต้องสลับด้านตาม
+    if width != height and image.shape[:2] == (math.ceil(width / scale), math.ceil(height / scale)):
+        width, height = height, width
+    
+    return image, (width, height)
+
+def load_image_for_resize(image_path, target_height=32, max_width=512, min_width=16, decode='auto', channel_order='RGB'):
+    """โหลดรูปภาพจากไฟล์เพื่อนำไปย่อเป็น target_height (ดู decode_image_for_resize)
+    
+    คืนค่า (array, (width, height) ของรูปเต็ม) หรือ (None, None)
+    """
+    if decode == 'full':
+        image = load_image_safely(image_path, channel_order)
+        return image, image_size(image)
+    
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logging.error(f"Cannot load image {image_path}: {e}")
+        return None, None
+    
+    return decode_image_for_resize(data, target_height, max_width, min_width, decode, channel_order)
+
+def image_size(image):
+    """(width, height) ของรูปภาพ หรือ None"""
+    return (image.shape[1], image.shape[0]) if image is not None else None
+
+def resize_image_keep_ratio(image, target_height=32, max_width=512, min_width=16, source_size=None):
+    """ปรับขนาดรูปภาพโดยคงสัดส่วน
+    
+    source_size = (width, height) ของรูปเต็มเมื่อ image ถูก decode แบบย่อ (ให้ความกว้างสุดท้ายเท่ากับการ decode เต็มรูป)
+    """
+    import cv2
+    
     if image is None:
         return None
     
-    height, width = image.shape[:2]
+    width, height = source_size or image_size(image)
+    new_width = compute_resized_width(width, height, target_height, max_width, min_width)
+    
+    # ปรับขนาด
+    resized = cv2.resize(image, (new_width, target_height), interpolation=cv2.INTER_AREA)
     
+    return resized
+
+def compute_resized_width(width, height, target_height=32, max_width=512, min_width=16):
+    """คำนวณความกว้างหลังปรับขนาดโดยคงสัดส่วน (ใช้ได้กับขนาดจาก header โดยไม่ต้อง decode รูป)"""
     # คำนวณความกว้างใหม่
     ratio = target_height / height
     new_width = int(width * ratio)
     
     # จำกัดความกว้าง
-    new_width = max(min_width, min(new_width, max_width))
+    return max(min_width, min(new_width, max_width))
+
+def iter_label_file(label_file_path, image_dir, text_only=False, image_name_pattern=None, image_index_file=None):
+    """อ่านไฟล์ label ทีละบรรทัดแบบ generator (ใช้หน่วยความจำคงที่)
     
-    # ปรับขนาด
-    resized = cv2.resize(image, (new_width, target_height), interpolation=cv2.INTER_AREA)
+    บรรทัดที่มีแต่ข้อความ (รูปแบบ 4 หรือทุกบรรทัดเมื่อ text_only=True) จะถูกจับคู่กับรูปภาพตามลำดับ:
+    ถ้ากำหนด image_name_pattern (เช่น 'img_{index:03d}.jpg', index เริ่มที่ 1) จะสร้างชื่อไฟล์จาก pattern
+    ไม่เช่นนั้นใช้ไฟล์รูปภาพใน image_dir ที่เรียงชื่อแล้ว (list directory เพียงครั้งเดียว
+    หรือใช้ image_index_file ที่ขั้นตอนก่อนหน้าบันทึกไว้ถ้ายังตรงกับ directory)
     
-    return resized
+    yield dict ที่มี image_path, text, line_number และ error (None ถ้าแปลงบรรทัดได้)
+    """
+    image_index = None
+    text_only_count = 0
+    
+    try:
+        with open(label_file_path, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                
+                # ลองแปลงรูปแบบต่างๆ
+                if text_only:
+                    image_path, text = None, None
+                else:
+                    image_path, text = parse_label_line(line, image_dir)
+                
+                # รูปแบบ 4: เฉพาะข้อความ จับคู่กับรูปภาพตามลำดับบรรทัด
+                if not image_path and (text_only or is_text_only_line(line)):
+                    position = text_only_count
+                    text_only_count += 1
+                    text = line
+                    
+                    if image_name_pattern:
+                        image_path = image_name_pattern.format(index=position + 1)
+                    else:
+                        if image_index is None:
+                            image_index = list_image_files(image_dir, index_file=image_index_file)
+                        
+                        if position >= len(image_index):
+                            yield {'image_path': None, 'text': None, 'line_number': line_num,
+                                   'error': f"No image file for text-only line {line_num} "
+                                            f"(position {position + 1}, {len(image_index)} images)"}
+                            continue
+                        
+                        image_path = image_index[position]
+                
+                if image_path and text:
+                    yield {'image_path': image_path, 'text': text, 'line_number': line_num, 'error': None}
+                else:
+                    yield {'image_path': None, 'text': None, 'line_number': line_num,
+                           'error': f"Could not parse line {line_num}: {line}"}
+    
+    # ไฟล์ที่ไม่ใช่ UTF-8 หรืออ่านไม่ได้: แจ้ง error แล้วหยุด (labels ที่อ่านได้ก่อนหน้าถูก yield ไปแล้ว)
+    except (UnicodeDecodeError, OSError) as e:
+        logging.error(f"Error reading label file {label_file_path}: {e}")
 
-def parse_label_file(label_file_path, image_dir):
-    """แปลงไฟล์ label หลากหลายรูปแบบ"""
+def parse_label_file(label_file_path, image_dir, text_only=False, image_name_pattern=None, image_index_file=None):
+    """แปลงไฟล์ label หลากหลายรูปแบบ (โหลดทั้งไฟล์ ใช้ iter_label_file สำหรับไฟล์ขนาดใหญ่)"""
     logging.info(f"Parsing label file: {label_file_path}")
     
     labels = []
     
     try:
-        with open(label_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
+        for record in iter_label_file(label_file_path, image_dir, text_only, image_name_pattern, image_index_file):
+            if record['error']:
+                logging.warning(record['error'])
                 continue
             
-            # ลองแปลงรูปแบบต่างๆ
-            image_path, text = parse_label_line(line, image_dir)
-            
-            if image_path and text:
-                labels.append({
-                    'image_path': image_path,
-                    'text': text,
-                    'line_number': line_num
-                })
-            else:
-                logging.warning(f"Could not parse line {line_num}: {line}")
+            labels.append({
+                'image_path': record['image_path'],
+                'text': record['text'],
+                'line_number': record['line_number']
+            })
     
     except Exception as e:
         logging.error(f"Error reading label file: {e}")
@@ -123,6 +295,34 @@ def parse_label_file(label_file_path, image_dir):
     logging.info(f"Parsed {len(labels)} labels successfully")
     return labels
 
+def iter_annotation_file(annotation_file):
+    """อ่านไฟล์ annotation ของ Recognition (image_path\ttext) ทีละบรรทัดแบบ generator
+    
+    yield dict ที่มี image_path, text, line_number และ error (None ถ้ารูปแบบถูกต้อง)
+    """
+    try:
+        with open(annotation_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                
+                # ตรวจสอบรูปแบบ tab-separated
+                if '\t' not in line:
+                    yield {'image_path': None, 'text': None, 'line_number': line_num,
+                           'error': "No tab separator found"}
+                    continue
+                
+                image_path, text = line.split('\t', 1)
+                yield {'image_path': image_path, 'text': text, 'line_number': line_num, 'error': None}
+    except (UnicodeDecodeError, OSError) as e:
+        logging.error(f"Error reading annotation file {annotation_file}: {e}")
+
+def count_lines(file_path):
+    """นับจำนวนบรรทัดที่ไม่ว่างในไฟล์ (ตรงกับจำนวน record ที่ iter_label_file/iter_annotation_file อ่าน) โดยไม่โหลดทั้งไฟล์"""
+    with open(file_path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
 def parse_label_line(line, image_dir):
     """แปลงบรรทัด label ในรูปแบบต่างๆ"""
     # รูปแบบ 1: image_path\ttext (มาตรฐาน Recognition)
@@ -150,19 +350,235 @@ def parse_label_line(line, image_dir):
         except json.JSONDecodeError:
             pass
     
-    # รูปแบบ 4: เฉพาะข้อความ (ให้หาไฟล์รูปภาพที่ตรงกัน)
-    # สมมติว่าไฟล์รูปภาพมีชื่อเป็น img_001.jpg, img_002.jpg, ...
-    if not any(ext in line for ext in ['.jpg', '.jpeg', '.png', '.bmp']):
-        # หาไฟล์รูปภาพที่อาจจะตรงกัน
-        image_files = list(Path(image_dir).glob('*.*'))
-        if image_files:
-            # ใช้ไฟล์แรกที่เจอ (ควรปรับให้ตรงกับลำดับ)
-            return str(image_files[0].name), line.strip()
-    
+    # รูปแบบ 4 (เฉพาะข้อความ) ถูกจับคู่กับรูปภาพตามลำดับใน iter_label_file
     return None, None
 
-def validate_image_text_pair(image_path, text, image_dir):
-    """ตรวจสอบคู่รูปภาพและข้อความ"""
+def is_text_only_line(line):
+    """ตรวจสอบว่าบรรทัด label มีเฉพาะข้อความ (ไม่มีชื่อไฟล์รูปภาพ)"""
+    return not any(ext in line for ext in ['.jpg', '.jpeg', '.png', '.bmp'])
+
+def check_image_name_pattern(pattern):
+    """ตรวจสอบ pattern ชื่อรูปภาพของบรรทัดเฉพาะข้อความ (ใช้ได้เฉพาะ field {index}) ก่อนเริ่มอ่านไฟล์ label
+    
+    raise ValueError พร้อมสาเหตุถ้า pattern ใช้ไม่ได้
+    """
+    try:
+        fields = {field for _, field, _, _ in string.Formatter().parse(pattern) if field is not None}
+        pattern.format(index=1)
+    except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+        raise ValueError(f"invalid pattern {pattern!r} ({type(e).__name__}: {e}); "
+                         f"only the {{index}} field is available, e.g. img_{{index:03d}}.jpg") from e
+    
+    # ไม่มี {index}: ทุกบรรทัดจะได้ชื่อรูปเดียวกัน
+    if 'index' not in fields:
+        raise ValueError(f"pattern {pattern!r} has no {{index}} field, e.g. img_{{index:03d}}.jpg")
+
+def _natural_sort_key(name):
+    """key สำหรับเรียงชื่อไฟล์ตามตัวเลข (img_2 มาก่อน img_10)"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def list_image_files(image_dir, extensions=IMAGE_EXTENSIONS, index_file=None):
+    """คืนรายชื่อไฟล์รูปภาพใน directory (เรียงตามชื่อแบบ natural sort) โดย list directory ครั้งเดียว"""
+    names = [
+        entry['relative_path']
+        for entry in scan_files(image_dir, extensions, with_stat=False, index_file=index_file)
+    ]
+    logging.info(f"Indexed {len(names)} image files in {image_dir}")
+    return names
+
+def scan_image_files(image_dir, recursive=False, index_file=None):
+    """หาไฟล์รูปภาพทั้งหมดใน directory ด้วย scan_files (นามสกุลไม่สนตัวพิมพ์เล็ก/ใหญ่)"""
+    return scan_files(image_dir, IMAGE_EXTENSIONS, recursive=recursive, index_file=index_file)
+
+def scan_files(root_dir, extensions=None, recursive=False, skip_hidden=False, with_stat=True, index_file=None):
+    """เดิน directory ด้วย os.scandir เพียงรอบเดียว (แทน glob หลายรอบ หรือ rglob + stat ทีละไฟล์)
+    
+    extensions: tuple ของนามสกุล (ตัวพิมพ์เล็ก) ที่ต้องการ เทียบแบบไม่สนตัวพิมพ์ หรือ None = ทุกไฟล์
+    skip_hidden: ข้ามไฟล์/โฟลเดอร์ที่ขึ้นต้นด้วย '.'
+    with_stat: เก็บ size และ mtime_ns จาก DirEntry.stat() (stat ครั้งเดียวต่อไฟล์)
+    index_file: บันทึกผลเป็น JSON และใช้ซ้ำในครั้งถัดไปถ้าไม่มี directory ใดเปลี่ยน (mtime ของ directory เดิม)
+    
+    คืน list ของ dict {'path', 'relative_path', 'size', 'mtime_ns'} เรียงตาม relative_path แบบ natural sort
+    relative_path ใช้ '/' เป็นตัวคั่นเสมอ
+    """
+    root_dir = str(root_dir)
+    extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+    options = {
+        'root': os.path.abspath(root_dir),
+        'extensions': list(extensions) if extensions else None,
+        'recursive': recursive,
+        'skip_hidden': skip_hidden,
+        'with_stat': with_stat
+    }
+    
+    if index_file:
+        files = load_scan_index(index_file, root_dir, options)
+        if files is not None:
+            return files
+    
+    files = []
+    directories = {}
+    seen = set()
+    pending_dirs = ['']
+    
+    while pending_dirs:
+        relative_dir = pending_dirs.pop()
+        current_dir = os.path.join(root_dir, relative_dir) if relative_dir else root_dir
+        
+        # ป้องกันการเดินซ้ำผ่าน symlink ที่ชี้ไปยัง directory เดิม
+        dir_stat = os.stat(current_dir)
+        if (dir_stat.st_dev, dir_stat.st_ino) in seen:
+            continue
+        seen.add((dir_stat.st_dev, dir_stat.st_ino))
+        directories[relative_dir] = dir_stat.st_mtime_ns
+        
+        with os.scandir(current_dir) as entries:
+            for entry in entries:
+                if skip_hidden and entry.name.startswith('.'):
+                    continue
+                
+                relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                
+                if entry.is_dir():
+                    if recursive:
+                        pending_dirs.append(relative_path)
+                    continue
+                
+                if not entry.is_file():
+                    continue
+                if extensions and os.path.splitext(entry.name)[1].lower() not in extensions:
+                    continue
+                
+                record = {'path': entry.path, 'relative_path': relative_path}
+                if with_stat:
+                    stat = entry.stat()
+                    record['size'] = stat.st_size
+                    record['mtime_ns'] = stat.st_mtime_ns
+                files.append(record)
+    
+    files.sort(key=lambda record: _natural_sort_key(record['relative_path']))
+    
+    if index_file:
+        save_scan_index(index_file, options, directories, files)
+    
+    return files
+
+def save_scan_index(index_file, options, directories, files):
+    """บันทึกผลการ scan เพื่อให้ขั้นตอนถัดไปใช้ซ้ำได้ (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+    Path(index_file).parent.mkdir(parents=True, exist_ok=True)
+    index = dict(options, directories=directories,
+                 files=[{k: v for k, v in record.items() if k != 'path'} for record in files])
+    
+    tmp_file = f"{index_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_file, index_file)
+    logging.info(f"Saved file index ({len(files)} files) to {index_file}")
+
+def load_scan_index(index_file, root_dir, options):
+    """โหลดผลการ scan ที่บันทึกไว้ คืน None ถ้าไม่มี ตั้งค่าต่างกัน หรือ directory ใดเปลี่ยนไปแล้ว"""
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    # index ที่มีขนาด/mtime ใช้แทนการ scan ที่ไม่ต้องการข้อมูลนี้ได้
+    if any(index.get(key) != value for key, value in options.items() if key != 'with_stat'):
+        return None
+    if options['with_stat'] and not index.get('with_stat'):
+        return None
+    
+    # เพิ่ม/ลบ/เปลี่ยนชื่อไฟล์ทำให้ mtime ของ directory เปลี่ยน
+    for relative_dir, mtime_ns in index['directories'].items():
+        try:
+            if os.stat(os.path.join(root_dir, relative_dir)).st_mtime_ns != mtime_ns:
+                return None
+        except OSError:
+            return None
+    
+    logging.info(f"Reusing file index {index_file} ({len(index['files'])} files)")
+    for record in index['files']:
+        record['path'] = os.path.join(root_dir, *record['relative_path'].split('/'))
+    return index['files']
+
+def probe_image_header(image_path):
+    """อ่านขนาดรูปภาพจาก header ของไฟล์โดยไม่ decode ทั้งรูป
+    
+    รองรับ JPEG (SOF), PNG (IHDR) และ BMP โดยตรง รูปแบบอื่นใช้ PIL แบบ lazy
+    คืนค่า (width, height, channels) หรือ None ถ้าอ่าน header ไม่ได้
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            head = f.read(32)
+            
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                return _probe_jpeg(f)
+            
+            if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+                width, height, _, color_type = struct.unpack('>IIBB', head[16:26])
+                channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}.get(color_type)
+                return (width, height, channels) if channels else None
+            
+            if head[:2] == b'BM' and len(head) >= 30:
+                dib_size = struct.unpack('<I', head[14:18])[0]
+                if dib_size == 12:
+                    width, height, _, bit_count = struct.unpack('<HHHH', head[18:26])
+                else:
+                    width, height, _, bit_count = struct.unpack('<iiHH', head[18:30])
+                return abs(width), abs(height), 4 if bit_count == 32 else 3
+        
+        # รูปแบบอื่นๆ ให้ PIL อ่านเฉพาะ header
+        from PIL import Image
+        with Image.open(image_path) as img:
+            return img.width, img.height, len(img.getbands())
+        
+    except Exception as e:
+        logging.debug(f"Cannot probe image header {image_path}: {e}")
+        return None
+
+def _probe_jpeg(f):
+    """หา SOF marker ใน JPEG stream แล้วอ่านขนาดรูป"""
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        
+        # ข้าม fill bytes (0xFF ซ้ำ)
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        
+        code = marker[0]
+        # markers ที่ไม่มี length: TEM, RST0-7, SOI, EOI
+        if code == 0x01 or 0xD0 <= code <= 0xD9:
+            continue
+        
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        
+        # SOF0-SOF15 ยกเว้น DHT (C4), JPG (C8), DAC (CC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            data = f.read(6)
+            if len(data) < 6:
+                return None
+            _, height, width, channels = struct.unpack('>BHHB', data)
+            return width, height, channels
+        
+        f.seek(length - 2, os.SEEK_CUR)
+
+def validate_image_text_pair(image_path, text, image_dir, deep=False):
+    """ตรวจสอบคู่รูปภาพและข้อความ
+    
+    ค่าเริ่มต้นอ่านเฉพาะ header ของรูปภาพ ใช้ deep=True เพื่อ decode ทั้งรูป (ตรวจไฟล์เสีย)
+    """
     full_image_path = Path(image_dir) / image_path
     
     # ตรวจสอบว่าไฟล์รูปภาพมีอยู่
@@ -170,16 +586,35 @@ def validate_image_text_pair(image_path, text, image_dir):
         return False, f"Image file not found: {full_image_path}"
     
     # ตรวจสอบว่าโหลดรูปภาพได้
-    image = load_image_safely(full_image_path)
+    if deep:
+        image = load_image_safely(full_image_path)
+        return check_image_text_pair(image, text, full_image_path)
+    
+    header = probe_image_header(full_image_path)
+    if header is None:
+        return False, f"Cannot load image: {full_image_path}"
+    
+    width, height, _ = header
+    return check_image_size_and_text(width, height, text)
+
+def check_image_text_pair(image, text, full_image_path):
+    """ตรวจสอบรูปภาพที่โหลดแล้วและข้อความ (ไม่ต้องอ่านไฟล์ซ้ำ)"""
     if image is None:
         return False, f"Cannot load image: {full_image_path}"
     
-    # ตรวจสอบขนาดรูปภาพ
     height, width = image.shape[:2]
+    return check_image_size_and_text(width, height, text)
+
+def check_image_size_and_text(width, height, text):
+    """ตรวจสอบขนาดรูปภาพและข้อความ"""
+    # ตรวจสอบขนาดรูปภาพ
     if height < 8 or width < 8:
         return False, f"Image too small: {width}x{height}"
     
-    # ตรวจสอบข้อความ
+    return check_text(text)
+
+def check_text(text):
+    """ตรวจสอบข้อความ (ไม่ต้องเปิดรูปภาพ)"""
     if not text or len(text.strip()) == 0:
         return False, "Empty text content"
     
@@ -189,12 +624,35 @@ def validate_image_text_pair(image_path, text, image_dir):
     
     return True, "Valid"
 
-def split_data(labels, train_ratio=0.8, seed=42):
-    """แบ่งข้อมูลเป็น train/validation"""
-    np.random.seed(seed)
+def split_data(labels, train_ratio=0.8, seed=42, group_key=None, mode='shuffle', rare_char_count=20):
+    """แบ่งข้อมูลเป็น train/validation
+    
+    mode='shuffle': สับข้อมูลทั้งหมดแล้วตัดตามสัดส่วน (ได้สัดส่วนตรงพอดี)
+    mode='stratified': แบ่งตามสัดส่วนภายในแต่ละชั้น (ช่วงความยาวข้อความ หรือตัวอักษรหายากที่อยู่ใน label
+    ไม่เกิน rare_char_count labels) เพื่อให้ validation มีทั้งข้อความสั้น/ยาวและตัวอักษรหายากครบ
+    mode='hash': กำหนด split ของแต่ละ label จาก hash ของ image_path (หรือ group key) และ seed
+    label เดิมไม่ย้าย split เมื่อเพิ่มข้อมูลใหม่ และ labels เป็น generator ได้ แต่ยังคืน list ของทั้งสอง split
+    (หน่วยความจำยังเป็น O(N)) ถ้าต้องการแบ่งทีละ record โดยไม่เก็บทั้งชุด ให้เรียก hash_split ต่อ record เอง
+    
+    ถ้ากำหนด group_key (function label -> key หรือ None) labels ที่มี key เดียวกันจะอยู่ใน split เดียวกันเสมอ
+    (เช่น รูปซ้ำ) label ที่ key เป็น None ถือเป็นกลุ่มของตัวเอง
+    """
+    import numpy as np
+    
+    if mode == 'hash':
+        return _split_by_hash(labels, train_ratio, seed, group_key)
+    
+    # ใช้ generator ของตัวเอง (ลำดับเดียวกับ np.random.seed เดิม แต่ไม่เปลี่ยน global state)
+    rng = np.random.RandomState(seed)
+    
+    if mode == 'stratified':
+        return _split_stratified(labels, train_ratio, group_key, rng, rare_char_count)
+    
+    if group_key is not None:
+        return _split_groups(labels, train_ratio, group_key, rng)
     
     # สับข้อมูล
-    shuffled_indices = np.random.permutation(len(labels))
+    shuffled_indices = rng.permutation(len(labels))
     
     # แบ่งข้อมูล
     train_size = int(len(labels) * train_ratio)
@@ -209,28 +667,194 @@ def split_data(labels, train_ratio=0.8, seed=42):
     
     return train_labels, val_labels
 
-def create_character_dict(labels):
-    """สร้าง character dictionary จากข้อมูล"""
-    characters = set()
+def _group_indices(labels, group_key):
+    """รวม index ของ labels ตาม group_key (key เป็น None = กลุ่มของตัวเอง) คืน list ของ list index"""
+    if group_key is None:
+        return [[i] for i in range(len(labels))]
+    
+    groups = {}
+    for i, label in enumerate(labels):
+        key = group_key(label)
+        groups.setdefault(('group', key) if key is not None else ('label', i), []).append(i)
+    
+    return list(groups.values())
+
+def _split_groups(labels, train_ratio, group_key, rng):
+    """สับลำดับกลุ่ม (แทนการสับทีละ label) แล้วเติม train จนครบสัดส่วน ที่เหลือเป็น validation"""
+    group_list = _group_indices(labels, group_key)
+    train_size = int(len(labels) * train_ratio)
+    
+    train_labels = []
+    val_labels = []
+    for group_index in rng.permutation(len(group_list)):
+        target = train_labels if len(train_labels) < train_size else val_labels
+        target.extend(labels[i] for i in group_list[group_index])
+    
+    logging.info(f"Split data: {len(train_labels)} train, {len(val_labels)} validation "
+                 f"({len(group_list)} groups)")
+    
+    return train_labels, val_labels
+
+def _split_stratified(labels, train_ratio, group_key, rng, rare_char_count):
+    """แบ่ง train/val ตามสัดส่วนภายในแต่ละชั้น (ใช้ Counter และ dict เท่านั้น เวลาเป็น O(จำนวนตัวอักษรทั้งหมด))
+    
+    ชั้นของกลุ่ม = ตัวอักษรที่หายากที่สุดในกลุ่มถ้าพบใน label ไม่เกิน rare_char_count labels
+    ไม่เช่นนั้นใช้ช่วงความยาวของข้อความแรกในกลุ่ม ชั้นที่มีตั้งแต่ 2 กลุ่มขึ้นไปได้อย่างน้อย 1 กลุ่มในแต่ละ split
+    """
+    group_list = _group_indices(labels, group_key)
+    
+    # นับจำนวน label ที่มีตัวอักษรแต่ละตัว (นับครั้งเดียวต่อ label)
+    char_counts = Counter()
+    for label in labels:
+        char_counts.update(set(label['text']))
+    
+    rare_chars = {char for char, count in char_counts.items() if count <= rare_char_count}
+    
+    rare_strata = {}
+    length_strata = {}
+    for group_index, members in enumerate(group_list):
+        found = rare_chars.intersection(''.join(labels[i]['text'] for i in members))
+        
+        if found:
+            rarest = min(found, key=lambda char: (char_counts[char], char))
+            rare_strata.setdefault(rarest, []).append(group_index)
+        else:
+            length_strata.setdefault(length_bucket(len(labels[members[0]]['text'])), []).append(group_index)
+    
+    # ชั้นตัวอักษรหายากก่อน ชั้นความยาวตามหลังจะชดเชยส่วนต่างให้สัดส่วนรวมตรงกับ train_ratio
+    is_val = [False] * len(labels)
+    expected_val = 0.0
+    assigned_val = 0
+    
+    for stratum in list(rare_strata.values()) + list(length_strata.values()):
+        stratum_size = sum(len(group_list[g]) for g in stratum)
+        expected_val += stratum_size * (1 - train_ratio)
+        target = max(0, round(expected_val) - assigned_val)
+        
+        order = rng.permutation(len(stratum))
+        if len(stratum) >= 2:
+            # อย่างน้อยหนึ่งกลุ่มใน val และหนึ่งกลุ่มใน train
+            target = min(max(target, 1), stratum_size - len(group_list[stratum[order[-1]]]))
+        
+        stratum_val = 0
+        for position in order:
+            if stratum_val >= target:
+                break
+            members = group_list[stratum[position]]
+            for i in members:
+                is_val[i] = True
+            stratum_val += len(members)
+        
+        assigned_val += stratum_val
+    
+    train_labels = [label for i, label in enumerate(labels) if not is_val[i]]
+    val_labels = [label for i, label in enumerate(labels) if is_val[i]]
+    
+    covered = sum(1 for stratum in rare_strata.values() if len(stratum) >= 2)
+    logging.info(f"Stratified split: {len(train_labels)} train, {len(val_labels)} validation "
+                 f"({len(length_strata)} length strata, {len(rare_strata)} rare characters, "
+                 f"{covered} in both splits)")
+    
+    return train_labels, val_labels
+
+def length_bucket(text_len):
+    """ชื่อช่วงความยาวข้อความตาม LENGTH_STRATA (เช่น 'len 06-10')"""
+    for low, high in LENGTH_STRATA:
+        if high is None or text_len <= high:
+            return f"len {low:02d}+" if high is None else f"len {low:02d}-{high:02d}"
+
+def _split_by_hash(labels, train_ratio, seed, group_key):
+    """แบ่งทีละ label ตาม hash_split (ไม่ต้องสร้าง permutation แต่ยังเก็บ label ทั้งหมดไว้ในสอง list)"""
+    train_labels = []
+    val_labels = []
     
     for label in labels:
-        text = label['text']
-        for char in text:
-            characters.add(char)
+        key = group_key(label) if group_key is not None else None
+        if key is None:
+            key = label['image_path']
+        
+        if hash_split(key, train_ratio, seed) == 'train':
+            train_labels.append(label)
+        else:
+            val_labels.append(label)
+    
+    logging.info(f"Split data by hash (seed {seed}): {len(train_labels)} train, {len(val_labels)} validation")
+    
+    return train_labels, val_labels
+
+def hash_split(key, train_ratio=0.8, seed=42):
+    """คืน 'train' หรือ 'val' ของ key (เช่น path รูปภาพ) จาก hash ของ seed + key
+    
+    ผลขึ้นกับ key, seed และ train_ratio เท่านั้น จึงคำนวณใน worker ใดก็ได้และได้ผลเดิมทุกครั้ง
+    สัดส่วนที่ได้ใกล้เคียง train_ratio (ไม่ตรงพอดีเหมือนโหมด shuffle)
+    """
+    digest = hashlib.blake2b(f"{seed}\0{key}".encode('utf-8'), digest_size=8).digest()
+    return 'train' if int.from_bytes(digest, 'big') < train_ratio * 2 ** 64 else 'val'
+
+def normalize_text(text, form=None):
+    """ปรับรูปแบบ Unicode ของข้อความ (เช่น 'NFC' ให้สระ/วรรณยุกต์ที่เป็น combining marks เรียงแบบเดียวกันเสมอ)
+    
+    form=None คืนข้อความเดิม
+    """
+    return unicodedata.normalize(form, text) if form else text
+
+def count_characters(texts, workers=1, chunk_size=4096):
+    """นับความถี่ของตัวอักษรทีละ chunk ของข้อความแล้วรวมผลด้วย Counter (workers > 1 นับแต่ละ chunk ใน process แยก)"""
+    iterator = iter(texts)
+    chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+    
+    char_counts = Counter()
+    for chunk_counts in run_in_pool(_count_chunk_characters, chunks, workers, chunk_size=1):
+        char_counts.update(chunk_counts)
+    
+    return char_counts
+
+def _count_chunk_characters(texts):
+    """นับตัวอักษรของข้อความหนึ่ง chunk ด้วย np.bincount ของ code point (เร็วกว่าวนทีละตัวอักษรใน Python มาก)"""
+    import numpy as np
+    
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+    counts = np.bincount(codes)
+    present = np.flatnonzero(counts)
+    return Counter(dict(zip(map(chr, present.tolist()), counts[present].tolist())))
+
+def create_character_dict(labels, min_freq=1, char_counts=None):
+    """สร้าง character dictionary จากข้อมูล
+    
+    ตัวอักษรที่พบน้อยกว่า min_freq ครั้งจะถูกตัดออก ส่ง char_counts ที่นับไว้แล้วเพื่อไม่ต้องนับซ้ำ
+    """
+    if char_counts is None:
+        char_counts = count_characters(label['text'] for label in labels)
     
     # เรียงตัวอักษร
-    sorted_chars = sorted(list(characters))
+    sorted_chars = sorted(char for char, count in char_counts.items() if count >= min_freq)
     
     # เพิ่มตัวอักษรพิเศษ
     special_chars = ['<blank>', '<eos>', '<sos>', '<unk>']
     char_dict = special_chars + sorted_chars
     
+    pruned_count = len(char_counts) - len(sorted_chars)
+    if pruned_count:
+        logging.info(f"Pruned {pruned_count} characters seen fewer than {min_freq} times")
     logging.info(f"Created character dictionary with {len(char_dict)} characters")
     
     return char_dict
 
-def save_dataset_metadata(train_labels, val_labels, char_dict, output_dir):
-    """บันทึกข้อมูล metadata ของ dataset"""
+def save_character_frequencies(char_counts, output_dir, min_freq=1):
+    """บันทึกตารางความถี่ตัวอักษร (ตัวอักษร<TAB>จำนวน<TAB>kept/pruned เรียงจากมากไปน้อย) ข้างๆ character_dict.txt"""
+    freq_file = f"{output_dir}/metadata/character_freq.txt"
+    
+    with open(freq_file, 'w', encoding='utf-8') as f:
+        for char, count in sorted(char_counts.items(), key=lambda item: (-item[1], item[0])):
+            f.write(f"{char}\t{count}\t{'kept' if count >= min_freq else 'pruned'}\n")
+    
+    logging.info(f"Saved character frequencies to {freq_file}")
+
+def save_dataset_metadata(train_labels, val_labels, char_dict, output_dir, character_stats=None, text_statistics=None):
+    """บันทึกข้อมูล metadata ของ dataset
+    
+    ส่ง text_statistics ที่คำนวณไว้แล้วเมื่อไม่ได้เก็บ labels ทั้งหมด (train_labels/val_labels ใช้แค่นับจำนวน)
+    """
     metadata = {
         'dataset_info': {
             'total_samples': len(train_labels) + len(val_labels),
@@ -240,9 +864,10 @@ def save_dataset_metadata(train_labels, val_labels, char_dict, output_dir):
         },
         'character_info': {
             'total_characters': len(char_dict),
-            'character_list': char_dict
+            'character_list': char_dict,
+            **(character_stats or {})
         },
-        'text_statistics': calculate_text_statistics(train_labels + val_labels)
+        'text_statistics': text_statistics or calculate_text_statistics(train_labels + val_labels)
     }
     
     # บันทึก metadata
@@ -269,8 +894,145 @@ def calculate_text_statistics(labels):
         'total_characters': sum(text_lengths)
     }
 
+def reservoir_sample(items, k, seed=42, key=None):
+    """สุ่มตัวอย่างแบบ uniform ขนาด k จาก stream ที่ไม่รู้ความยาวด้วย reservoir sampling (ผ่านข้อมูลรอบเดียว)
+    
+    ถ้ากำหนด key จะแบ่งเป็นชั้น (strata) และเก็บ reservoir ขนาด k แยกตามชั้น
+    คืนค่า dict ชั้น -> (จำนวน item ทั้งหมดในชั้น, list ตัวอย่าง) ชั้นเดียวใช้ชื่อ 'all'
+    ผลลัพธ์เหมือนเดิมทุกครั้งสำหรับ seed เดียวกัน
+    """
+    rng = random.Random(seed)
+    strata = {}
+    
+    for item in items:
+        stratum = key(item) if key else 'all'
+        if stratum not in strata:
+            strata[stratum] = [0, []]
+        
+        entry = strata[stratum]
+        entry[0] += 1
+        if len(entry[1]) < k:
+            entry[1].append(item)
+        else:
+            # แทนที่ด้วยความน่าจะเป็น k / จำนวนที่เห็นแล้ว
+            index = rng.randrange(entry[0])
+            if index < k:
+                entry[1][index] = item
+    
+    return {stratum: (count, sample) for stratum, (count, sample) in strata.items()}
+
+def allocate_stratified_sample(strata, k, seed=42):
+    """ลดตัวอย่างของแต่ละชั้นให้เหลือตามสัดส่วนขนาดชั้น (proportional allocation) รวมประมาณ k ตัวอย่าง
+    
+    ทุกชั้นที่มีข้อมูลได้อย่างน้อย 1 ตัวอย่าง (sub-sample แบบสุ่มของ reservoir ยังคงเป็น uniform)
+    """
+    rng = random.Random(seed)
+    population = sum(count for count, _ in strata.values())
+    allocated = {}
+    
+    for stratum, (count, sample) in strata.items():
+        size = min(len(sample), max(1, round(k * count / population)))
+        allocated[stratum] = (count, rng.sample(sample, size) if size < len(sample) else sample)
+    
+    return allocated
+
+def wilson_interval(failures, n, confidence=0.95, population=None):
+    """ช่วงความเชื่อมั่นแบบ Wilson score ของสัดส่วน failures / n
+    
+    ถ้ากำหนด population จะปรับด้วย finite population correction (สุ่มครบทั้งหมด = ค่าแน่นอน)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    
+    p = failures / n
+    if population:
+        if n >= population:
+            return p, p
+        n = n * (population - 1) / (population - n)
+    
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def estimate_error_rate(strata, confidence=0.95):
+    """ประมาณอัตราข้อผิดพลาดของทั้ง dataset จากผลตรวจตัวอย่าง
+    
+    strata: dict ชั้น -> {'population', 'sampled', 'invalid'}
+    ค่าประมาณเป็นค่าเฉลี่ยถ่วงน้ำหนักตามขนาดชั้น ช่วงความเชื่อมั่นใช้ Wilson กับขนาดตัวอย่างประสิทธิผล
+    (Kish effective sample size) ซึ่งเท่ากับจำนวนตัวอย่างจริงเมื่อสุ่มแบบ uniform
+    """
+    sampled_strata = [s for s in strata.values() if s['sampled']]
+    population = sum(s['population'] for s in sampled_strata)
+    sampled = sum(s['sampled'] for s in sampled_strata)
+    invalid = sum(s['invalid'] for s in sampled_strata)
+    
+    if not sampled:
+        return {'population': population, 'sampled': 0, 'invalid': 0, 'error_rate': 0.0,
+                'ci_low': 0.0, 'ci_high': 1.0, 'confidence': confidence}
+    
+    rate = sum(s['population'] / population * s['invalid'] / s['sampled'] for s in sampled_strata)
+    
+    # น้ำหนักของตัวอย่างแต่ละตัว = population / sampled ของชั้นนั้น
+    weight_sum = sum(s['population'] for s in sampled_strata)
+    weight_square_sum = sum(s['population'] ** 2 / s['sampled'] for s in sampled_strata)
+    effective_n = weight_sum ** 2 / weight_square_sum
+    
+    if sampled >= population:
+        low = high = rate
+    else:
+        low, high = wilson_interval(rate * effective_n, effective_n, confidence, population)
+    
+    return {
+        'population': population,
+        'sampled': sampled,
+        'invalid': invalid,
+        'error_rate': rate,
+        'ci_low': low,
+        'ci_high': high,
+        'confidence': confidence
+    }
+
+def _run_chunk(func, chunk):
+    """รันฟังก์ชันกับทุก item ใน chunk (ทำงานภายใน worker process)"""
+    return [func(item) for item in chunk]
+
+def run_in_pool(func, items, workers=1, chunk_size=64):
+    """รันฟังก์ชันกับทุก item ด้วย process pool และคืนผลลัพธ์ตามลำดับเดิม (generator)
+
+    แบ่ง items เป็น chunk ละ chunk_size และส่งให้ worker ครั้งละไม่เกิน workers * 4 chunk
+    ผลลัพธ์ถูกคืนตามลำดับของ input เสมอ ทำให้ได้ผลเหมือนการรันแบบ serial
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+    
+    iterator = iter(items)
+    max_pending = workers * 4
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        
+        while True:
+            # เติมงานให้ pool จนเต็มจำนวนที่กำหนด
+            while len(pending) < max_pending:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_run_chunk, func, chunk))
+            
+            if not pending:
+                break
+            
+            for result in pending.popleft().result():
+                yield result
+
 def create_progress_bar(total, desc="Processing"):
     """สร้าง progress bar"""
+    from tqdm import tqdm
+    
     return tqdm(total=total, desc=desc, unit="items")
 
 def log_processing_summary(processed, failed, output_file="output/validation_reports/summary.txt"):
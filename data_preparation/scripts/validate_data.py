@@ -4,10 +4,22 @@ Validate Recognition dataset
 
 Usage:
     python validate_data.py [options]
+    
+    # ตรวจสอบทุกบรรทัดแบบขนาน
+    python validate_data.py --full --workers 8
+    
+    # สุ่มตัวอย่าง 2000 บรรทัดต่อ split (แบ่งชั้นตามความยาวข้อความ) และประมาณอัตราข้อผิดพลาดพร้อมช่วงความเชื่อมั่น
+    python validate_data.py --sample 2000 --stratify length --seed 42
+    
+    # profile process หลัก (metrics ของทุกขั้นตอนอยู่ใน output/validation_reports/run_metrics.json เสมอ)
+    python validate_data.py --full --profile tracemalloc
 """
 
 import argparse
+import os
 import sys
+from functools import partial
+from itertools import islice
 from pathlib import Path
 import json
 
@@ -15,6 +27,7 @@ import json
 sys.path.append(str(Path(__file__).parent))
 
 from utils import *
+from run_metrics import PROFILE_MODES, RunMetrics
 
 def main():
     parser = argparse.ArgumentParser(description='Validate Recognition dataset')
@@ -24,10 +37,34 @@ def main():
                        help='Check if image files exist and are valid')
     parser.add_argument('--check-text', action='store_true', default=True,
                        help='Check text content validity')
-    parser.add_argument('--max-samples', type=int, default=100,
+    # เลือกได้ทีละแบบ: N บรรทัดแรก, ทุกบรรทัด หรือสุ่มตัวอย่าง
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--max-samples', type=int, default=100,
                        help='Maximum samples to check in detail (0 = all)')
+    selection.add_argument('--full', action='store_true',
+                       help='Check every line (same as --max-samples 0)')
+    selection.add_argument('--sample', type=int, default=0,
+                       help='Check a uniform random sample of N lines per split (reservoir sampling) instead of the first lines')
+    parser.add_argument('--stratify', choices=['none', 'length'], default='none',
+                       help='Sampling strata: none (uniform) or label length buckets')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed for --sample (same seed = same sample)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                       help='Confidence level of the estimated error rate interval')
+    parser.add_argument('--deep', action='store_true',
+                       help='Fully decode every image to detect corruption (default: read headers only)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help=f'Number of worker processes (1 = serial, max {os.cpu_count()})')
+    parser.add_argument('--chunk-size', type=int, default=256,
+                       help='Number of annotation lines per work unit sent to a worker')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default='off',
+                       help='Profile the main process with cProfile or tracemalloc (results in run_metrics.json)')
     
     args = parser.parse_args()
+    setup_logging()
+    
+    if args.full:
+        args.max_samples = 0
     
     print("🔍 PaddleOCR Recognition Dataset Validator")
     print("="*50)
@@ -66,9 +103,10 @@ def main():
     train_annotation = dataset_path / 'annotations/train_annotation.txt'
     val_annotation = dataset_path / 'annotations/val_annotation.txt'
     
+    metrics = RunMetrics('validate_data', args.profile)
     validation_results = {
-        'train': validate_annotation_file(train_annotation, dataset_path, 'train', args),
-        'val': validate_annotation_file(val_annotation, dataset_path, 'val', args)
+        'train': validate_annotation_file(train_annotation, dataset_path, 'train', args, metrics),
+        'val': validate_annotation_file(val_annotation, dataset_path, 'val', args, metrics)
     }
     
     # ตรวจสอบ metadata
@@ -120,6 +158,10 @@ def main():
     if total_samples > 0:
         print(f"  Validity rate: {(total_valid / total_samples * 100):.1f}%")
     
+    for split_name, results in validation_results.items():
+        if results.get('estimate'):
+            print(f"  {split_name} {format_error_estimate(results['estimate'])}")
+    
     print(f"\n📋 Training Set:")
     print(f"  Valid: {validation_results['train']['valid']}")
     print(f"  Invalid: {validation_results['train']['invalid']}")
@@ -143,6 +185,11 @@ def main():
     # บันทึกรายงานการตรวจสอบ
     save_validation_report(validation_results, dataset_path, metadata_valid)
     
+    metrics.set(valid=total_valid, invalid=total_invalid, issues=len(all_issues), workers=args.workers,
+                deep=args.deep, max_samples=args.max_samples, sample=args.sample)
+    metrics.print_summary()
+    metrics.save()
+    
     # แนะนำขั้นตอนถัดไป
     if total_valid > 0:
         print(f"\n✅ Dataset validation completed!")
@@ -161,8 +208,12 @@ def main():
         print(f"\n❌ No valid data found!")
         print(f"Please check your input data and re-run convert_data.py")
 
-def validate_annotation_file(annotation_file, dataset_root, split_name, args):
-    """ตรวจสอบไฟล์ annotation"""
+def validate_annotation_file(annotation_file, dataset_root, split_name, args, metrics=None):
+    """ตรวจสอบไฟล์ annotation (แบ่งเป็น chunk ส่งให้ process pool เมื่อ --workers > 1)
+    
+    ผลลัพธ์กลับมาตามลำดับบรรทัดเสมอ issues และ text_stats จึงเหมือนกับการรันแบบ serial
+    บันทึกเวลาเป็นขั้นตอนชื่อเดียวกับ split ลง metrics (RunMetrics) ถ้ากำหนด
+    """
     result = {
         'valid': 0,
         'invalid': 0,
@@ -181,92 +232,154 @@ def validate_annotation_file(annotation_file, dataset_root, split_name, args):
     
     print(f"  📝 Checking {split_name}_annotation.txt...")
     
-    with open(annotation_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    print(f"    📊 Total lines: {len(lines)}")
-    
-    # ตรวจสอบจำนวนที่จะเช็คในรายละเอียด
-    max_check = len(lines) if args.max_samples == 0 else min(args.max_samples, len(lines))
+    total_lines = count_lines(annotation_file)
+    print(f"    📊 Total lines: {total_lines}")
+    
+    if metrics is not None:
+        metrics.start_stage(split_name)
+    strata = None
+    
+    if args.sample:
+        # สุ่มตัวอย่างจากทั้งไฟล์ (ไม่ลำเอียงไปทางบรรทัดแรกๆ) แล้วตรวจตามลำดับบรรทัด
+        strata = sample_annotation_records(annotation_file, args.sample, args.seed, args.stratify)
+        records = sorted(
+            (record for _, sample in strata.values() for record in sample),
+            key=lambda record: record['line_number']
+        )
+        max_check = len(records)
+        print(f"    🎲 Sampled {max_check} lines (seed {args.seed}, stratify: {args.stratify})")
+    else:
+        # ตรวจสอบจำนวนที่จะเช็คในรายละเอียด
+        max_check = total_lines if args.max_samples == 0 else min(args.max_samples, total_lines)
+        
+        # อ่านไฟล์แบบ streaming ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ
+        records = islice(iter_annotation_file(annotation_file), max_check)
     
     progress_bar = create_progress_bar(max_check, f"Validating {split_name}")
+    invalid_lines = set()
+    check = partial(check_annotation_record, dataset_root=dataset_root, split_name=split_name,
+                    check_images=args.check_images, check_text=args.check_text, deep=args.deep)
     
-    for line_num, line in enumerate(lines[:max_check], 1):
-        line = line.strip()
-        if not line:
-            continue
-        
-        # ตรวจสอบรูปแบบ tab-separated
-        if '\t' not in line:
-            result['issues'].append(f"{split_name} line {line_num}: No tab separator found")
-            result['invalid'] += 1
-            progress_bar.update(1)
-            continue
+    for index, (is_valid, issues, text) in enumerate(run_in_pool(check, records, args.workers, args.chunk_size)):
+        result['issues'].extend(issues)
         
-        parts = line.split('\t', 1)
-        if len(parts) != 2:
-            result['issues'].append(f"{split_name} line {line_num}: Expected 2 parts, got {len(parts)}")
+        if not is_valid:
             result['invalid'] += 1
+            if strata is not None:
+                invalid_lines.add(records[index]['line_number'])
             progress_bar.update(1)
             continue
         
-        image_path, text = parts
-        
-        # ตรวจสอบ image path
-        if args.check_images:
-            full_image_path = dataset_root / image_path
-            if not full_image_path.exists():
-                result['issues'].append(f"{split_name} line {line_num}: Image not found: {image_path}")
-                result['invalid'] += 1
-                progress_bar.update(1)
-                continue
-            
-            # ตรวจสอบว่าโหลดรูปภาพได้
-            image = load_image_safely(full_image_path)
-            if image is None:
-                result['issues'].append(f"{split_name} line {line_num}: Cannot load image: {image_path}")
-                result['invalid'] += 1
-                progress_bar.update(1)
-                continue
-        
-        # ตรวจสอบข้อความ
-        if args.check_text:
-            if not text.strip():
-                result['issues'].append(f"{split_name} line {line_num}: Empty text content")
-                result['invalid'] += 1
-                progress_bar.update(1)
-                continue
-            
-            # เก็บสถิติข้อความ
+        # เก็บสถิติข้อความ
+        if text is not None:
             text_len = len(text)
             result['text_stats']['min_length'] = min(result['text_stats']['min_length'], text_len)
             result['text_stats']['max_length'] = max(result['text_stats']['max_length'], text_len)
             result['text_stats']['total_chars'] += text_len
             result['text_stats']['unique_chars'].update(text)
-            
-            # ตรวจสอบความยาวข้อความ
-            if text_len > 100:
-                result['issues'].append(f"{split_name} line {line_num}: Text too long ({text_len} chars): {text[:50]}...")
-            elif text_len == 0:
-                result['issues'].append(f"{split_name} line {line_num}: Empty text")
         
         result['valid'] += 1
         progress_bar.update(1)
     
     progress_bar.close()
     
+    if metrics is not None:
+        metrics.end_stage(result['valid'] + result['invalid'])
+    
     # ปรับสถิติ
     if result['text_stats']['min_length'] == float('inf'):
         result['text_stats']['min_length'] = 0
     
+    if strata is not None:
+        stratum_counts = {
+            stratum: {
+                'population': count,
+                'sampled': len(sample),
+                'invalid': sum(record['line_number'] in invalid_lines for record in sample)
+            }
+            for stratum, (count, sample) in sorted(strata.items())
+        }
+        result['estimate'] = estimate_error_rate(stratum_counts, args.confidence)
+        result['estimate']['strata'] = stratum_counts
+    
     print(f"    ✅ Valid: {result['valid']}")
     print(f"    ❌ Invalid: {result['invalid']}")
+    if result.get('estimate'):
+        print(f"    📐 {format_error_estimate(result['estimate'])}")
     if result['text_stats']['total_chars'] > 0:
         print(f"    📝 Text length: {result['text_stats']['min_length']}-{result['text_stats']['max_length']} chars")
         print(f"    🔤 Unique characters: {len(result['text_stats']['unique_chars'])}")
     
     return result
 
+# ช่วงความยาวข้อความสำหรับ --stratify length
+def length_stratum(record):
+    """ชั้นของบรรทัดตามความยาวข้อความ (บรรทัดที่แปลงไม่ได้อยู่ชั้น 'unparsed')"""
+    if record['error']:
+        return 'unparsed'
+    
+    return length_bucket(len(record['text']))
+
+def sample_annotation_records(annotation_file, sample_size, seed=42, stratify='none'):
+    """สุ่มตัวอย่างบรรทัดจากไฟล์ annotation แบบ reservoir sampling (อ่านไฟล์รอบเดียว)
+    
+    คืนค่า dict ชั้น -> (จำนวนบรรทัดในชั้น, list ตัวอย่าง)
+    """
+    records = iter_annotation_file(annotation_file)
+    
+    if stratify == 'length':
+        strata = reservoir_sample(records, sample_size, seed, key=length_stratum)
+        return allocate_stratified_sample(strata, sample_size, seed)
+    
+    return reservoir_sample(records, sample_size, seed)
+
+def format_error_estimate(estimate):
+    """ข้อความสรุปอัตราข้อผิดพลาดที่ประมาณได้พร้อมช่วงความเชื่อมั่น"""
+    return (f"Estimated error rate: {estimate['error_rate'] * 100:.2f}% "
+            f"({estimate['confidence'] * 100:.0f}% CI {estimate['ci_low'] * 100:.2f}%-{estimate['ci_high'] * 100:.2f}%) "
+            f"from {estimate['sampled']} of {estimate['population']} lines")
+
+def check_annotation_record(record, dataset_root, split_name, check_images=True, check_text=True, deep=False):
+    """ตรวจสอบ annotation หนึ่งบรรทัด (ทำงานใน worker process ได้)
+    
+    คืนค่า (is_valid, issues, text สำหรับเก็บสถิติ หรือ None)
+    """
+    line_num = record['line_number']
+    
+    if record['error']:
+        return False, [f"{split_name} line {line_num}: {record['error']}"], None
+    
+    image_path, text = record['image_path'], record['text']
+    
+    # ตรวจสอบ image path
+    if check_images:
+        full_image_path = dataset_root / image_path
+        if not full_image_path.exists():
+            return False, [f"{split_name} line {line_num}: Image not found: {image_path}"], None
+        
+        # ตรวจสอบว่าโหลดรูปภาพได้ (อ่านเฉพาะ header ยกเว้นใช้ --deep)
+        if deep:
+            loadable = load_image_safely(full_image_path) is not None
+        else:
+            loadable = probe_image_header(full_image_path) is not None
+        
+        if not loadable:
+            return False, [f"{split_name} line {line_num}: Cannot load image: {image_path}"], None
+    
+    if not check_text:
+        return True, [], None
+    
+    # ตรวจสอบข้อความ
+    if not text.strip():
+        return False, [f"{split_name} line {line_num}: Empty text content"], None
+    
+    # ตรวจสอบความยาวข้อความ
+    text_len = len(text)
+    if text_len > 100:
+        return True, [f"{split_name} line {line_num}: Text too long ({text_len} chars): {text[:50]}..."], text
+    
+    return True, [], text
+
 def save_validation_report(validation_results, dataset_path, metadata_valid):
     """บันทึกรายงานการตรวจสอบ"""
     report_dir = Path("output/validation_reports")
@@ -301,6 +414,12 @@ def save_validation_report(validation_results, dataset_path, metadata_valid):
             f.write(f"Invalid samples: {results['invalid']}\n")
             f.write(f"Issues found: {len(results['issues'])}\n")
             
+            if results.get('estimate'):
+                f.write(f"{format_error_estimate(results['estimate'])}\n")
+                for stratum, counts in results['estimate']['strata'].items():
+                    f.write(f"  {stratum}: {counts['invalid']}/{counts['sampled']} invalid "
+                            f"(population {counts['population']})\n")
+            
             if results['text_stats']['total_chars'] > 0:
                 f.write(f"Text length range: {results['text_stats']['min_length']}-{results['text_stats']['max_length']} chars\n")
                 f.write(f"Unique characters: {len(results['text_stats']['unique_chars'])}\n")
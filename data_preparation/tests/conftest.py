@@ -0,0 +1,12 @@
+"""
+Tests for data preparation scripts
+ให้ tests import modules ใน scripts/ ได้แบบเดียวกับที่ scripts import กันเอง
+
+Usage:
+    python -m pytest -q tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'scripts'))
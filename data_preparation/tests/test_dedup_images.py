@@ -0,0 +1,61 @@
+"""
+Tests for duplicate search (BKTree, find_duplicate_groups)
+"""
+
+import random
+
+import pytest
+
+from dedup_images import BKTree, find_duplicate_groups, hamming_distance
+
+def make_hashes(seed=0, clusters=40, per_cluster=10):
+    """dHash 64 bit เป็นกลุ่มๆ (กลับ bit ไม่กี่ตำแหน่งจากค่ากลาง) เพื่อให้มีทั้งค่าใกล้และไกล"""
+    rng = random.Random(seed)
+    hashes = []
+    for _ in range(clusters):
+        center = rng.getrandbits(64)
+        for _ in range(per_cluster):
+            value = center
+            for bit in rng.sample(range(64), rng.randint(0, 6)):
+                value ^= 1 << bit
+            hashes.append(value)
+    return hashes
+
+@pytest.mark.parametrize('max_distance', [0, 1, 3, 6, 12])
+def test_bktree_search_matches_brute_force(max_distance):
+    hashes = make_hashes()
+    tree = BKTree()
+    for i, value in enumerate(hashes):
+        tree.add(value, i)
+    
+    rng = random.Random(max_distance)
+    queries = rng.sample(hashes, 50) + [rng.getrandbits(64) for _ in range(10)]
+    for query in queries:
+        expected = sorted((hamming_distance(query, value), i) for i, value in enumerate(hashes)
+                          if hamming_distance(query, value) <= max_distance)
+        assert sorted(tree.search(query, max_distance)) == expected
+
+def test_bktree_empty_and_equal_values():
+    tree = BKTree()
+    assert tree.search(0, 64) == []
+    
+    tree.add(0b1010, 'a')
+    tree.add(0b1010, 'b')
+    assert sorted(tree.search(0b1011, 1)) == [(1, 'a'), (1, 'b')]
+
+def test_find_duplicate_groups():
+    entries = [
+        {'content': 'c0', 'dhash': 0},
+        {'content': 'c1', 'dhash': 0b111},          # ห่างจากรูปแรก 3 bit
+        {'content': 'c0', 'dhash': 0},              # ซ้ำทุก byte กับรูปแรก
+        {'content': 'c3', 'dhash': (1 << 64) - 1},  # ไกลจากทุกรูป
+        None,                                       # อ่านรูปไม่ได้
+        {'content': 'c5', 'dhash': 0b1}
+    ]
+    
+    assert find_duplicate_groups(entries, 0) == [{'kind': 'exact', 'members': [0, 2]}]
+    assert find_duplicate_groups(entries, 4) == [{'kind': 'near', 'members': [0, 1, 2, 5]}]
+    
+    # รูปที่เกือบซ้ำต้องมีข้อความเดียวกัน รูปที่ซ้ำทุก byte จัดกลุ่มเสมอ
+    texts = ['ก', 'ข', 'ค', 'ก', 'ก', 'ก']
+    assert find_duplicate_groups(entries, 4, texts) == [{'kind': 'near', 'members': [0, 2, 5]}]
@@ -0,0 +1,62 @@
+"""
+Tests for reading image size from headers (probe_image_header, _probe_jpeg)
+"""
+
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from utils import _probe_jpeg, probe_image_header
+
+def segment(code, payload):
+    return bytes([0xFF, code]) + struct.pack('>H', len(payload) + 2) + payload
+
+def sof_payload(width, height, channels):
+    return struct.pack('>BHHB', 8, height, width, channels) + b'\x11\x00' * channels
+
+@pytest.mark.parametrize('code', [0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF])
+def test_probe_jpeg_sof_variants(code):
+    stream = (
+        segment(0xE0, b'JFIF\x00' + b'\x00' * 9) +
+        segment(0xC4, b'\x00' * 20) +               # DHT (0xC4) ไม่ใช่ SOF
+        segment(0xDB, b'\x00' * 65) +
+        b'\xff\xff\xff' +                            # fill bytes ก่อน marker
+        segment(code, sof_payload(321, 47, 3))
+    )
+    assert _probe_jpeg(io.BytesIO(stream)) == (321, 47, 3)
+
+def test_probe_jpeg_skips_markers_without_length_and_non_sof():
+    stream = (
+        b'\xff\xd0\xff\x01' +                        # RST0, TEM
+        segment(0xC8, b'\x00' * 4) +                 # JPG
+        segment(0xCC, b'\x00' * 4) +                 # DAC
+        segment(0xC0, sof_payload(10, 20, 1))
+    )
+    assert _probe_jpeg(io.BytesIO(stream)) == (10, 20, 1)
+
+def test_probe_jpeg_truncated():
+    assert _probe_jpeg(io.BytesIO(segment(0xE0, b'\x00' * 14))) is None
+    assert _probe_jpeg(io.BytesIO(b'\xff\xc0\x00\x11\x08\x00')) is None
+    assert _probe_jpeg(io.BytesIO(b'\xff')) is None
+
+@pytest.mark.parametrize('suffix, mode, options, channels', [
+    ('.jpg', 'RGB', {}, 3),
+    ('.jpg', 'RGB', {'progressive': True}, 3),
+    ('.jpg', 'L', {}, 1),
+    ('.png', 'RGBA', {}, 4),
+    ('.png', 'L', {}, 1),
+    ('.bmp', 'RGB', {}, 3)
+])
+def test_probe_image_header_real_files(tmp_path, suffix, mode, options, channels):
+    image_path = tmp_path / f"image{suffix}"
+    Image.new(mode, (123, 45)).save(image_path, **options)
+    
+    assert probe_image_header(image_path) == (123, 45, channels)
+
+def test_probe_image_header_unreadable(tmp_path):
+    broken = tmp_path / 'broken.jpg'
+    broken.write_bytes(b'\xff\xd8' + b'\x00' * 10)
+    assert probe_image_header(broken) is None
+    assert probe_image_header(tmp_path / 'missing.jpg') is None
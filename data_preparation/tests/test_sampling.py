@@ -0,0 +1,72 @@
+"""
+Tests for sampled validation (reservoir_sample, wilson_interval, estimate_error_rate)
+"""
+
+from collections import Counter
+
+import pytest
+
+from utils import allocate_stratified_sample, estimate_error_rate, reservoir_sample, wilson_interval
+
+def test_reservoir_sample_counts_and_sizes():
+    strata = reservoir_sample(iter(range(1000)), 10, seed=1, key=lambda x: 'even' if x % 2 == 0 else 'odd')
+    
+    assert set(strata) == {'even', 'odd'}
+    for stratum, (count, sample) in strata.items():
+        assert count == 500
+        assert len(sample) == len(set(sample)) == 10
+        assert all((x % 2 == 0) == (stratum == 'even') for x in sample)
+    
+    # stream สั้นกว่า k ได้ข้อมูลครบทุกตัว
+    assert reservoir_sample(range(3), 10) == {'all': (3, [0, 1, 2])}
+    assert reservoir_sample(range(100), 5, seed=3) == reservoir_sample(range(100), 5, seed=3)
+
+def test_reservoir_sample_is_uniform():
+    trials = 4000
+    hits = Counter()
+    for seed in range(trials):
+        hits.update(reservoir_sample(range(10), 3, seed=seed)['all'][1])
+    
+    # แต่ละ item ถูกเลือกด้วยความน่าจะเป็น 3/10
+    for item in range(10):
+        assert abs(hits[item] / trials - 0.3) < 0.03, item
+
+def test_allocate_stratified_sample_is_proportional():
+    strata = {'big': (900, list(range(100))), 'small': (100, list(range(100))), 'tiny': (1, [0])}
+    allocated = allocate_stratified_sample(strata, 50)
+    
+    assert len(allocated['big'][1]) == 45
+    assert len(allocated['small'][1]) == 5
+    assert len(allocated['tiny'][1]) == 1
+    assert set(allocated['big'][1]) <= set(range(100))
+
+def test_wilson_interval_known_values():
+    low, high = wilson_interval(0, 10)
+    assert low == pytest.approx(0.0, abs=1e-12)
+    assert high == pytest.approx(0.2775, abs=1e-4)
+    
+    low, high = wilson_interval(5, 10)
+    assert (low, high) == pytest.approx((0.2366, 0.7634), abs=1e-4)
+    
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+def test_wilson_interval_finite_population():
+    low, high = wilson_interval(10, 100)
+    corrected_low, corrected_high = wilson_interval(10, 100, population=200)
+    
+    assert low < corrected_low < 0.1 < corrected_high < high
+    assert wilson_interval(10, 100, population=100) == (0.1, 0.1)
+
+def test_estimate_error_rate_weights_strata():
+    strata = {
+        'short': {'population': 900, 'sampled': 100, 'invalid': 0},
+        'long': {'population': 100, 'sampled': 100, 'invalid': 50}
+    }
+    estimate = estimate_error_rate(strata)
+    
+    assert estimate['error_rate'] == pytest.approx(0.05)
+    assert estimate['ci_low'] < 0.05 < estimate['ci_high']
+    
+    # ตรวจครบทุกตัว = ค่าแน่นอน
+    exact = estimate_error_rate({'all': {'population': 50, 'sampled': 50, 'invalid': 5}})
+    assert exact['ci_low'] == exact['ci_high'] == pytest.approx(0.1)
@@ -0,0 +1,93 @@
+"""
+Tests for directory scanning with a reusable index (scan_files, load_scan_index)
+"""
+
+import os
+
+import pytest
+
+from utils import scan_files
+
+def make_tree(root):
+    (root / 'sub').mkdir()
+    (root / 'img2.jpg').write_bytes(b'x' * 2)
+    (root / 'img10.jpg').write_bytes(b'x' * 10)
+    (root / 'labels.txt').write_text('a\n')
+    (root / '.hidden.jpg').write_bytes(b'x')
+    (root / 'sub' / 'img1.JPG').write_bytes(b'x')
+    
+    # mtime เก่าของ directory ทำให้การเพิ่มไฟล์ในภายหลังเปลี่ยน mtime แน่นอน
+    for directory in (root, root / 'sub'):
+        os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+
+def relative_paths(files):
+    return [record['relative_path'] for record in files]
+
+def fail_scandir(path):
+    raise AssertionError(f"unexpected scandir({path})")
+
+def test_scan_files(tmp_path):
+    make_tree(tmp_path)
+    
+    files = scan_files(tmp_path, ('.jpg',), recursive=True, skip_hidden=True)
+    assert relative_paths(files) == ['img2.jpg', 'img10.jpg', 'sub/img1.JPG']
+    assert [record['size'] for record in files] == [2, 10, 1]
+    assert files[2]['path'] == os.path.join(str(tmp_path), 'sub', 'img1.JPG')
+    
+    assert relative_paths(scan_files(tmp_path, ('.jpg',))) == ['.hidden.jpg', 'img2.jpg', 'img10.jpg']
+
+def test_scan_index_is_reused(tmp_path, monkeypatch):
+    root = tmp_path / 'images'
+    root.mkdir()
+    make_tree(root)
+    index_file = tmp_path / 'index.json'
+    
+    files = scan_files(root, ('.jpg',), recursive=True, index_file=index_file)
+    assert index_file.exists()
+    
+    # ไม่มี directory ใดเปลี่ยน: ต้องไม่เดิน directory ซ้ำ
+    monkeypatch.setattr(os, 'scandir', fail_scandir)
+    assert scan_files(root, ('.jpg',), recursive=True, index_file=index_file) == files
+    
+    # index ที่มีขนาด/mtime ใช้แทนการ scan ที่ไม่ต้องการข้อมูลนี้ได้
+    assert relative_paths(scan_files(root, ('.jpg',), recursive=True, with_stat=False,
+                                     index_file=index_file)) == relative_paths(files)
+
+@pytest.mark.parametrize('change', ['add', 'remove', 'add_in_subdir'])
+def test_scan_index_invalidated_by_directory_change(tmp_path, change):
+    root = tmp_path / 'images'
+    root.mkdir()
+    make_tree(root)
+    index_file = tmp_path / 'index.json'
+    scan_files(root, ('.jpg',), recursive=True, index_file=index_file)
+    
+    if change == 'add':
+        (root / 'img3.jpg').write_bytes(b'x')
+        expected = ['.hidden.jpg', 'img2.jpg', 'img3.jpg', 'img10.jpg', 'sub/img1.JPG']
+    elif change == 'remove':
+        (root / 'img2.jpg').unlink()
+        expected = ['.hidden.jpg', 'img10.jpg', 'sub/img1.JPG']
+    else:
+        (root / 'sub' / 'img0.jpg').write_bytes(b'x')
+        expected = ['.hidden.jpg', 'img2.jpg', 'img10.jpg', 'sub/img0.jpg', 'sub/img1.JPG']
+    
+    assert relative_paths(scan_files(root, ('.jpg',), recursive=True, index_file=index_file)) == expected
+
+def test_scan_index_invalidated_by_options(tmp_path, monkeypatch):
+    root = tmp_path / 'images'
+    root.mkdir()
+    make_tree(root)
+    index_file = tmp_path / 'index.json'
+    scan_files(root, ('.jpg',), recursive=True, with_stat=False, index_file=index_file)
+    
+    assert relative_paths(scan_files(root, ('.txt',), recursive=True, index_file=index_file)) == ['labels.txt']
+    assert relative_paths(scan_files(root, ('.jpg',), index_file=index_file)) == \
+        ['.hidden.jpg', 'img2.jpg', 'img10.jpg']
+    
+    # index ที่ไม่มีขนาด/mtime ใช้กับการ scan ที่ต้องการข้อมูลนี้ไม่ได้
+    scan_files(root, ('.jpg',), with_stat=False, index_file=index_file)
+    assert scan_files(root, ('.jpg',), index_file=index_file)[1]['size'] == 2
+    
+    # index ที่เสียหายถูกสร้างใหม่
+    index_file.write_text('{not json')
+    assert len(scan_files(root, ('.jpg',), index_file=index_file)) == 3
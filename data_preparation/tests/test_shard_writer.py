@@ -0,0 +1,70 @@
+"""
+Tests for packed shard writers (create_shard_writer)
+"""
+
+import json
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from shard_writer import create_shard_writer
+
+SAMPLES = [(f"image bytes {i}".encode() * (i + 1), f"ข้อความ {i}") for i in range(5)]
+
+def test_tar_shards_round_trip(tmp_path):
+    with create_shard_writer('tar', tmp_path, shard_size=2, image_extension='.png') as writer:
+        for image_bytes, label in SAMPLES:
+            writer.add(image_bytes, label)
+    shards = writer.shards
+    
+    assert [shard['samples'] for shard in shards] == [2, 2, 1]
+    assert writer.total_samples == len(SAMPLES)
+    
+    read_back = []
+    for shard in shards:
+        index_file = Path(shard['path']).with_suffix('.index.jsonl')
+        records = [json.loads(line) for line in index_file.read_text(encoding='utf-8').splitlines()]
+        
+        # อ่านรูปตรงจาก offset ใน index (random access โดยไม่ต้องเปิดเป็น tar)
+        with open(shard['path'], 'rb') as f:
+            for record in records:
+                f.seek(record['offset'])
+                read_back.append((f.read(record['size']), record['label']))
+        
+        # และไฟล์ต้องเป็น tar ที่อ่านด้วย tarfile ได้ตามปกติ
+        with tarfile.open(shard['path']) as tar:
+            names = tar.getnames()
+        assert names == [record['name'] for record in records]
+        assert names[0] == 'image-000000001.png'
+    
+    assert read_back == SAMPLES
+
+def test_lmdb_shards_round_trip(tmp_path):
+    lmdb = pytest.importorskip('lmdb')
+    
+    writer = create_shard_writer('lmdb', tmp_path, shard_size=3)
+    for image_bytes, label in SAMPLES:
+        writer.add(image_bytes, label)
+    shards = writer.close()
+    
+    assert [shard['samples'] for shard in shards] == [3, 2]
+    
+    read_back = []
+    for shard in shards:
+        env = lmdb.open(shard['path'], readonly=True, lock=False)
+        with env.begin() as txn:
+            # key แบบเดียวกับ LMDBDataSet ของ PaddleOCR (index เริ่มที่ 1)
+            num_samples = int(txn.get(b'num-samples'))
+            assert num_samples == shard['samples']
+            for index in range(1, num_samples + 1):
+                read_back.append((txn.get(f"image-{index:09d}".encode()),
+                                  txn.get(f"label-{index:09d}".encode()).decode('utf-8')))
+            assert txn.get(f"image-{num_samples + 1:09d}".encode()) is None
+        env.close()
+    
+    assert read_back == SAMPLES
+
+def test_unknown_shard_format(tmp_path):
+    with pytest.raises(ValueError):
+        create_shard_writer('zip', tmp_path)
@@ -0,0 +1,86 @@
+"""
+Tests for train/validation splitting (hash_split, split_data)
+"""
+
+import random
+
+from utils import hash_split, split_data
+
+def make_label(i, text='ข้อความ'):
+    return {'image_path': f"word_{i:05d}.jpg", 'text': text}
+
+def test_hash_split_is_stable():
+    keys = [f"images/word_{i:05d}.jpg" for i in range(2000)]
+    first = [hash_split(key, 0.8, 42) for key in keys]
+    
+    # เรียกซ้ำหรือเรียกกลับลำดับต้องได้ผลเดิม (ไม่มี state ร่วมระหว่างการเรียก)
+    assert [hash_split(key, 0.8, 42) for key in keys] == first
+    assert [hash_split(key, 0.8, 42) for key in reversed(keys)] == first[::-1]
+    assert set(first) == {'train', 'val'}
+    
+    # seed ต่างกันได้การแบ่งต่างกัน
+    assert [hash_split(key, 0.8, 7) for key in keys] != first
+
+def test_hash_split_ratio():
+    keys = [f"images/word_{i:05d}.jpg" for i in range(20000)]
+    
+    for ratio in (0.5, 0.8, 0.95):
+        train = sum(hash_split(key, ratio, 42) == 'train' for key in keys)
+        assert abs(train / len(keys) - ratio) < 0.015
+    
+    assert all(hash_split(key, 1.0, 42) == 'train' for key in keys[:500])
+    assert all(hash_split(key, 0.0, 42) == 'val' for key in keys[:500])
+
+def test_hash_split_mode_keeps_existing_labels_in_place():
+    labels = [make_label(i) for i in range(1000)]
+    train, val = split_data(labels, 0.8, 42, mode='hash')
+    assert len(train) + len(val) == len(labels)
+    
+    # เพิ่มข้อมูลใหม่แล้วแบ่งซ้ำ: label เดิมต้องอยู่ split เดิม
+    more_train, more_val = split_data(labels + [make_label(i) for i in range(1000, 1500)], 0.8, 42, mode='hash')
+    more_val_paths = {label['image_path'] for label in more_val}
+    assert all(label['image_path'] not in more_val_paths for label in train)
+    assert all(label['image_path'] in more_val_paths for label in val)
+
+def test_hash_split_mode_keeps_groups_together():
+    labels = [dict(make_label(i), group=f"g{i // 4}") for i in range(400)]
+    train, val = split_data(labels, 0.8, 42, group_key=lambda label: label['group'], mode='hash')
+    
+    assert not {label['group'] for label in train} & {label['group'] for label in val}
+
+def make_stratified_labels():
+    """labels ความยาวต่างๆ จากตัวอักษรทั่วไป และตัวอักษรหายากที่พบใน 1-5 labels"""
+    rng = random.Random(0)
+    common = 'กขคงจฉชซฌญ'
+    labels = [make_label(i, ''.join(rng.choice(common) for _ in range(rng.randint(1, 40))))
+              for i in range(1000)]
+    
+    # ตัวอักษรหายากแต่ละตัวอยู่คนละ label กัน (ชั้นของ label คือตัวอักษรที่หายากที่สุด)
+    rare = 'ฤฦฬฮ๏๚๛ฃฅ'
+    hosts = iter(rng.sample(labels, 50))
+    for count, char in enumerate(rare, 1):
+        for _ in range(count % 5 + 1):
+            next(hosts)['text'] += char
+    return labels, rare
+
+def test_stratified_split_ratio():
+    labels, _ = make_stratified_labels()
+    train, val = split_data(labels, 0.8, 42, mode='stratified', rare_char_count=20)
+    
+    assert len(train) + len(val) == len(labels)
+    assert {id(label) for label in train}.isdisjoint(id(label) for label in val)
+    assert abs(len(val) - len(labels) * 0.2) <= 2
+
+def test_stratified_split_puts_rare_characters_in_both_splits():
+    labels, rare = make_stratified_labels()
+    train, val = split_data(labels, 0.8, 42, mode='stratified', rare_char_count=20)
+    train_chars = set(''.join(label['text'] for label in train))
+    val_chars = set(''.join(label['text'] for label in val))
+    
+    for char in rare:
+        label_count = sum(char in label['text'] for label in labels)
+        if label_count >= 2:
+            assert char in train_chars and char in val_chars, char
+    
+    # seed เดิมได้ผลเดิม
+    assert split_data(labels, 0.8, 42, mode='stratified')[1] == val